@@ -0,0 +1,65 @@
+"""
+Benchmark building unsaved instances, e.g. before `bulk_create()`, with and without `DirtyFieldsMixin`.
+
+Uses the models of the test suite, no database is needed. Run from the root of the repository:
+
+    python benchmarks/bench_unsaved_instances.py [--count 100000] [--repeat 5]
+
+The state of unsaved instances without primary key is not captured, so building them with the mixin should
+cost about the same as without it. The last line builds them and captures their state, as `__init__()` used to do.
+"""
+import argparse
+import time
+
+from common import setup_django
+
+setup_django()
+
+from dirtyfields.dirtyfields import reset_state  # noqa: E402
+from tests.models import OrdinaryModelTest, OrdinaryWithDirtyFieldsProxy  # noqa: E402
+
+
+def build(model, count):
+    return [model(boolean=i % 2 == 0, characters='row %d' % i) for i in range(count)]
+
+
+def build_and_capture(model, count):
+    instances = build(model, count)
+    for instance in instances:
+        reset_state(sender=model, instance=instance)
+    return instances
+
+
+def measure(function, model, count, repeat):
+    """Return the best time of `repeat` runs of `function(model, count)`, in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(model, count)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=100000, help='number of instances built per run')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs, the best one is reported')
+    args = parser.parse_args()
+
+    # Build the tracking plan first.
+    OrdinaryWithDirtyFieldsProxy()
+
+    baseline = measure(build, OrdinaryModelTest, args.count, args.repeat)
+    cases = [
+        ('without the mixin', baseline),
+        ('with the mixin', measure(build, OrdinaryWithDirtyFieldsProxy, args.count, args.repeat)),
+        ('with the mixin, state captured', measure(
+            build_and_capture, OrdinaryWithDirtyFieldsProxy, args.count, args.repeat)),
+    ]
+    print('Building {} unsaved instances, best of {} runs:'.format(args.count, args.repeat))
+    for label, duration in cases:
+        print('  {:<32} {:8.3f} s  {:5.2f}x'.format(label, duration, duration / baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+"""
+Setup shared by the benchmark scripts, run against the settings of the test suite.
+"""
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def setup_django():
+    """Configure Django with `tests.django_settings`, and return the `dirtyfields` package benchmarked."""
+    sys.path.insert(0, ROOT)
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'tests.django_settings')
+
+    import django
+    django.setup()
+
+    import dirtyfields
+    return dirtyfields
+
+
+def create_test_database():
+    """Create the test database of the default connection, in memory with SQLite, and return its name."""
+    from django.db import connection
+    return connection.creation.create_test_db(verbosity=0, autoclobber=True)
+
+
+def destroy_test_database(old_name):
+    from django.db import connection
+    connection.creation.destroy_test_db(old_name, verbosity=0)
@@ -0,0 +1,73 @@
+"""
+Compare two result files of `run.py`, e.g. of two versions of django-dirtyfields:
+
+    python benchmarks/compare.py before.json after.json [--threshold 1.10]
+
+For every benchmark found in both files, the best timings are compared. Exits with status 1 if any
+benchmark of the mixin got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+KEY_FIELDS = ('case', 'model', 'field_type', 'field_count', 'dirty_ratio')
+
+
+def load_results(path):
+    with open(path) as results_file:
+        data = json.load(results_file)
+    return data.get('metadata', {}), {tuple(result[key] for key in KEY_FIELDS): result for result in data['results']}
+
+
+def compare(before, after, threshold):
+    """Return `(key, before best, after best, ratio, regressed)` for the benchmarks found in both results."""
+    rows = []
+    for key, result in after.items():
+        if key not in before:
+            continue
+        ratio = result['best'] / before[key]['best']
+        # Only the mixin is benchmarked against itself, the plain baseline does not use it.
+        regressed = key[1] == 'mixin' and ratio > threshold
+        rows.append((key, before[key]['best'], result['best'], ratio, regressed))
+    return rows
+
+
+def _describe(metadata):
+    return '{} ({}), Django {}, Python {}'.format(
+        metadata.get('dirtyfields'), (metadata.get('commit') or 'unknown commit')[:10],
+        metadata.get('django'), metadata.get('python'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare two result files of benchmarks/run.py.')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    parser.add_argument('--threshold', type=float, default=1.10,
+                        help='ratio of the timings above which a benchmark is reported as a regression')
+    args = parser.parse_args(argv)
+
+    before_metadata, before = load_results(args.before)
+    after_metadata, after = load_results(args.after)
+    rows = compare(before, after, args.threshold)
+
+    print('before: {}'.format(_describe(before_metadata)))
+    print('after:  {}'.format(_describe(after_metadata)))
+    print('{:<26} {:<6} {:<9} {:>4} {:>5} {:>11} {:>11} {:>7}'.format(
+        'case', 'model', 'type', 'flds', 'dirty', 'before', 'after', 'ratio'))
+    for (case, model, field_type, field_count, dirty_ratio), before_best, after_best, ratio, regressed in rows:
+        print('{:<26} {:<6} {:<9} {:>4} {:>5} {:>8.2f} us {:>8.2f} us {:>6.2f}x{}'.format(
+            case, model, field_type, field_count, '' if dirty_ratio is None else '{:.0%}'.format(dirty_ratio),
+            before_best * 1e6, after_best * 1e6, ratio, '  REGRESSION' if regressed else ''))
+
+    missing = len(set(before) ^ set(after))
+    if missing:
+        print('{} benchmarks are only found in one of the files.'.format(missing))
+    regressions = sum(1 for row in rows if row[4])
+    if regressions:
+        print('{} benchmarks are slower by more than {:.0%}.'.format(regressions, args.threshold - 1))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
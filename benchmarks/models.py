@@ -0,0 +1,97 @@
+"""
+Models generated for the benchmarks, for every field type and field count of the sweep.
+
+Each model has `field_count` fields of a single type, named `f0`, `f1`... Mixin models use
+`DirtyFieldsMixin`, plain models are regular `models.Model` subclasses with the same fields, and
+m2m models also have an m2m field and `ENABLE_M2M_CHECK` set. The tables are created when the
+models are first requested, so the test database must exist by then.
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.db import connection, models
+
+from dirtyfields import DirtyFieldsMixin
+
+APP_LABEL = 'tests'
+
+# `make_field()` returns a new field, `value(i)` the value of the `i`-th row, and `change(value)`
+# a different value, assigned to make a field dirty. Values are assigned with the attname of the field.
+FieldType = namedtuple('FieldType', ['make_field', 'value', 'change'])
+
+_EPOCH = datetime(2020, 1, 1, tzinfo=timezone.utc)
+
+FIELD_TYPES = {
+    'decimal': FieldType(
+        lambda: models.DecimalField(max_digits=12, decimal_places=2, default=0),
+        lambda i: Decimal(i) + Decimal('0.25'),
+        lambda value: value + 1,
+    ),
+    'datetime': FieldType(
+        lambda: models.DateTimeField(default=_EPOCH),
+        lambda i: _EPOCH + timedelta(hours=i),
+        lambda value: value + timedelta(days=1),
+    ),
+    'json': FieldType(
+        lambda: models.JSONField(default=dict),
+        lambda i: {'id': i, 'tags': ['a', 'b'], 'nested': {'count': i}},
+        lambda value: dict(value, changed=True),
+    ),
+    'binary': FieldType(
+        lambda: models.BinaryField(default=b''),
+        lambda i: bytes(range(64)) + str(i).encode(),
+        lambda value: value + b'!',
+    ),
+    'fk': FieldType(
+        lambda: models.ForeignKey('tests.BenchmarkTarget', null=True, on_delete=models.CASCADE, related_name='+'),
+        lambda i: i % 10 + 1,
+        lambda value: value % 10 + 1,
+    ),
+}
+
+_models = {}
+
+
+class BenchmarkTarget(models.Model):
+    """Model referenced by the foreign keys and m2m fields of the benchmark models."""
+
+    class Meta:
+        app_label = APP_LABEL
+
+
+def get_model(field_type, field_count, kind):
+    """Return the model with `field_count` fields of `field_type`, `kind` being "mixin", "plain" or "m2m"."""
+    key = (field_type, field_count, kind)
+    if key in _models:
+        return _models[key]
+
+    attrs = {
+        '__module__': __name__,
+        'Meta': type('Meta', (), {'app_label': APP_LABEL}),
+    }
+    for index in range(field_count):
+        attrs['f%d' % index] = FIELD_TYPES[field_type].make_field()
+    if kind == 'm2m':
+        attrs['ENABLE_M2M_CHECK'] = True
+        attrs['m2m'] = models.ManyToManyField(BenchmarkTarget, related_name='+')
+
+    bases = (models.Model,) if kind == 'plain' else (DirtyFieldsMixin, models.Model)
+    name = 'Benchmark{}{}{}'.format(field_type.capitalize(), field_count, kind.capitalize())
+    model = _models[key] = type(name, bases, attrs)
+    _create_table(model)
+    return model
+
+
+def _create_table(model):
+    if BenchmarkTarget._meta.db_table not in connection.introspection.table_names():
+        with connection.schema_editor() as editor:
+            editor.create_model(BenchmarkTarget)
+    if not BenchmarkTarget.objects.exists():
+        BenchmarkTarget.objects.bulk_create([BenchmarkTarget(pk=pk) for pk in range(1, 11)])
+    with connection.schema_editor() as editor:
+        editor.create_model(model)
+
+
+def get_attnames(model):
+    return [field.attname for field in model._meta.concrete_fields if not field.primary_key]
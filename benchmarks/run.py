@@ -0,0 +1,284 @@
+"""
+Benchmark the hot paths of `DirtyFieldsMixin`, against a plain `models.Model` baseline where there is one.
+
+Every case is run for each field type, field count and, for the cases that depend on it, dirty ratio,
+on models generated by `models.py` in the SQLite test database of `tests/django_settings.py`.
+Run from the root of the repository:
+
+    python benchmarks/run.py --output before.json
+    python benchmarks/run.py --cases get_dirty_fields,is_dirty --field-counts 5,200 --output after.json
+    python benchmarks/compare.py before.json after.json
+
+The dirty ratio is the share of the fields assigned a different value on every instance, or for the m2m
+cases the share of instances whose m2m relation differs.
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from datetime import datetime, timezone
+
+from common import ROOT, create_test_database, destroy_test_database, setup_django
+
+# `prepare(bench)` returns a function running the case once on every instance, and a function
+# preparing each run (or `None`). `baseline` is the prepare function of the plain model, if any.
+Case = namedtuple('Case', ['prepare', 'baseline', 'uses_dirty_ratio', 'kind'])
+
+DEFAULT_FIELD_COUNTS = (5, 20, 50, 200)
+DEFAULT_DIRTY_RATIOS = (0.0, 0.1, 0.5, 1.0)
+
+
+class Bench(object):
+    """Rows and instances of a model, for a field type, a field count and a dirty ratio."""
+
+    def __init__(self, model, field_type, dirty_ratio, count):
+        from models import FIELD_TYPES, get_attnames
+
+        self.model = model
+        self.field_type = FIELD_TYPES[field_type]
+        self.dirty_ratio = dirty_ratio
+        self.count = count
+        self.attnames = get_attnames(model)
+
+        self.kwargs = [
+            {attname: self.field_type.value(i) for attname in self.attnames}
+            for i in range(count)
+        ]
+        model.objects.all().delete()
+        model.objects.bulk_create([model(**kwargs) for kwargs in self.kwargs])
+        self.db_attnames = ['id'] + self.attnames
+        self.db_rows = list(model.objects.order_by('pk').values_list(*self.db_attnames))
+
+    def load(self):
+        return list(self.model.objects.order_by('pk'))
+
+    def dirty_attnames(self):
+        return self.attnames[:round(len(self.attnames) * (self.dirty_ratio or 0))]
+
+    def make_dirty(self, instances, reverse=False):
+        """Assign a different value to the dirty fields of `instances`, or their initial value if `reverse`."""
+        attnames = self.dirty_attnames()
+        for instance, kwargs in zip(instances, self.kwargs):
+            for attname in attnames:
+                value = kwargs[attname]
+                setattr(instance, attname, value if reverse else self.field_type.change(value))
+
+
+def prepare_init(bench):
+    model, all_kwargs = bench.model, bench.kwargs
+    return lambda: [model(**kwargs) for kwargs in all_kwargs], None
+
+
+def prepare_from_db(bench):
+    model, attnames, rows = bench.model, bench.db_attnames, bench.db_rows
+    return lambda: [model.from_db('default', attnames, row) for row in rows], None
+
+
+def _prepare_dirty_instances(bench):
+    instances = bench.load()
+    bench.make_dirty(instances)
+    return instances
+
+
+def prepare_get_dirty_fields(bench):
+    instances = _prepare_dirty_instances(bench)
+    return lambda: [instance.get_dirty_fields(check_relationship=True) for instance in instances], None
+
+
+def prepare_get_dirty_fields_verbose(bench):
+    instances = _prepare_dirty_instances(bench)
+    return lambda: [instance.get_dirty_fields(check_relationship=True, verbose=True) for instance in instances], None
+
+
+def prepare_is_dirty(bench):
+    instances = _prepare_dirty_instances(bench)
+    return lambda: [instance.is_dirty(check_relationship=True) for instance in instances], None
+
+
+def _prepare_saves(bench, save):
+    instances = bench.load()
+    runs = []
+
+    def setup():
+        # Alternate between the changed and the initial values, so that every run saves dirty fields.
+        bench.make_dirty(instances, reverse=len(runs) % 2 == 1)
+        runs.append(None)
+
+    return lambda: [save(instance) for instance in instances], setup
+
+
+def prepare_save_dirty_fields(bench):
+    return _prepare_saves(bench, lambda instance: instance.save_dirty_fields())
+
+
+def prepare_save(bench):
+    return _prepare_saves(bench, lambda instance: instance.save())
+
+
+def prepare_refresh_from_db(bench):
+    instances = bench.load()
+    return lambda: [instance.refresh_from_db() for instance in instances], None
+
+
+def _link_m2m(bench):
+    """Link every row to the same 3 targets."""
+    through = bench.model.m2m.through
+    through.objects.all().delete()
+    through.objects.bulk_create([
+        through(**{'%s_id' % bench.model._meta.model_name: row[0], 'benchmarktarget_id': pk})
+        for row in bench.db_rows
+        for pk in (1, 2, 3)
+    ])
+
+
+def prepare_m2m_get_dirty_fields(bench):
+    _link_m2m(bench)
+    instances = bench.load()
+    dirty_count = round(len(instances) * (bench.dirty_ratio or 0))
+    check_m2m = [{'m2m': {1, 2, 4} if index < dirty_count else {1, 2, 3}} for index in range(len(instances))]
+    return lambda: [
+        instance.get_dirty_fields(check_m2m=m2m) for instance, m2m in zip(instances, check_m2m)
+    ], None
+
+
+def prepare_m2m_from_db(bench):
+    _link_m2m(bench)
+    return prepare_from_db(bench)
+
+
+CASES = {
+    'init': Case(prepare_init, prepare_init, False, 'mixin'),
+    'from_db': Case(prepare_from_db, prepare_from_db, False, 'mixin'),
+    'get_dirty_fields': Case(prepare_get_dirty_fields, None, True, 'mixin'),
+    'get_dirty_fields_verbose': Case(prepare_get_dirty_fields_verbose, None, True, 'mixin'),
+    'is_dirty': Case(prepare_is_dirty, None, True, 'mixin'),
+    # The baseline saves every field, as a plain model does not know which ones changed.
+    'save_dirty_fields': Case(prepare_save_dirty_fields, prepare_save, True, 'mixin'),
+    'refresh_from_db': Case(prepare_refresh_from_db, prepare_refresh_from_db, False, 'mixin'),
+    'm2m_get_dirty_fields': Case(prepare_m2m_get_dirty_fields, None, True, 'm2m'),
+    'm2m_from_db': Case(prepare_m2m_from_db, prepare_from_db, False, 'm2m'),
+}
+
+
+def measure(prepare, bench, repeat):
+    """Return the timings of `repeat` runs of a case, in seconds per instance."""
+    run, setup = prepare(bench)
+    timings = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - start) / bench.count)
+    return timings
+
+
+def run_benchmarks(cases, field_types, field_counts, dirty_ratios, count, repeat, report=None):
+    """Run the benchmarks and return the list of their results."""
+    from models import get_model
+
+    results = []
+    for case_name in cases:
+        case = CASES[case_name]
+        for field_type in field_types:
+            for field_count in field_counts:
+                for dirty_ratio in (dirty_ratios if case.uses_dirty_ratio else (None,)):
+                    variants = [('mixin', case.prepare, case.kind)]
+                    if case.baseline is not None:
+                        variants.append(('plain', case.baseline, 'plain'))
+                    for variant, prepare, kind in variants:
+                        bench = Bench(get_model(field_type, field_count, kind), field_type, dirty_ratio, count)
+                        timings = measure(prepare, bench, repeat)
+                        result = {
+                            'case': case_name,
+                            'model': variant,
+                            'field_type': field_type,
+                            'field_count': field_count,
+                            'dirty_ratio': dirty_ratio,
+                            'best': min(timings),
+                            'median': statistics.median(timings),
+                            'timings': timings,
+                        }
+                        results.append(result)
+                        if report is not None:
+                            report(result)
+    return results
+
+
+def get_metadata(dirtyfields, args):
+    import django
+    from django.db import connection
+
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'date': datetime.now(timezone.utc).isoformat(),
+        'dirtyfields': dirtyfields.__version__,
+        'commit': commit,
+        'django': django.get_version(),
+        'python': platform.python_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'count': args.count,
+        'repeat': args.repeat,
+    }
+
+
+def format_result(result):
+    ratio = '' if result['dirty_ratio'] is None else '{:.0%}'.format(result['dirty_ratio'])
+    return '{case:<26} {model:<6} {field_type:<9} {field_count:>4} {ratio:>5} {best:10.2f} us'.format(
+        ratio=ratio, **dict(result, best=result['best'] * 1e6))
+
+
+def _list(convert):
+    return lambda value: [convert(item) for item in value.split(',') if item]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the hot paths of DirtyFieldsMixin.')
+    parser.add_argument('--cases', type=_list(str), default=list(CASES), help='comma separated case names')
+    parser.add_argument('--field-types', type=_list(str), default=None, help='comma separated field types')
+    parser.add_argument('--field-counts', type=_list(int), default=list(DEFAULT_FIELD_COUNTS))
+    parser.add_argument('--dirty-ratios', type=_list(float), default=list(DEFAULT_DIRTY_RATIOS))
+    parser.add_argument('--count', type=int, default=100, help='number of instances per run')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs of each benchmark')
+    parser.add_argument('--output', help='file the results are written to, as JSON')
+    args = parser.parse_args(argv)
+
+    dirtyfields = setup_django()
+    from models import FIELD_TYPES
+
+    field_types = args.field_types or list(FIELD_TYPES)
+    for name in args.cases:
+        if name not in CASES:
+            parser.error('unknown case {!r}, expected one of {}'.format(name, ', '.join(CASES)))
+    for name in field_types:
+        if name not in FIELD_TYPES:
+            parser.error('unknown field type {!r}, expected one of {}'.format(name, ', '.join(FIELD_TYPES)))
+
+    old_name = create_test_database()
+    try:
+        print('{:<26} {:<6} {:<9} {:>4} {:>5} {:>13}'.format('case', 'model', 'type', 'flds', 'dirty', 'per instance'))
+        results = run_benchmarks(
+            args.cases, field_types, args.field_counts, args.dirty_ratios, args.count, args.repeat,
+            report=lambda result: print(format_result(result)),
+        )
+    finally:
+        destroy_test_database(old_name)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            json.dump({'metadata': get_metadata(dirtyfields, args), 'results': results}, output, indent=2)
+            output.write('\n')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
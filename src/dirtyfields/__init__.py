@@ -4,8 +4,11 @@ django-dirtyfields library for tracking dirty fields on a Model instance.
 Adapted from https://stackoverflow.com/questions/110803/dirty-fields-in-django
 """
 
-__all__ = ['DirtyFieldsMixin']
+__all__ = ['DirtyFieldsMixin', 'DirtyFieldsManager', 'DirtyFieldsQuerySet', 'bulk_save_dirty', 'stats']
 __version__ = "1.9.9"
 from dirtyfields.dirtyfields import DirtyFieldsMixin
+from dirtyfields.managers import DirtyFieldsManager, DirtyFieldsQuerySet
+from dirtyfields.bulk import bulk_save_dirty
+from dirtyfields.instrumentation import stats
 
 VERSION = tuple(map(int, __version__.split(".")[0:3]))
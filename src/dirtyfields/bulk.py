@@ -0,0 +1,92 @@
+"""
+Saving the dirty fields of many instances at once.
+"""
+from collections import namedtuple
+
+from django.db import router
+
+from .dirtyfields import DirtyFieldsMixin, reset_state
+
+# Statistics of a group of instances saved by `bulk_save_dirty()`.
+# `action` is "create", "update" or "skip", `fields` are the names of the fields updated.
+BulkSaveGroup = namedtuple('BulkSaveGroup', ['model', 'action', 'fields', 'count'])
+
+
+def bulk_save_dirty(instances, batch_size=None, using=None):
+    """
+    Save the dirty fields of `instances` with as few queries as possible.
+
+    Instances with the same dirty fields are updated together with `bulk_update()`, unsaved instances are
+    created with `bulk_create()`, and instances without dirty fields are skipped. The state of the saved
+    instances is then reset from their in-memory values, without querying the database.
+
+    Like `bulk_update()` and `bulk_create()`, no `pre_save` or `post_save` signal is sent. As `bulk_update()` can't
+    change primary keys, a `ValueError` is raised before anything is saved if the primary key of an instance is dirty.
+
+    Return a list of `BulkSaveGroup`, one per group of instances.
+    """
+    to_create = {}
+    to_update = {}
+    skipped = {}
+
+    for instance in instances:
+        model = instance.__class__
+        if instance._state.adding:
+            to_create.setdefault(model, []).append(instance)
+            continue
+
+        dirty_fields = instance.get_dirty_fields(check_relationship=True)
+        if model._meta.pk.name in dirty_fields:
+            raise ValueError(
+                "The primary key of {} instance {!r} is dirty, it can't be saved with bulk_update().".format(
+                    model.__name__, instance.pk))
+        if dirty_fields:
+            # Keep the fields in the order of the model, so that the same signature gives the same key.
+            fields = tuple(name for name in instance._get_tracking_plan().attname_by_name if name in dirty_fields)
+            to_update.setdefault((model, fields), []).append(instance)
+        else:
+            skipped[model] = skipped.get(model, 0) + 1
+
+    groups = []
+
+    for model, objs in to_create.items():
+        queryset = _get_queryset(model, using)
+        queryset.bulk_create(objs, batch_size=batch_size)
+        if not _resets_state(queryset):
+            reset_state_after_bulk_create(objs)
+        groups.append(BulkSaveGroup(model, 'create', (), len(objs)))
+
+    for (model, fields), objs in to_update.items():
+        queryset = _get_queryset(model, using)
+        queryset.bulk_update(objs, fields, batch_size=batch_size)
+        if not _resets_state(queryset):
+            reset_state_after_bulk_update(objs, fields)
+        groups.append(BulkSaveGroup(model, 'update', fields, len(objs)))
+
+    for model, count in skipped.items():
+        groups.append(BulkSaveGroup(model, 'skip', (), count))
+
+    return groups
+
+
+def reset_state_after_bulk_create(objs):
+    """Reset the state of instances created by `bulk_create()`, from their in-memory values."""
+    for obj in objs:
+        if isinstance(obj, DirtyFieldsMixin):
+            reset_state(sender=obj.__class__, instance=obj)
+
+
+def reset_state_after_bulk_update(objs, fields):
+    """Reset the state of the `fields` of instances updated by `bulk_update()`, from their in-memory values."""
+    for obj in objs:
+        if isinstance(obj, DirtyFieldsMixin):
+            reset_state(sender=obj.__class__, instance=obj, update_fields=fields)
+
+
+def _get_queryset(model, using):
+    return model._base_manager.using(using or router.db_for_write(model))
+
+
+def _resets_state(queryset):
+    from .managers import DirtyFieldsQuerySet
+    return isinstance(queryset, DirtyFieldsQuerySet)
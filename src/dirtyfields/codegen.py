@@ -0,0 +1,183 @@
+"""
+Functions capturing and comparing the state of a model, generated for each tracking plan.
+
+The generic code of ``DirtyFieldsMixin`` checks every value for files and expressions, converts
+it with ``to_python()`` and calls the compare function with its keyword arguments. The functions
+generated here are unrolled over the fields of the plan and skip these steps when the type of the
+value tells they are not needed, falling back to the generic conversion otherwise. They are
+built on first use and cached on the plan, hence on the model class.
+"""
+import uuid
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.db import models
+from django.db.models.expressions import BaseExpression, Combinable
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.fields.related_descriptors import ForeignKeyDeferredAttribute
+
+from . import instrumentation
+from .compare import normalise_value, raw_compare
+from .copying import IMMUTABLE_TYPES, copy_value
+from .plan import _get_descriptor
+
+# Types of the values returned as is by the `to_python()` of these field classes.
+TO_PYTHON_IDENTITY_TYPES = {
+    models.CharField: (str,),
+    models.TextField: (str,),
+    models.BooleanField: (bool,),
+    models.IntegerField: (int,),
+    models.FloatField: (float,),
+    models.DecimalField: (Decimal,),
+    models.DateTimeField: (datetime,),
+    models.DateField: (date,),
+    models.TimeField: (time,),
+    models.DurationField: (timedelta,),
+    models.UUIDField: (uuid.UUID,),
+}
+
+# Descriptors returning the value stored in the instance `__dict__` as is.
+PLAIN_DESCRIPTORS = frozenset([DeferredAttribute, ForeignKeyDeferredAttribute])
+
+# Marks a value that is not captured, e.g. an expression.
+_SKIP = object()
+_MISSING = object()
+
+
+def convert_value(field, value):
+    """Convert a value like the generic `DirtyFieldsMixin._capture_fields()`, return `_SKIP` for expressions."""
+    if isinstance(value, File):
+        value = value.name
+    if isinstance(value, (BaseExpression, Combinable)):
+        return _SKIP
+    if instrumentation.enabled:
+        instrumentation.record_current('to_python_calls')
+    try:
+        return field.to_python(value)
+    except ValidationError:
+        return value
+
+
+def get_identity_types(field):
+    """Return the types of the values `field.to_python()` returns as is, `None` included."""
+    if isinstance(field, models.ForeignKey) and type(field).to_python is models.ForeignKey.to_python:
+        # Converted by the target field.
+        return get_identity_types(field.target_field)
+    for klass in type(field).__mro__:
+        if 'to_python' in klass.__dict__:
+            return frozenset(TO_PYTHON_IDENTITY_TYPES.get(klass, ())) | {type(None)}
+    return frozenset()
+
+
+def build_snapshot_function(plan, check_relationship, include_primary_key=True):
+    """
+    Return a function taking an instance and returning the state of its fields, like
+    ``instance._capture_fields(plan.get_fields(check_relationship, include_primary_key))``.
+    """
+    namespace = {'_SKIP': _SKIP, 'convert_value': convert_value}
+    lines = ['def snapshot(instance):', '    data = instance.__dict__', '    state = {}']
+
+    for index, (field, name, attname, copier) in enumerate(plan.get_fields(check_relationship, include_primary_key)):
+        namespace['field_%d' % index] = field
+        namespace['copier_%d' % index] = copier
+        # Deferred fields are the ones missing from the instance `__dict__`.
+        lines.append('    if %r in data:' % attname)
+        if type(_get_descriptor(plan.model, attname)) in PLAIN_DESCRIPTORS:
+            lines.append('        value = data[%r]' % attname)
+        else:
+            lines.append('        value = getattr(instance, %r)' % attname)
+
+        identity_types = get_identity_types(field)
+        if identity_types:
+            namespace['types_%d' % index] = identity_types
+            lines.append('        if type(value) in types_%d:' % index)
+            if copier is copy_value and identity_types <= IMMUTABLE_TYPES:
+                lines.append('            state[%r] = value' % name)
+            else:
+                lines.append('            state[%r] = copier_%d(value)' % (name, index))
+            lines.append('        else:')
+            indent = '            '
+        else:
+            indent = '        '
+        lines.extend([
+            indent + 'value = convert_value(field_%d, value)' % index,
+            indent + 'if value is not _SKIP:',
+            indent + '    state[%r] = copier_%d(value)' % (name, index),
+        ])
+
+    lines.append('    return state')
+    return _compile(lines, namespace, 'snapshot', plan)
+
+
+def build_diff_function(plan, compare_function, normalise_function):
+    """
+    Return a function taking the current and original states of the fields of the plan, and
+    returning the modified fields like `dirtyfields.compare.compare_states()`.
+    """
+    namespace = {'_MISSING': _MISSING, 'IMMUTABLE_TYPES': IMMUTABLE_TYPES}
+    lines = ['def diff(new_state, original_state):', '    modified = {}']
+
+    for index, (field, name, attname, copier) in enumerate(plan.get_fields(check_relationship=True)):
+        field_compare_function = plan.compare_functions.get(name, compare_function)
+        field_normalise_function = plan.normalise_functions.get(name, normalise_function)
+        namespace.update({
+            'compare_%d' % index: field_compare_function[0],
+            'compare_kwargs_%d' % index: field_compare_function[1],
+            'normalise_%d' % index: field_normalise_function[0],
+            'normalise_kwargs_%d' % index: field_normalise_function[1],
+        })
+        if field_compare_function[0] is raw_compare and not field_compare_function[1]:
+            is_identical = 'new_value == original_value'
+        elif field_compare_function[1]:
+            is_identical = 'compare_%d(new_value, original_value, **compare_kwargs_%d)' % (index, index)
+        else:
+            is_identical = 'compare_%d(new_value, original_value)' % index
+        if field_normalise_function[0] is normalise_value and not field_normalise_function[1]:
+            saved, current = 'original_value', 'new_value'
+        elif field_normalise_function[1]:
+            saved = 'normalise_%d(original_value, **normalise_kwargs_%d)' % (index, index)
+            current = 'normalise_%d(new_value, **normalise_kwargs_%d)' % (index, index)
+        else:
+            saved, current = 'normalise_%d(original_value)' % index, 'normalise_%d(new_value)' % index
+
+        lines.extend([
+            '    new_value = new_state.get(%r, _MISSING)' % name,
+            '    if new_value is not _MISSING:',
+            '        original_value = original_state.get(%r, _MISSING)' % name,
+            '        if original_value is not _MISSING and not (',
+            '                new_value is original_value and type(new_value) in IMMUTABLE_TYPES) and not (%s):'
+            % is_identical,
+            "            modified[%r] = {'saved': %s, 'current': %s}" % (name, saved, current),
+        ])
+    lines.append('    return modified')
+    return _compile(lines, namespace, 'diff', plan)
+
+
+def _compile(lines, namespace, function_name, plan):
+    filename = '<dirtyfields %s of %s>' % (function_name, plan.model._meta.label)
+    exec(compile('\n'.join(lines) + '\n', filename, 'exec'), namespace)
+    return namespace[function_name]
+
+
+def get_snapshot_function(plan, check_relationship, include_primary_key=True):
+    key = ('snapshot', bool(check_relationship), bool(include_primary_key))
+    try:
+        return plan.generated_functions[key]
+    except KeyError:
+        function = plan.generated_functions[key] = build_snapshot_function(
+            plan, check_relationship, include_primary_key)
+        return function
+
+
+def get_diff_function(plan, compare_function, normalise_function):
+    # The functions are class attributes, but they can still be changed on a class or an instance.
+    function = plan.generated_functions.get('diff')
+    if (function is None or function.compare_function is not compare_function
+            or function.normalise_function is not normalise_function):
+        function = plan.generated_functions['diff'] = build_diff_function(
+            plan, compare_function, normalise_function)
+        function.compare_function = compare_function
+        function.normalise_function = normalise_function
+    return function
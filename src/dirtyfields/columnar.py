@@ -0,0 +1,246 @@
+"""
+Column-wise storage of the original state of the instances loaded by a queryset.
+
+With ``DirtyFieldsQuerySet.columnar_state()``, the original values of the loaded instances are stored
+in one list per tracked field, and each instance only holds a ``RowState`` referencing its row in these
+columns. The dirty rows and columns of the whole result set can then be computed in one pass, one
+column at a time, and saved with one ``bulk_update()`` per dirty column.
+
+Columns of integer, float and boolean fields are compared with NumPy when it is installed.
+"""
+from collections import namedtuple
+from collections.abc import MutableMapping
+
+from django.db import transaction
+
+from . import instrumentation
+from .bulk import BulkSaveGroup, _get_queryset, _resets_state, reset_state_after_bulk_update
+from .codegen import _SKIP, PLAIN_DESCRIPTORS, convert_value, get_identity_types
+from .compact import NOT_CAPTURED
+from .compare import raw_compare
+from .copying import IMMUTABLE_TYPES, copy_value
+from .plan import _get_descriptor, get_tracking_plan
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover
+    numpy = None
+
+# Types of the values of the columns that may be compared with NumPy.
+NUMERIC_TYPES = frozenset([bool, int, float, type(None)])
+
+# Dirty rows and columns of a `ColumnarSnapshot`.
+# `rows` is a list of `(instance, fields)` tuples, `columns` maps field names to lists of instances.
+DirtyRows = namedtuple('DirtyRows', ['rows', 'columns'])
+
+
+class RowState(MutableMapping):
+    """Mapping of field names to the values stored in a row of a `ColumnarSnapshot`."""
+
+    __slots__ = ('snapshot', 'row')
+
+    def __init__(self, snapshot, row):
+        self.snapshot = snapshot
+        self.row = row
+
+    def __getitem__(self, name):
+        value = self.snapshot.columns[name][self.row]
+        if value is NOT_CAPTURED:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        self.snapshot.columns[name][self.row] = value
+
+    def __delitem__(self, name):
+        column = self.snapshot.columns[name]
+        if column[self.row] is NOT_CAPTURED:
+            raise KeyError(name)
+        column[self.row] = NOT_CAPTURED
+
+    def __iter__(self):
+        row = self.row
+        for name, column in self.snapshot.columns.items():
+            if column[row] is not NOT_CAPTURED:
+                yield name
+
+    def __len__(self):
+        row = self.row
+        return sum(1 for column in self.snapshot.columns.values() if column[row] is not NOT_CAPTURED)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+    def release(self, instance):
+        """Release the values of the row once `instance`, whose original state it stores, no longer uses it."""
+        if self.snapshot.instances[self.row] is instance:
+            self.snapshot.release(self.row)
+
+
+class ColumnarSnapshot(object):
+    """
+    Original state of instances of a model, stored in one list per tracked field.
+
+    Only the instances whose state is a plain dict when they are added are stored, e.g. not the instances
+    loaded without tracking or in lazy mode. Their row is detached and its values released when their whole
+    state is captured again, e.g. by `save()`, and `get_dirty()` then asks the instance for its dirty fields.
+
+    `plan` is the tracking plan of the instances, the one of the model by default.
+    """
+
+    def __init__(self, model, plan=None):
+        self.model = model
+        self.plan = plan or get_tracking_plan(model)
+        self.columns = {name: [] for name in self.plan.names}
+        self.instances = []
+
+    def __len__(self):
+        return len(self.instances)
+
+    def add(self, instances):
+        """Move the original state of `instances` into new rows of the columns."""
+        for instance in instances:
+            state = instance.__dict__.get('_original_state')
+            if type(state) is not dict:
+                continue
+            row = len(self.instances)
+            for name, column in self.columns.items():
+                column.append(state.get(name, NOT_CAPTURED))
+            self.instances.append(instance)
+            instance.__dict__['_original_state'] = RowState(self, row)
+
+    def release(self, row):
+        """Forget the original values of a detached row."""
+        for column in self.columns.values():
+            column[row] = NOT_CAPTURED
+
+    def is_attached(self, row):
+        """Return whether the instance of `row` still stores its original state in the columns."""
+        state = self.instances[row].__dict__.get('_original_state')
+        return type(state) is RowState and state.snapshot is self and state.row == row
+
+    def get_dirty(self, check_relationship=False):
+        """Return the `DirtyRows` of the instances, comparing their current and original values column by column."""
+        attached_rows = []
+        dirty_fields = {}
+        for row, instance in enumerate(self.instances):
+            if self.is_attached(row):
+                attached_rows.append(row)
+            else:
+                fields = instance.get_dirty_fields(check_relationship=check_relationship)
+                if fields:
+                    dirty_fields[row] = set(fields)
+
+        if attached_rows:
+            for field, name, attname, copier in self.plan.get_fields(check_relationship):
+                for row in self._diff_column(field, name, attname, copier, attached_rows):
+                    dirty_fields.setdefault(row, set()).add(name)
+
+        rows = []
+        columns = {}
+        for row in sorted(dirty_fields):
+            instance = self.instances[row]
+            # Keep the fields in the order of the model.
+            fields = tuple(name for name in self.plan.attname_by_name if name in dirty_fields[row])
+            rows.append((instance, fields))
+            for name in fields:
+                columns.setdefault(name, []).append(instance)
+        return DirtyRows(rows, columns)
+
+    def bulk_update_dirty(self, batch_size=None, using=None):
+        """
+        Save the dirty fields of the instances with one `bulk_update()` per dirty column, in a transaction,
+        and reset the state of the saved fields. Return a list of `BulkSaveGroup`, one per column.
+        """
+        queryset = _get_queryset(self.model, using)
+        groups = []
+        with transaction.atomic(using=queryset.db):
+            for name, objs in self.get_dirty(check_relationship=True).columns.items():
+                queryset.bulk_update(objs, [name], batch_size=batch_size)
+                if not _resets_state(queryset):
+                    reset_state_after_bulk_update(objs, [name])
+                groups.append(BulkSaveGroup(self.model, 'update', (name,), len(objs)))
+        return groups
+
+    def _diff_column(self, field, name, attname, copier, rows):
+        """Return the rows among `rows` whose current value of the field differs from its original value."""
+        column = self.columns[name]
+        original = column if len(rows) == len(column) else [column[row] for row in rows]
+        current = self._get_current_column(field, attname, copier, rows)
+
+        compare_function, compare_kwargs = self.plan.compare_functions.get(name, self.model.compare_function)
+        identity_types = get_identity_types(field)
+        if (numpy is not None and compare_function is raw_compare and not compare_kwargs
+                and identity_types and identity_types <= NUMERIC_TYPES):
+            dirty_indexes = _diff_numeric(current, original)
+            if dirty_indexes is not None:
+                return [rows[index] for index in dirty_indexes]
+
+        dirty_rows = []
+        for row, new_value, original_value in zip(rows, current, original):
+            if new_value is _SKIP or original_value is NOT_CAPTURED:
+                continue
+            if new_value is original_value and type(new_value) in IMMUTABLE_TYPES:
+                continue
+            if not compare_function(new_value, original_value, **compare_kwargs):
+                dirty_rows.append(row)
+        return dirty_rows
+
+    def _get_current_column(self, field, attname, copier, rows):
+        """Capture the current value of a field for each of `rows`, like `DirtyFieldsMixin._capture_fields()`."""
+        plain_descriptor = type(_get_descriptor(self.model, attname)) in PLAIN_DESCRIPTORS
+        identity_types = get_identity_types(field)
+        as_is = copier is copy_value and identity_types <= IMMUTABLE_TYPES
+        instrumented = instrumentation.enabled
+        if instrumented:
+            # `convert_value()` and the copiers record their measures for the model.
+            previous_model = instrumentation.set_model(self.model)
+        current = []
+        try:
+            for row in rows:
+                instance = self.instances[row]
+                data = instance.__dict__
+                if attname not in data:
+                    # Deferred field.
+                    current.append(_SKIP)
+                    continue
+                value = data[attname] if plain_descriptor else getattr(instance, attname)
+                if type(value) not in identity_types:
+                    value = convert_value(field, value)
+                    if value is _SKIP:
+                        current.append(_SKIP)
+                        continue
+                elif as_is:
+                    current.append(value)
+                    continue
+                current.append(copier(value))
+        finally:
+            if instrumented:
+                instrumentation.set_model(previous_model)
+        return current
+
+
+def _diff_numeric(current, original):
+    """
+    Return the indexes of the differing values of two columns with NumPy, or `None` if the columns don't
+    both convert to arrays of the same numeric type, e.g. when they hold `None` or uncaptured values.
+    """
+    current_array = numpy.array(current)
+    original_array = numpy.array(original)
+    if (current_array.dtype != original_array.dtype or current_array.dtype.kind not in 'biuf'
+            or current_array.shape != (len(current),)):
+        return None
+    different = current_array != original_array
+    if current_array.dtype.kind == 'f':
+        # Like `compare_states()` and `raw_compare()`, NaN values are only equal when they are the same object.
+        for index in numpy.flatnonzero(numpy.isnan(current_array) & numpy.isnan(original_array)).tolist():
+            different[index] = current[index] is not original[index]
+    return numpy.flatnonzero(different).tolist()
+
+
+def get_snapshot(instance):
+    """Return the `ColumnarSnapshot` storing the original state of `instance`, or `None`."""
+    state = instance.__dict__.get('_original_state')
+    if type(state) is RowState and state.snapshot.is_attached(state.row):
+        return state.snapshot
+    return None
@@ -0,0 +1,77 @@
+"""
+Compact storage of the original state, for models setting ``ENABLE_COMPACT_STATE``.
+
+Instead of a dict per instance, the original state is stored as a tuple holding the values of the
+fields in the order of the tracking plan of the model, with ``NOT_CAPTURED`` for the fields whose
+value was not captured (e.g. deferred fields or expressions). ``_original_state`` is then a
+read-only mapping built from this tuple when it is accessed, and assigning a mapping to it
+stores a new tuple.
+"""
+from collections.abc import Mapping
+
+from .plan import get_tracking_plan
+
+
+class _NotCaptured(object):
+    def __repr__(self):
+        return 'NOT_CAPTURED'
+
+    def __reduce__(self):
+        # Pickled by name, so that unpickled states still use the same sentinel.
+        return 'NOT_CAPTURED'
+
+
+NOT_CAPTURED = _NotCaptured()
+
+
+class CompactState(Mapping):
+    """Read-only mapping of field names to the values stored in a compact state."""
+
+    __slots__ = ('_names', '_indexes', '_values')
+
+    def __init__(self, names, indexes, values):
+        self._names = names
+        self._indexes = indexes
+        self._values = values
+
+    def __getitem__(self, name):
+        value = self._values[self._indexes[name]]
+        if value is NOT_CAPTURED:
+            raise KeyError(name)
+        return value
+
+    def __iter__(self):
+        for name, value in zip(self._names, self._values):
+            if value is not NOT_CAPTURED:
+                yield name
+
+    def __len__(self):
+        return sum(1 for value in self._values if value is not NOT_CAPTURED)
+
+    def __repr__(self):
+        return repr(dict(self.items()))
+
+
+class CompactStateDescriptor(object):
+    """Descriptor of `_original_state`, stored as a tuple in the instance `_dirtyfields_state`."""
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        instance._capture_missing_state()
+        try:
+            values = instance.__dict__['_dirtyfields_state']
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '_original_state'".format(owner.__name__))
+        plan = get_tracking_plan(instance.__class__)
+        return CompactState(plan.names, plan.name_indexes, values)
+
+    def __set__(self, instance, state):
+        plan = get_tracking_plan(instance.__class__)
+        instance.__dict__['_dirtyfields_state'] = tuple(state.get(name, NOT_CAPTURED) for name in plan.names)
+
+    def __delete__(self, instance):
+        try:
+            del instance.__dict__['_dirtyfields_state']
+        except KeyError:
+            raise AttributeError('_original_state')
@@ -3,8 +3,15 @@ from datetime import datetime, timezone
 
 from django.utils import timezone as django_timezone
 
+from .copying import IMMUTABLE_TYPES
 
-def compare_states(new_state, original_state, compare_function, normalise_function):
+
+def compare_states(new_state, original_state, compare_function, normalise_function,
+                   field_compare_functions=None, field_normalise_functions=None):
+    """
+    Return the modified fields of `new_state`. `field_compare_functions` and `field_normalise_functions`
+    can map keys to `(function, kwargs)` tuples used instead of `compare_function` and `normalise_function`.
+    """
     modified_field = {}
 
     for key, value in new_state.items():
@@ -16,13 +23,23 @@ def compare_states(new_state, original_state, compare_function, normalise_functi
             # We should not include them in the comparison.
             continue
 
-        is_identical = compare_function[0](value, original_value, **compare_function[1])
+        # An immutable value is not modified when it is still the same object.
+        if value is original_value and type(value) in IMMUTABLE_TYPES:
+            continue
+
+        key_compare_function = compare_function
+        if field_compare_functions:
+            key_compare_function = field_compare_functions.get(key, compare_function)
+        is_identical = key_compare_function[0](value, original_value, **key_compare_function[1])
         if is_identical:
             continue
 
+        key_normalise_function = normalise_function
+        if field_normalise_functions:
+            key_normalise_function = field_normalise_functions.get(key, normalise_function)
         modified_field[key] = {
-            'saved': normalise_function[0](original_value, **normalise_function[1]),
-            'current': normalise_function[0](value, **normalise_function[1])
+            'saved': key_normalise_function[0](original_value, **key_normalise_function[1]),
+            'current': key_normalise_function[0](value, **key_normalise_function[1])
         }
 
     return modified_field
@@ -0,0 +1,325 @@
+"""
+Copy-on-write tracking of the dicts and lists held by the fields listed in ``COPY_ON_WRITE_FIELDS``.
+
+Such values are wrapped in ``TrackedDict`` and ``TrackedList`` proxies when they are assigned to
+the field, and the captured state shares the proxy instead of holding a deep copy of it. Before the
+first in-place change of the value, or of any dict or list nested in it, the proxy copies the
+original value into the state. Values that are only read are never copied.
+
+Nested dicts and lists are wrapped when they are first accessed, so that changes made through them
+are noticed too. Only JSON-like values (dicts, lists and immutable scalars) are supported.
+
+The dicts and lists assigned to the field, or stored in its value, are copied, as other references to
+them could otherwise change the value and the state sharing it without being noticed. Only the values
+read from the database, which nothing else references, are wrapped without being copied.
+"""
+import weakref
+from copy import deepcopy
+
+
+class _Tracker(object):
+    """Links the proxies of a field value to the instance whose state may share them."""
+
+    __slots__ = ('instance_ref', 'name', 'shared')
+
+    def __init__(self, instance, name):
+        self.instance_ref = weakref.ref(instance)
+        self.name = name
+        # Whether a captured state may share the value, cleared once the original value is copied.
+        self.shared = False
+
+    def touch(self):
+        """Called before the value is changed in place, copy it into the states sharing it."""
+        if not self.shared:
+            return
+        self.shared = False
+        instance = self.instance_ref()
+        if instance is None:
+            return
+        for state_name in ('_original_state', '_dirtyfields_lazy'):
+            state = instance.__dict__.get(state_name)
+            if state is not None:
+                value = state.get(self.name)
+                if isinstance(value, (TrackedDict, TrackedList)) and value._dirtyfields_tracker is self:
+                    state[self.name] = plain_copy(value)
+
+
+def _wrap(value, tracker):
+    """Wrap a nested value in a proxy of `tracker`, if it is a dict or a list."""
+    if type(value) is dict or (type(value) is TrackedDict and value._dirtyfields_tracker is not tracker):
+        return TrackedDict(value, tracker)
+    if type(value) is list or (type(value) is TrackedList and value._dirtyfields_tracker is not tracker):
+        return TrackedList(value, tracker)
+    return value
+
+
+def _detach(value):
+    """Return a plain copy of `value` if it is a dict or a list, which other objects may reference."""
+    if type(value) in (dict, list, TrackedDict, TrackedList):
+        return plain_copy(value)
+    return value
+
+
+def plain_copy(value):
+    """Return a deep copy of `value`, with plain dicts and lists instead of proxies."""
+    if type(value) in (dict, TrackedDict):
+        return {key: plain_copy(item) for key, item in dict.items(value)}
+    if type(value) in (list, TrackedList):
+        return [plain_copy(item) for item in list.__iter__(value)]
+    return deepcopy(value)
+
+
+class TrackedDict(dict):
+    __slots__ = ('_dirtyfields_tracker',)
+
+    def __init__(self, value, tracker):
+        dict.__init__(self, dict.items(value))
+        self._dirtyfields_tracker = tracker
+
+    def _wrap_item(self, key, value):
+        wrapped = _wrap(value, self._dirtyfields_tracker)
+        if wrapped is not value:
+            dict.__setitem__(self, key, wrapped)
+        return wrapped
+
+    def _wrap_items(self):
+        for key, value in list(dict.items(self)):
+            self._wrap_item(key, value)
+
+    # Accessors, wrapping the nested values they return.
+
+    def __getitem__(self, key):
+        return self._wrap_item(key, dict.__getitem__(self, key))
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def __iter__(self):
+        # Iterating keys does not expose values, but defining it makes `dict(value)` and `{**value}`
+        # use `keys()` and `__getitem__()`, so that the values they copy are wrapped.
+        return dict.__iter__(self)
+
+    def values(self):
+        self._wrap_items()
+        return dict.values(self)
+
+    def items(self):
+        self._wrap_items()
+        return dict.items(self)
+
+    def copy(self):
+        self._wrap_items()
+        return dict(dict.items(self))
+
+    __copy__ = copy
+
+    def __or__(self, other):
+        self._wrap_items()
+        return dict.__or__(dict(dict.items(self)), other)
+
+    def __ror__(self, other):
+        self._wrap_items()
+        return dict.__or__(other, dict(dict.items(self)))
+
+    # Mutators, copying the original value first.
+
+    def __setitem__(self, key, value):
+        self._dirtyfields_tracker.touch()
+        dict.__setitem__(self, key, _detach(value))
+
+    def __delitem__(self, key):
+        self._dirtyfields_tracker.touch()
+        dict.__delitem__(self, key)
+
+    def clear(self):
+        self._dirtyfields_tracker.touch()
+        dict.clear(self)
+
+    def pop(self, *args):
+        self._dirtyfields_tracker.touch()
+        return dict.pop(self, *args)
+
+    def popitem(self):
+        self._dirtyfields_tracker.touch()
+        return dict.popitem(self)
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._dirtyfields_tracker.touch()
+            dict.__setitem__(self, key, _detach(default))
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        self._dirtyfields_tracker.touch()
+        dict.update(self, {key: _detach(value) for key, value in dict(*args, **kwargs).items()})
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    # Copies and pickles are plain dicts.
+
+    def __deepcopy__(self, memo):
+        return plain_copy(self)
+
+    def __reduce_ex__(self, protocol):
+        return dict, (), None, None, iter(dict.items(self))
+
+
+class TrackedList(list):
+    __slots__ = ('_dirtyfields_tracker',)
+
+    def __init__(self, value, tracker):
+        list.__init__(self, list.__iter__(value))
+        self._dirtyfields_tracker = tracker
+
+    def _wrap_items(self):
+        tracker = self._dirtyfields_tracker
+        for index, value in enumerate(list.__iter__(self)):
+            wrapped = _wrap(value, tracker)
+            if wrapped is not value:
+                list.__setitem__(self, index, wrapped)
+
+    # Accessors, wrapping the nested values they return.
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            self._wrap_items()
+            return list.__getitem__(self, index)
+        value = list.__getitem__(self, index)
+        wrapped = _wrap(value, self._dirtyfields_tracker)
+        if wrapped is not value:
+            list.__setitem__(self, index, wrapped)
+        return wrapped
+
+    def __iter__(self):
+        self._wrap_items()
+        return list.__iter__(self)
+
+    def __reversed__(self):
+        self._wrap_items()
+        return list.__reversed__(self)
+
+    def copy(self):
+        self._wrap_items()
+        return list(list.__iter__(self))
+
+    __copy__ = copy
+
+    def __add__(self, other):
+        self._wrap_items()
+        return list.__add__(list(list.__iter__(self)), other)
+
+    def __mul__(self, count):
+        self._wrap_items()
+        return list.__mul__(list(list.__iter__(self)), count)
+
+    __rmul__ = __mul__
+
+    # Mutators, copying the original value first.
+
+    def __setitem__(self, index, value):
+        self._dirtyfields_tracker.touch()
+        if isinstance(index, slice):
+            value = [_detach(item) for item in value]
+        else:
+            value = _detach(value)
+        list.__setitem__(self, index, value)
+
+    def __delitem__(self, index):
+        self._dirtyfields_tracker.touch()
+        list.__delitem__(self, index)
+
+    def __iadd__(self, other):
+        self._dirtyfields_tracker.touch()
+        return list.__iadd__(self, [_detach(item) for item in other])
+
+    def __imul__(self, count):
+        self._dirtyfields_tracker.touch()
+        return list.__imul__(self, count)
+
+    def append(self, value):
+        self._dirtyfields_tracker.touch()
+        list.append(self, _detach(value))
+
+    def extend(self, values):
+        self._dirtyfields_tracker.touch()
+        list.extend(self, [_detach(item) for item in values])
+
+    def insert(self, index, value):
+        self._dirtyfields_tracker.touch()
+        list.insert(self, index, _detach(value))
+
+    def pop(self, *args):
+        self._dirtyfields_tracker.touch()
+        return list.pop(self, *args)
+
+    def remove(self, value):
+        self._dirtyfields_tracker.touch()
+        list.remove(self, value)
+
+    def clear(self):
+        self._dirtyfields_tracker.touch()
+        list.clear(self)
+
+    def sort(self, *args, **kwargs):
+        self._dirtyfields_tracker.touch()
+        list.sort(self, *args, **kwargs)
+
+    def reverse(self):
+        self._dirtyfields_tracker.touch()
+        list.reverse(self)
+
+    # Copies and pickles are plain lists.
+
+    def __deepcopy__(self, memo):
+        return plain_copy(self)
+
+    def __reduce_ex__(self, protocol):
+        return list, (), None, iter(list.__iter__(self))
+
+
+def wrap_field_value(instance, name, value, copy=True):
+    """
+    Return the value to store in a copy-on-write field of `instance`, assigned `value`. Unless it already
+    tracks this field, `value` is copied first, or only wrapped if `copy` is false.
+    """
+    if type(value) is dict or type(value) is TrackedDict:
+        if not _needs_root(instance, name, value):
+            return value
+        return TrackedDict(plain_copy(value) if copy else value, _Tracker(instance, name))
+    if type(value) is list or type(value) is TrackedList:
+        if not _needs_root(instance, name, value):
+            return value
+        return TrackedList(plain_copy(value) if copy else value, _Tracker(instance, name))
+    return value
+
+
+def _needs_root(instance, name, value):
+    # A proxy already tracking this field of this instance is kept as is.
+    tracker = getattr(value, '_dirtyfields_tracker', None)
+    return tracker is None or tracker.name != name or tracker.instance_ref() is not instance
+
+
+def make_copy_on_write_copier(copier):
+    """
+    Return a copier sharing the proxies of copy-on-write fields with the captured state,
+    and copying other values with `copier`.
+    """
+    def copy_on_write_copier(value):
+        if type(value) is TrackedDict or type(value) is TrackedList:
+            value._dirtyfields_tracker.shared = True
+            return value
+        return copier(value)
+
+    return copy_on_write_copier
+
+
+def unshare_state(state):
+    """Return `state` with plain copies of the proxies it shares, e.g. before pickling an instance."""
+    return {
+        name: plain_copy(value) if isinstance(value, (TrackedDict, TrackedList)) else value
+        for name, value in state.items()
+    }
@@ -0,0 +1,123 @@
+"""
+Strategies used to copy field values when the state of an instance is captured.
+
+A copier is a function taking a value and returning a copy of it that will not change when
+the original value is mutated in place. Copiers can be registered for a Python type, in which
+case they also apply to its subclasses, or for a Django field class, in which case they take
+precedence over the type of the value for every field of that class.
+"""
+import uuid
+from copy import deepcopy
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Field
+
+from . import instrumentation
+
+IMMUTABLE_TYPES = frozenset([
+    type(None), bool, int, float, complex, str, bytes, Decimal,
+    date, datetime, time, timedelta, uuid.UUID,
+])
+
+
+def identity_copy(value):
+    """Immutable values can be shared with the instance."""
+    return value
+
+
+def shallow_copy(value):
+    """
+    Copy a list or dict whose items are all immutable without recursing into them,
+    any other value is deep copied.
+    """
+    if type(value) is dict:
+        items = value.values()
+    elif type(value) is list:
+        items = value
+    else:
+        return _deepcopy(value)
+    for item in items:
+        if type(item) not in IMMUTABLE_TYPES:
+            return _deepcopy(value)
+    return value.copy()
+
+
+def _deepcopy(value):
+    if instrumentation.enabled:
+        instrumentation.record_current('deepcopy_fallbacks')
+    return deepcopy(value)
+
+
+_type_copiers = dict.fromkeys(IMMUTABLE_TYPES, identity_copy)
+_type_copiers.update({
+    list: shallow_copy,
+    dict: shallow_copy,
+    # psycopg2 returns uncopyable type buffer for bytea
+    memoryview: bytes,
+})
+_field_copiers = {}
+
+# Copiers resolved for types that are not registered themselves, e.g. subclasses of registered types.
+_resolved_type_copiers = {}
+
+
+def register_copier(cls, copier):
+    """Register `copier` for values of the Python type `cls`, or for fields of the Django field class `cls`."""
+    if issubclass(cls, Field):
+        _field_copiers[cls] = copier
+    else:
+        _type_copiers[cls] = copier
+    _copiers_changed()
+
+
+def unregister_copier(cls):
+    if issubclass(cls, Field):
+        del _field_copiers[cls]
+    else:
+        del _type_copiers[cls]
+    _copiers_changed()
+
+
+def _copiers_changed():
+    # Field copiers are stored in the tracking plans.
+    from .plan import clear_tracking_plans
+    _resolved_type_copiers.clear()
+    clear_tracking_plans()
+
+
+def get_type_copier(value_type):
+    try:
+        return _type_copiers[value_type]
+    except KeyError:
+        pass
+    try:
+        return _resolved_type_copiers[value_type]
+    except KeyError:
+        pass
+    for base in value_type.__mro__[1:]:
+        if base in _type_copiers:
+            copier = _type_copiers[base]
+            break
+    else:
+        copier = deepcopy
+    _resolved_type_copiers[value_type] = copier
+    return copier
+
+
+def copy_value(value):
+    """Copy `value` with the copier registered for its type, falling back to a deepcopy."""
+    copier = _type_copiers.get(type(value))
+    if copier is None:
+        copier = get_type_copier(type(value))
+        if copier is deepcopy:
+            copier = _deepcopy
+    return copier(value)
+
+
+def get_field_copier(field):
+    """Return the copier to use for values of `field`."""
+    for base in type(field).__mro__:
+        if base in _field_copiers:
+            return _field_copiers[base]
+    return copy_value
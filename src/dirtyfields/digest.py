@@ -0,0 +1,55 @@
+"""
+Digests stored in the state of an instance instead of large field values.
+
+For the fields listed in ``DIGEST_FIELDS``, the value is serialised and only its digest and
+length are kept, both in the original state and in the current state they are compared with.
+``get_dirty_fields()`` returns the digest as the saved value of these fields, and their current
+value is read from the instance.
+"""
+import hashlib
+import json
+from collections import namedtuple
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+class ValueDigest(namedtuple('ValueDigest', ['digest', 'length'])):
+    """
+    Digest of a field value. ``digest`` is a BLAKE2b digest of the serialised value, and ``length``
+    the size of the serialised value, in bytes.
+    """
+    __slots__ = ()
+
+    def __repr__(self):
+        return '<ValueDigest {}... length={}>'.format(self.digest[:6].hex(), self.length)
+
+
+def serialise_value(value, encoder=None):
+    """Return the bytes the digest of `value` is computed from, or `None` if it can't be serialised."""
+    if isinstance(value, str):
+        return value.encode('utf-8', 'surrogatepass')
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    if value is None:
+        return None
+    try:
+        # Keys are sorted, as the order of dict keys does not matter when comparing values.
+        return json.dumps(value, sort_keys=True, cls=encoder or DjangoJSONEncoder).encode('utf-8')
+    except (TypeError, ValueError):
+        return None
+
+
+def make_digest_copier(field, copier, min_size=0):
+    """
+    Return a copier storing the digest of the values of `field`, for values whose serialised size is
+    at least `min_size` bytes. Smaller values, and values that can't be serialised, are copied with `copier`.
+    """
+    encoder = getattr(field, 'encoder', None)
+
+    def digest_copier(value):
+        data = serialise_value(value, encoder)
+        if data is None or len(data) < min_size:
+            return copier(value)
+        return ValueDigest(hashlib.blake2b(data, digest_size=16).digest(), len(data))
+
+    return digest_copier
@@ -1,51 +1,224 @@
-from copy import deepcopy
-from django.core.exceptions import ValidationError
+import threading
+from collections.abc import MutableMapping
+
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.core.files import File
 from django.db.models.expressions import BaseExpression
 from django.db.models.expressions import Combinable
-from django.db.models.signals import post_save, m2m_changed
+from django.core.signals import setting_changed
+from django.db.models.signals import class_prepared, post_init, post_save, m2m_changed
+from django.db.models import DEFERRED
 
+from . import instrumentation
+from .codegen import get_diff_function, get_snapshot_function
+from .compact import CompactStateDescriptor
 from .compare import raw_compare, compare_states, normalise_value
-
-
-def get_m2m_with_model(given_model):
-    return [
-        (f, f.model if f.model != given_model else None)
-        for f in given_model._meta.get_fields()
-        if f.many_to_many and not f.auto_created
-    ]
+from .copy_on_write import unshare_state, wrap_field_value
+from .copying import IMMUTABLE_TYPES
+from .plan import clear_tracking_plans, get_m2m_with_model, get_tracking_plan  # noqa: F401
+
+# `model` holds the model class being built by `DirtyFieldsMixin.from_db()`, whose `__init__()`
+# then leaves the capture of the state to `from_db()`.
+# `instance` holds the instance being initialized with the values read by `from_db()`.
+# `options` holds the `(model, options)` of the `DirtyFieldsQuerySet` building instances, if any.
+_loading = threading.local()
+
+UNTRACKED_ERROR = (
+    "{model} instance was loaded without dirty tracking (e.g. with `without_dirty_tracking()`), "
+    "its dirty fields are unknown."
+)
+
+
+class OriginalStateDescriptor(object):
+    """
+    Descriptor of `_original_state` when it is not stored in the instance `__dict__`, capturing the state of
+    instances created without primary key, or materialising it in lazy mode, when it is first accessed.
+    """
+
+    def __get__(self, instance, owner=None):
+        if instance is None:
+            return self
+        instance._capture_missing_state()
+        if '_dirtyfields_lazy' in instance.__dict__:
+            instance._materialise_state()
+        try:
+            return instance.__dict__['_original_state']
+        except KeyError:
+            raise AttributeError("'{}' object has no attribute '_original_state'".format(owner.__name__))
 
 
 class DirtyFieldsMixin(object):
     compare_function = (raw_compare, {})
     normalise_function = (normalise_value, {})
 
+    # `(function, kwargs)` tuples used instead of `compare_function` and `normalise_function`
+    # for some fields, by field name or by Django field class.
+    field_compare_functions = None
+    field_normalise_functions = None
+
     # This mode has been introduced to handle some situations like this one:
     # https://github.com/romgar/django-dirtyfields/issues/73
     ENABLE_M2M_CHECK = False
 
     FIELDS_TO_CHECK = None
 
+    # Record the fields assigned since the state was captured, so that `get_dirty_fields()`
+    # only has to compare them, plus the fields holding mutable values.
+    ENABLE_WRITE_TRACKING = False
+
+    # Only capture the original value of a field when it is first assigned, or when the
+    # dirty fields are first requested, instead of when the instance is initialized.
+    ENABLE_LAZY_STATE = False
+
+    # Fields whose original state is the digest of their value instead of a copy of it, see `dirtyfields.digest`.
+    # Only values whose serialised size is at least `DIGEST_MIN_SIZE` bytes are digested.
+    DIGEST_FIELDS = None
+    DIGEST_MIN_SIZE = 0
+
+    # Fields holding dicts or lists shared with the state until they are changed in place,
+    # instead of being copied, see `dirtyfields.copy_on_write`.
+    COPY_ON_WRITE_FIELDS = None
+
+    # Fields whose immutable values are interned in a table of the model holding at most `INTERN_TABLE_SIZE`
+    # values, so that equal values captured by many instances share one object, see `dirtyfields.interning`.
+    INTERN_FIELDS = None
+    INTERN_TABLE_SIZE = 1024
+
+    # Store the original state of instances as a tuple instead of a dict, see `dirtyfields.compact`.
+    # Can't be combined with `ENABLE_LAZY_STATE` and `COPY_ON_WRITE_FIELDS`.
+    ENABLE_COMPACT_STATE = False
+
+    # Capture and compare the state with functions generated for the model, see `dirtyfields.codegen`.
+    ENABLE_CODEGEN = False
+
+    # Cached `TrackingPlan` of the model class, see `dirtyfields.plan.get_tracking_plan()`.
+    _dirtyfields_plan = None
+
+    _original_state = OriginalStateDescriptor()
+
     def __init__(self, *args, **kwargs):
-        super(DirtyFieldsMixin, self).__init__(*args, **kwargs)
-        post_save.connect(
-            reset_state, sender=self.__class__, weak=False,
-            dispatch_uid='{name}-DirtyFieldsMixin-sweeper'.format(
-                name=self.__class__.__name__))
-        if self.ENABLE_M2M_CHECK:
-            self._connect_m2m_relations()
-        reset_state(sender=self.__class__, instance=self)
+        from_db = getattr(_loading, 'model', None) is self.__class__
+        if from_db:
+            _loading.model = None
+            _loading.instance = self
+            try:
+                super(DirtyFieldsMixin, self).__init__(*args, **kwargs)
+            finally:
+                _loading.instance = None
+        else:
+            super(DirtyFieldsMixin, self).__init__(*args, **kwargs)
+        # While an instance without primary key is being added, `get_dirty_fields()` considers every field
+        # dirty, its state is only captured by `post_save` once it is saved, or when it is first needed.
+        if not from_db and self.pk is not None:
+            reset_state(sender=self.__class__, instance=self)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        _loading.model = cls
+        try:
+            instance = super(DirtyFieldsMixin, cls).from_db(db, field_names, values)
+        finally:
+            _loading.model = None
+
+        capture_m2m = True
+        options = getattr(_loading, 'options', None)
+        if options is not None and options[0] is cls:
+            if not options[1].get('track', True):
+                instance.__dict__['_dirtyfields_untracked'] = True
+                return instance
+            if options[1].get('fields'):
+                instance.__dict__['_dirtyfields_fields_plan'] = get_tracking_plan(cls).narrow(options[1]['fields'])
+            # The m2m state of the loaded instances is then captured in batches by the queryset,
+            # or once their related objects are prefetched.
+            capture_m2m = not (options[1].get('batch_m2m', False) or options[1].get('defer_m2m', False))
+
+        instance._capture_db_state(field_names, values, capture_m2m)
+        return instance
+
+    def __getstate__(self):
+        state = super().__getstate__()
+        if '_original_state' in state and type(state['_original_state']) is not dict:
+            # A row of a `ColumnarSnapshot`, which is not pickled along with the instance.
+            state['_original_state'] = dict(state['_original_state'])
+        if get_tracking_plan(self.__class__).copy_on_write_attnames:
+            # Proxies are pickled as plain values, which the state must not share with the fields.
+            for state_name in ('_original_state', '_dirtyfields_lazy'):
+                if state_name in state:
+                    state[state_name] = unshare_state(state[state_name])
+        return state
 
     def refresh_from_db(self, using=None, fields=None, *args, **kwargs):
+        written_fields = self.__dict__.get('_dirtyfields_written')
+        if written_fields is not None:
+            # The values set by `refresh_from_db()` are not writes.
+            written_before = set(written_fields)
         super().refresh_from_db(using, fields, *args, **kwargs)
+        if written_fields is not None:
+            written_fields.intersection_update(written_before)
         reset_state(sender=self.__class__, instance=self, update_fields=fields)
 
-    def _connect_m2m_relations(self):
-        for m2m_field, model in get_m2m_with_model(self.__class__):
-            m2m_changed.connect(
-                reset_state, sender=m2m_field.remote_field.through, weak=False,
-                dispatch_uid='{name}-DirtyFieldsMixin-sweeper-m2m'.format(
-                    name=self.__class__.__name__))
+    @classmethod
+    def _install_write_hooks(cls):
+        """
+        Wrap `__setattr__` of the model class to record the tracked fields that are assigned,
+        to capture their original value before the first assignment in lazy mode, and to wrap
+        the values of copy-on-write fields.
+
+        Called once per model class when it is prepared, if `ENABLE_WRITE_TRACKING`, `ENABLE_LAZY_STATE`
+        or `COPY_ON_WRITE_FIELDS` is set.
+        """
+        if cls.ENABLE_LAZY_STATE:
+            base_getattr = getattr(cls, '__getattr__', None)
+            if not getattr(base_getattr, 'captures_lazy_state', False):
+                # Not inherited from a parent model, any other `__getattr__()` is still called.
+                cls.__getattr__ = _make_lazy_state_getattr(base_getattr)
+
+        base_setattr = cls.__setattr__
+        if getattr(base_setattr, 'tracks_writes', False):
+            # Inherited from a parent model.
+            return
+
+        def __setattr__(self, name, value):
+            instance_dict = self.__dict__
+            # Both are None while `__init__()` sets the initial values.
+            lazy_state = instance_dict.get('_dirtyfields_lazy')
+            written_fields = instance_dict.get('_dirtyfields_written')
+            if lazy_state is not None or written_fields is not None:
+                plan = self._get_tracking_plan()
+                if name in plan.tracked_attnames:
+                    if (lazy_state is not None and name in instance_dict
+                            and plan.name_by_attname[name] not in lazy_state):
+                        lazy_state.update(self._capture_fields(
+                            plan.select_fields((name,), check_relationship=True), deferred_fields=()))
+                    if written_fields is not None:
+                        written_fields.add(name)
+            class_plan = get_tracking_plan(self.__class__)
+            if name in class_plan.copy_on_write_attnames:
+                # The values read from the database are not referenced by anything else.
+                value = wrap_field_value(self, class_plan.name_by_attname[name], value,
+                                         copy=getattr(_loading, 'instance', None) is not self)
+            base_setattr(self, name, value)
+
+        __setattr__.tracks_writes = True
+        cls.__setattr__ = __setattr__
+
+    def _capture_missing_state(self):
+        """
+        Capture the state of an instance created without primary key, which was not saved with `post_save`,
+        e.g. by `QuerySet.bulk_create()`, or whose state is needed before it is saved.
+        """
+        if not _has_state(self.__dict__) and '_dirtyfields_untracked' not in self.__dict__:
+            reset_state(sender=self.__class__, instance=self)
+
+    def _materialise_state(self):
+        """Capture the whole original state of an instance in lazy mode."""
+        lazy_state = self.__dict__.pop('_dirtyfields_lazy')
+        # The fields that were not captured yet still hold their original value.
+        original_state = self._as_dict(check_relationship=True)
+        original_state.update(lazy_state)
+        self.__dict__['_original_state'] = original_state
+        if self.ENABLE_WRITE_TRACKING:
+            _reset_written_fields(self, update_fields=())
 
     def _as_dict(self, check_relationship, include_primary_key=True):
         """
@@ -54,101 +227,303 @@ class DirtyFieldsMixin(object):
         Only capture values we are confident are in the database, or would be
         saved to the database if self.save() is called.
         """
-        all_field = {}
+        if instrumentation.enabled:
+            with instrumentation.timer(self.__class__, 'as_dict_time'):
+                return self._capture_state(check_relationship, include_primary_key)
+        return self._capture_state(check_relationship, include_primary_key)
+
+    def _capture_state(self, check_relationship, include_primary_key):
+        if self.ENABLE_CODEGEN:
+            snapshot = get_snapshot_function(self._get_tracking_plan(), check_relationship, include_primary_key)
+            if instrumentation.enabled:
+                previous_model = instrumentation.set_model(self.__class__)
+                try:
+                    state = snapshot(self)
+                finally:
+                    instrumentation.set_model(previous_model)
+                instrumentation.record(self.__class__, 'fields_copied', len(state))
+                return state
+            return snapshot(self)
+        return self._capture_fields(self._get_tracking_plan().get_fields(
+            check_relationship, include_primary_key))
+
+    def _get_tracking_plan(self):
+        """Return the plan of the fields tracked on this instance, see `track_fields()`."""
+        return self.__dict__.get('_dirtyfields_fields_plan') or get_tracking_plan(self.__class__)
+
+    def track_fields(self, *fields):
+        """
+        Only track the given fields on this instance, or all the fields tracked by the model if none are given.
 
-        deferred_fields = self.get_deferred_fields()
+        Fields no longer tracked are forgotten, and fields tracked again are considered clean.
+        """
+        if '_dirtyfields_untracked' in self.__dict__:
+            raise ValueError(UNTRACKED_ERROR.format(model=self.__class__.__name__))
+
+        previous_plan = self._get_tracking_plan()
+        model_plan = get_tracking_plan(self.__class__)
+        if fields:
+            plan = self.__dict__['_dirtyfields_fields_plan'] = model_plan.narrow(fields)
+        else:
+            plan = model_plan
+            self.__dict__.pop('_dirtyfields_fields_plan', None)
+
+        added_attnames = plan.tracked_attnames - previous_plan.tracked_attnames
+        instance_dict = self.__dict__
+
+        lazy_state = instance_dict.get('_dirtyfields_lazy')
+        if lazy_state is not None:
+            for name in list(lazy_state):
+                if not plan.is_tracked(name):
+                    del lazy_state[name]
+            _reset_lazy_state(self, update_fields=added_attnames)
+        elif _has_original_state(instance_dict):
+            original_state = {
+                name: value for name, value in self._original_state.items() if plan.is_tracked(name)
+            }
+            original_state.update(self._capture_fields(plan.select_fields(added_attnames, check_relationship=True)))
+            self._original_state = original_state
+
+        written_fields = instance_dict.get('_dirtyfields_written')
+        if written_fields is not None:
+            written_fields.intersection_update(plan.tracked_attnames)
+            if _has_original_state(instance_dict):
+                _reset_written_fields(self, update_fields=())
+
+        if self.ENABLE_M2M_CHECK and '_original_m2m_state' in instance_dict:
+            m2m_state = {
+                name: value for name, value in self._original_m2m_state.items() if plan.is_tracked(name)
+            }
+            if any(field.attname not in m2m_state for field in plan.tracked_m2m_fields):
+                for name, value in self._as_dict_m2m().items():
+                    m2m_state.setdefault(name, value)
+            self._original_m2m_state = m2m_state
 
-        for field in self._meta.concrete_fields:
+    def _capture_fields(self, fields, deferred_fields=None):
+        """Capture the state of the given ``(field, name, attname, copier)`` entries of the tracking plan."""
+        all_field = {}
 
-            # For backward compatibility reasons, in particular for fkey fields, we check both
-            # the real name and the wrapped name (it means that we can specify either the field
-            # name with or without the "_id" suffix.
-            field_names_to_check = [field.name, field.get_attname()]
-            if self.FIELDS_TO_CHECK and (not any(name in self.FIELDS_TO_CHECK for name in field_names_to_check)):
-                continue
+        if deferred_fields is None:
+            deferred_fields = self.get_deferred_fields()
 
-            if field.primary_key and not include_primary_key:
-                continue
+        instrumented = instrumentation.enabled
+        if instrumented:
+            previous_model = instrumentation.set_model(self.__class__)
+        to_python_calls = 0
 
-            if field.remote_field:
-                if not check_relationship:
+        try:
+            for field, name, attname, copier in fields:
+
+                if attname in deferred_fields:
                     continue
 
-            if field.get_attname() in deferred_fields:
-                continue
+                field_value = getattr(self, attname)
 
-            field_value = getattr(self, field.attname)
+                if isinstance(field_value, File):
+                    # Uses the name for files due to a perfomance regression caused by Django 3.1.
+                    # For more info see: https://github.com/romgar/django-dirtyfields/issues/165
+                    field_value = field_value.name
 
-            if isinstance(field_value, File):
-                # Uses the name for files due to a perfomance regression caused by Django 3.1.
-                # For more info see: https://github.com/romgar/django-dirtyfields/issues/165
-                field_value = field_value.name
+                # If current field value is an expression, we are not evaluating it
+                if isinstance(field_value, (BaseExpression, Combinable)):
+                    continue
 
-            # If current field value is an expression, we are not evaluating it
-            if isinstance(field_value, (BaseExpression, Combinable)):
-                continue
+                to_python_calls += 1
+                try:
+                    # Store the converted value for fields with conversion
+                    field_value = field.to_python(field_value)
+                except ValidationError:
+                    # The current value is not valid so we cannot convert it
+                    pass
+
+                # Explanation of copy usage here :
+                # https://github.com/romgar/django-dirtyfields/commit/efd0286db8b874b5d6bd06c9e903b1a0c9cc6b00
+                # Immutable values are not copied, see `dirtyfields.copying`.
+                all_field[name] = copier(field_value)
+        finally:
+            if instrumented:
+                instrumentation.set_model(previous_model)
+
+        if instrumented:
+            instrumentation.record(self.__class__, 'to_python_calls', to_python_calls)
+            instrumentation.record(self.__class__, 'fields_copied', len(all_field))
+        return all_field
 
-            try:
-                # Store the converted value for fields with conversion
-                field_value = field.to_python(field_value)
-            except ValidationError:
-                # The current value is not valid so we cannot convert it
-                pass
+    def _capture_db_state(self, field_names, values, capture_m2m=True):
+        """
+        Capture the state of an instance built by `from_db()`, from the values read from the database
+        unless `post_init` receivers are connected for the model.
+        """
+        if instrumentation.enabled:
+            instrumentation.record(self.__class__, 'snapshots')
+
+        if self.ENABLE_LAZY_STATE:
+            _reset_lazy_state(self)
+            if self.ENABLE_M2M_CHECK and capture_m2m:
+                self._original_m2m_state = self._as_dict_m2m()
+            return
+
+        plan = self._get_tracking_plan()
+        if post_init.has_listeners(self.__class__):
+            # The receivers may have changed the values read from the database, e.g. the dimensions of an
+            # `ImageField`, so the state is captured from the instance, like for the instances created in-memory.
+            original_state = self._as_dict(check_relationship=True)
+        else:
+            original_state = self._capture_db_values(plan, field_names, values)
 
-            if isinstance(field_value, memoryview):
-                # psycopg2 returns uncopyable type buffer for bytea
-                field_value = bytes(field_value)
+        instance_dict = self.__dict__
+        for name, attname in plan.db_intern_fields:
+            # The instance shares the interned value too, instead of keeping the one read from the database.
+            if name in original_state:
+                instance_dict[attname] = original_state[name]
 
-            # Explanation of copy usage here :
-            # https://github.com/romgar/django-dirtyfields/commit/efd0286db8b874b5d6bd06c9e903b1a0c9cc6b00
-            all_field[field.name] = deepcopy(field_value)
+        self._original_state = original_state
+        if self.ENABLE_WRITE_TRACKING:
+            _reset_written_fields(self)
+        if self.ENABLE_M2M_CHECK and capture_m2m:
+            self._original_m2m_state = self._as_dict_m2m()
 
-        return all_field
+    def _capture_db_values(self, plan, field_names, values):
+        """
+        Capture the state of an instance built by `from_db()` from the values read from the database.
 
-    def _as_dict_m2m(self):
+        These values have already been converted by the database backend, so they don't go
+        through `to_python()`, and they can't be files or expressions.
+        """
+        original_state = {}
+
+        instrumented = instrumentation.enabled
+        if instrumented:
+            previous_model = instrumentation.set_model(self.__class__)
+
+        try:
+            if len(values) == plan.concrete_fields_count:
+                for name, attname, index, copier in plan.db_fields:
+                    value = values[index]
+                    if value is not DEFERRED:
+                        original_state[name] = copier(value)
+            else:
+                row = dict(zip(field_names, values))
+                for name, attname, index, copier in plan.db_fields:
+                    value = row.get(attname, DEFERRED)
+                    if value is not DEFERRED:
+                        original_state[name] = copier(value)
+        finally:
+            if instrumented:
+                instrumentation.set_model(previous_model)
+
+        if instrumented:
+            # Copied without conversion, the fields that need one are captured by `_capture_fields()`.
+            instrumentation.record(self.__class__, 'fields_copied', len(original_state))
+
+        if plan.db_converted_fields:
+            original_state.update(self._capture_fields(plan.db_converted_fields))
+        return original_state
+
+    def _get_current_state(self, check_relationship):
+        """Capture the current state of the fields that may differ from the original state."""
+        written_fields = self.__dict__.get('_dirtyfields_written')
+        if written_fields is None:
+            return self._as_dict(check_relationship)
+
+        # Fields that were neither assigned nor hold a mutable value still hold their original value.
+        fields = self._get_tracking_plan().select_fields(
+            written_fields | self._dirtyfields_mutable, check_relationship)
+        # These fields were assigned or captured in the original state, so they are not deferred.
+        return self._capture_fields(fields, deferred_fields=())
+
+    def _as_dict_m2m(self, field_names=None):
         m2m_fields = {}
 
         if self.pk:
-            for f, model in get_m2m_with_model(self.__class__):
-                if self.FIELDS_TO_CHECK and (f.attname not in self.FIELDS_TO_CHECK):
+            prefetched = self.__dict__.get('_prefetched_objects_cache', {})
+            for f in self._get_tracking_plan().tracked_m2m_fields:
+                if field_names is not None and f.name not in field_names and f.attname not in field_names:
                     continue
-
-                m2m_fields[f.attname] = set([obj.pk for obj in getattr(self, f.attname).all()])
+                relation = getattr(self, f.attname)
+                if f.name in prefetched:
+                    # The manager would return the prefetched objects, which may be filtered.
+                    relation = relation._apply_rel_filters(relation.model._default_manager.get_queryset())
+                if f.name in prefetched and _is_whole_relation(prefetched[f.name], relation):
+                    # Loaded with `prefetch_related()`, and not changed since then.
+                    m2m_fields[f.attname] = set([obj.pk for obj in prefetched[f.name]])
+                else:
+                    m2m_fields[f.attname] = set(relation.values_list('pk', flat=True))
+                    if instrumentation.enabled:
+                        instrumentation.record(self.__class__, 'm2m_queries')
 
         return m2m_fields
 
     def get_dirty_fields(self, check_relationship=False, check_m2m=None, verbose=False):
+        if '_dirtyfields_untracked' in self.__dict__:
+            raise ValueError(UNTRACKED_ERROR.format(model=self.__class__.__name__))
+
         if self._state.adding:
             # If the object has not yet been saved in the database, all fields are considered dirty
             # for consistency (see https://github.com/romgar/django-dirtyfields/issues/65 for more details)
             pk_specified = self.pk is not None
             initial_dict = self._as_dict(check_relationship, include_primary_key=pk_specified)
             if verbose:
-                initial_dict = {key: {'saved': None, 'current': self.normalise_function[0](value)}
-                                for key, value in initial_dict.items()}
+                normalise_functions = self._get_tracking_plan().normalise_functions
+                initial_dict = {
+                    key: {'saved': None, 'current': normalise_functions.get(key, self.normalise_function)[0](value)}
+                    for key, value in initial_dict.items()
+                }
             return initial_dict
 
         if check_m2m is not None and not self.ENABLE_M2M_CHECK:
             raise ValueError("You can't check m2m fields if ENABLE_M2M_CHECK is set to False")
 
-        modified_fields = compare_states(self._as_dict(check_relationship),
-                                         self._original_state,
-                                         self.compare_function,
-                                         self.normalise_function)
-
-        if check_m2m:
-            modified_m2m_fields = compare_states(check_m2m,
-                                                 self._original_m2m_state,
-                                                 self.compare_function,
-                                                 self.normalise_function)
-            modified_fields.update(modified_m2m_fields)
+        # In lazy mode, accessing the original state captures it, so it must be done first.
+        original_state = self._original_state
+        current_state = self._get_current_state(check_relationship)
+        if instrumentation.enabled:
+            with instrumentation.timer(self.__class__, 'compare_states_time'):
+                modified_fields = self._compare_states(current_state, original_state, check_m2m)
+            compared = [key for key in current_state if key in original_state]
+            if check_m2m:
+                compared.extend(key for key in check_m2m if key in self._original_m2m_state)
+            instrumentation.record(self.__class__, 'compare_calls', len(compared))
+        else:
+            modified_fields = self._compare_states(current_state, original_state, check_m2m)
 
+        plan = self._get_tracking_plan()
         if not verbose:
             # Keeps backward compatibility with previous function return
             modified_fields = {
-                key: self.normalise_function[0](value['saved'])
+                key: plan.normalise_functions.get(key, self.normalise_function)[0](value['saved'])
                 for key, value in modified_fields.items()
             }
+        elif plan.undigested_fields:
+            # Only the saved value of a digest field is a digest, the current one is read from the instance.
+            digested = [entry for name, entry in plan.undigested_fields.items() if name in modified_fields]
+            for key, value in self._capture_fields(digested).items():
+                modified_fields[key]['current'] = plan.normalise_functions.get(key, self.normalise_function)[0](value)
+
+        return modified_fields
+
+    def _compare_states(self, current_state, original_state, check_m2m):
+        """Return the modified fields of `current_state` and of `check_m2m`, in the verbose format."""
+        plan = self._get_tracking_plan()
+        if self.ENABLE_CODEGEN:
+            diff = get_diff_function(plan, self.compare_function, self.normalise_function)
+            modified_fields = diff(current_state, original_state)
+        else:
+            modified_fields = compare_states(current_state,
+                                             original_state,
+                                             self.compare_function,
+                                             self.normalise_function,
+                                             plan.compare_functions,
+                                             plan.normalise_functions)
+
+        if check_m2m:
+            modified_m2m_fields = compare_states(check_m2m,
+                                                 self._original_m2m_state,
+                                                 self.compare_function,
+                                                 self.normalise_function,
+                                                 plan.compare_functions,
+                                                 plan.normalise_functions)
+            modified_fields.update(modified_m2m_fields)
 
         return modified_fields
 
@@ -157,6 +532,9 @@ class DirtyFieldsMixin(object):
                                            check_m2m=check_m2m)
 
     def save_dirty_fields(self):
+        if '_dirtyfields_untracked' in self.__dict__:
+            raise ValueError(UNTRACKED_ERROR.format(model=self.__class__.__name__))
+
         if self._state.adding:
             self.save()
         else:
@@ -165,34 +543,224 @@ class DirtyFieldsMixin(object):
 
 
 def reset_state(sender, instance, **kwargs):
+    if instrumentation.enabled and '_dirtyfields_untracked' not in instance.__dict__:
+        instrumentation.record(instance.__class__, 'snapshots')
+        with instrumentation.timer(instance.__class__, 'reset_state_time'):
+            _reset_state(sender, instance, **kwargs)
+    else:
+        _reset_state(sender, instance, **kwargs)
+
+
+def _reset_state(sender, instance, **kwargs):
     # original state should hold all possible dirty fields to avoid
     # getting a `KeyError` when checking if a field is dirty or not
     update_fields = kwargs.pop('update_fields', None)
-    new_state = instance._as_dict(check_relationship=True)
-    FIELDS_TO_CHECK = getattr(instance, "FIELDS_TO_CHECK", None)
 
-    if update_fields is not None:
-        for field_name in update_fields:
-            field = sender._meta.get_field(field_name)
-            if not FIELDS_TO_CHECK or (field.name in FIELDS_TO_CHECK):
+    if '_dirtyfields_untracked' in instance.__dict__:
+        return
 
-                if field.get_attname() in instance.get_deferred_fields():
-                    continue
+    if update_fields is not None and not _has_state(instance.__dict__):
+        # Saved for the first time, the whole state is captured.
+        update_fields = None
 
-                if field.name in new_state:
-                    instance._original_state[field.name] = (
-                        new_state[field.name]
-                    )
-                elif field.name in instance._original_state:
-                    # If we are here it means the field was updated in the DB,
-                    # and we don't know the new value in the database.
-                    # e.g it was updated with an F() expression.
-                    # Because we now don't know the value in the DB,
-                    # we remove it from _original_state, because we can't tell
-                    # if its dirty or not.
-                    del instance._original_state[field.name]
+    if instance.ENABLE_LAZY_STATE and (update_fields is None or '_dirtyfields_lazy' in instance.__dict__):
+        _reset_lazy_state(instance, update_fields)
     else:
-        instance._original_state = new_state
+        _reset_original_state(sender, instance, update_fields)
+        if instance.ENABLE_WRITE_TRACKING:
+            _reset_written_fields(instance, update_fields)
 
     if instance.ENABLE_M2M_CHECK:
-        instance._original_m2m_state = instance._as_dict_m2m()
+        if update_fields is None:
+            instance._original_m2m_state = instance._as_dict_m2m()
+        else:
+            # Saving does not change m2m relations, only `refresh_from_db()` can be given m2m fields.
+            instance._original_m2m_state.update(instance._as_dict_m2m(update_fields))
+
+
+def _reset_original_state(sender, instance, update_fields=None):
+    if update_fields is None:
+        previous_state = instance.__dict__.get('_original_state')
+        instance._original_state = instance._as_dict(check_relationship=True)
+        if previous_state is not None and type(previous_state) is not dict:
+            # The row of a `ColumnarSnapshot` storing the previous state is no longer used.
+            previous_state.release(instance)
+        return
+
+    plan = instance._get_tracking_plan()
+    deferred_fields = instance.get_deferred_fields()
+    fields = []
+    for field_name in update_fields:
+        field = sender._meta.get_field(field_name)
+        if plan.is_tracked(field.name) and field.attname not in deferred_fields:
+            fields.append(field)
+
+    # Only the saved fields are captured.
+    new_state = instance._capture_fields(
+        plan.select_fields([field.attname for field in fields], check_relationship=True), deferred_fields)
+
+    original_state = instance._original_state
+    read_only = not isinstance(original_state, MutableMapping)
+    if read_only:
+        # A compact state, stored again once updated.
+        original_state = dict(original_state)
+
+    for field in fields:
+        if field.name in new_state:
+            original_state[field.name] = new_state[field.name]
+        elif field.name in original_state:
+            # If we are here it means the field was updated in the DB,
+            # and we don't know the new value in the database.
+            # e.g it was updated with an F() expression.
+            # Because we now don't know the value in the DB,
+            # we remove it from _original_state, because we can't tell
+            # if its dirty or not.
+            del original_state[field.name]
+
+    if read_only:
+        instance._original_state = original_state
+
+
+def _reset_lazy_state(instance, update_fields=None):
+    """
+    Forget the captured original values of an instance in lazy mode, they are the current values
+    until the fields are assigned.
+    """
+    plan = instance._get_tracking_plan()
+    instance_dict = instance.__dict__
+
+    if update_fields is None:
+        instance_dict.pop('_original_state', None)
+        instance_dict.pop('_dirtyfields_mutable', None)
+        lazy_state = instance_dict['_dirtyfields_lazy'] = {}
+        attnames = plan.attnames
+        if instance.ENABLE_WRITE_TRACKING:
+            instance_dict['_dirtyfields_written'] = set()
+    else:
+        lazy_state = instance_dict['_dirtyfields_lazy']
+        written_fields = instance_dict.get('_dirtyfields_written', set())
+        attnames = [instance._meta.get_field(field_name).attname for field_name in update_fields]
+        for attname in attnames:
+            lazy_state.pop(plan.name_by_attname.get(attname), None)
+            written_fields.discard(attname)
+
+    # Files can be renamed and mutable values changed in place without assigning the field,
+    # so their original value is captured straight away.
+    eager_attnames = [
+        attname for attname in attnames
+        if attname in instance_dict and (
+            attname in plan.always_checked_attnames or type(instance_dict[attname]) not in IMMUTABLE_TYPES)
+    ]
+    if eager_attnames:
+        lazy_state.update(instance._capture_fields(
+            plan.select_fields(eager_attnames, check_relationship=True), deferred_fields=()))
+
+
+def _make_lazy_state_getattr(base_getattr):
+    """Return the `__getattr__()` of a model in lazy mode, delegating to `base_getattr` if it is not `None`."""
+
+    def __getattr__(self, name):
+        # Only called when `name` is not found, e.g. when the state of a lazy instance has not been captured yet.
+        if name in ('_original_state', '_dirtyfields_mutable') and '_dirtyfields_lazy' in self.__dict__:
+            self._materialise_state()
+            return getattr(self, name)
+        if base_getattr is not None:
+            return base_getattr(self, name)
+        raise AttributeError("'{}' object has no attribute '{}'".format(self.__class__.__name__, name))
+
+    __getattr__.captures_lazy_state = True
+    return __getattr__
+
+
+def _reset_written_fields(instance, update_fields=None):
+    plan = instance._get_tracking_plan()
+    written_fields = instance.__dict__.get('_dirtyfields_written')
+    if update_fields is None or written_fields is None:
+        written_fields = set()
+    else:
+        for field_name in update_fields:
+            written_fields.discard(instance._meta.get_field(field_name).attname)
+
+    instance.__dict__['_dirtyfields_written'] = written_fields
+    instance.__dict__['_dirtyfields_mutable'] = plan.always_checked_attnames.union(
+        plan.attname_by_name[name]
+        for name, value in instance._original_state.items()
+        if type(value) not in IMMUTABLE_TYPES
+    )
+
+
+def _update_m2m_state(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Update the original state of the m2m field changed on `instance` from the primary keys
+    given to the signal, instead of querying every relation again.
+    """
+    # On the reverse side, `instance` is the related object and its own relations did not change.
+    if reverse or action not in ('post_add', 'post_remove', 'post_clear') or not isinstance(instance, DirtyFieldsMixin):
+        return
+
+    m2m_state = instance.__dict__.get('_original_m2m_state')
+    if m2m_state is None:
+        return
+
+    for field in instance._get_tracking_plan().tracked_m2m_fields:
+        if field.remote_field.through is not sender or field.attname not in m2m_state:
+            continue
+        # New sets are built, as the previous ones may have been returned by `get_dirty_fields()`.
+        if action == 'post_clear':
+            m2m_state[field.attname] = set()
+        elif field.m2m_target_field_name() != field.related_model._meta.pk.name:
+            # `pk_set` holds the values of the `to_field` of the relation, not primary keys.
+            m2m_state[field.attname] = set([obj.pk for obj in getattr(instance, field.attname).all()])
+        elif action == 'post_add':
+            m2m_state[field.attname] = m2m_state[field.attname] | pk_set
+        else:
+            m2m_state[field.attname] = m2m_state[field.attname] - pk_set
+
+
+def _is_whole_relation(prefetched, relation):
+    """
+    Return whether the objects prefetched for a m2m relation are the whole `relation` queryset,
+    and not the result of a `Prefetch()` with a filtered or sliced queryset.
+    """
+    query = getattr(prefetched, 'query', None)
+    return query is not None and query.can_filter() and query.where == relation.query.where
+
+
+def _reset_state_after_save(sender, instance, **kwargs):
+    if isinstance(instance, DirtyFieldsMixin):
+        reset_state(sender, instance, **kwargs)
+
+
+def _has_original_state(instance_dict):
+    return '_original_state' in instance_dict or '_dirtyfields_state' in instance_dict
+
+
+def _has_state(instance_dict):
+    """Return whether the state of an instance has been captured, possibly lazily."""
+    return _has_original_state(instance_dict) or '_dirtyfields_lazy' in instance_dict
+
+
+def _prepare_model(sender, **kwargs):
+    if issubclass(sender, DirtyFieldsMixin):
+        if sender.ENABLE_COMPACT_STATE:
+            if sender.ENABLE_LAZY_STATE or sender.COPY_ON_WRITE_FIELDS:
+                raise ImproperlyConfigured(
+                    "{}: ENABLE_COMPACT_STATE can't be combined with ENABLE_LAZY_STATE or "
+                    "COPY_ON_WRITE_FIELDS.".format(sender.__name__))
+            sender._original_state = CompactStateDescriptor()
+        get_tracking_plan(sender)
+        if sender.ENABLE_WRITE_TRACKING or sender.ENABLE_LAZY_STATE or sender.COPY_ON_WRITE_FIELDS:
+            sender._install_write_hooks()
+
+
+def _clear_tracking_plans(setting, **kwargs):
+    if setting == 'INSTALLED_APPS':
+        clear_tracking_plans()
+
+
+class_prepared.connect(_prepare_model, dispatch_uid='DirtyFieldsMixin-prepare-model')
+# Connected without sender, so that no receiver is kept for each model class, including the short-lived ones, e.g.
+# the historical models rendered by migrations, which still inherit from `DirtyFieldsMixin`.
+post_save.connect(_reset_state_after_save, dispatch_uid='DirtyFieldsMixin-sweeper')
+m2m_changed.connect(_update_m2m_state, dispatch_uid='DirtyFieldsMixin-sweeper-m2m')
+setting_changed.connect(_clear_tracking_plans, dispatch_uid='DirtyFieldsMixin-clear-tracking-plans')
@@ -0,0 +1,115 @@
+"""
+Opt-in counters and timers of the work done to track dirty fields, by model class.
+
+Instrumentation is disabled by default, the tracked code then only checks `enabled`. Once enabled with
+`enable()`, every measure is added to the statistics returned by `stats()` and passed to the callbacks
+registered with `add_callback()`, e.g. to export them to a metrics system.
+
+Counters:
+
+- ``snapshots``: original states captured, from the values read from the database or by `reset_state()`.
+- ``fields_copied``: field values copied in a state, original or current.
+- ``deepcopy_fallbacks``: values copied with `deepcopy()`, not by a cheaper copier, see `dirtyfields.copying`.
+- ``compare_calls``: fields compared by `get_dirty_fields()`.
+- ``to_python_calls``: field values converted with `to_python()` when they are captured.
+- ``m2m_queries``: queries made to capture the m2m state of instances.
+
+Timers, in seconds, include the time spent in each other, e.g. `reset_state()` calls `_as_dict()`:
+
+- ``as_dict_time``: time spent in `DirtyFieldsMixin._as_dict()`.
+- ``compare_states_time``: time spent comparing the states in `get_dirty_fields()`.
+- ``reset_state_time``: time spent in `reset_state()`.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+COUNTERS = (
+    'snapshots', 'fields_copied', 'deepcopy_fallbacks', 'compare_calls', 'to_python_calls', 'm2m_queries',
+)
+TIMERS = ('as_dict_time', 'compare_states_time', 'reset_state_time')
+
+enabled = False
+
+_lock = threading.Lock()
+# Statistics by model class, `None` for values copied outside of a model.
+_stats = {}
+_callbacks = []
+# `model` is the class of the instance whose fields are being copied or converted.
+_local = threading.local()
+
+
+def enable():
+    global enabled
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+def add_callback(callback):
+    """Call `callback(model, name, value)` with every measure recorded, `model` being a model class or `None`."""
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    _callbacks.remove(callback)
+
+
+def stats(reset=False):
+    """
+    Return the statistics recorded since instrumentation was enabled or last reset, as a dict mapping the
+    label of every model class, e.g. ``"app.Model"``, to the values of the counters and timers.
+    """
+    with _lock:
+        snapshot = {
+            model._meta.label if model is not None else None: dict(model_stats)
+            for model, model_stats in _stats.items()
+        }
+        if reset:
+            _stats.clear()
+    return snapshot
+
+
+def reset():
+    """Forget the statistics recorded so far."""
+    with _lock:
+        _stats.clear()
+
+
+def record(model, name, value=1):
+    """Add `value` to the counter or timer `name` of the model class `model`."""
+    with _lock:
+        model_stats = _stats.get(model)
+        if model_stats is None:
+            model_stats = _stats[model] = dict.fromkeys(COUNTERS + TIMERS, 0)
+        model_stats[name] += value
+    for callback in _callbacks:
+        callback(model, name, value)
+
+
+def set_model(model):
+    """
+    Record the measures of `record_current()` for the model class `model`, in the current thread, and return
+    the previous one, which must be set again once the fields of `model` are copied or converted.
+    """
+    previous_model = getattr(_local, 'model', None)
+    _local.model = model
+    return previous_model
+
+
+def record_current(name, value=1):
+    """Like `record()`, for the model class whose fields are being copied or converted in the current thread."""
+    record(getattr(_local, 'model', None), name, value)
+
+
+@contextmanager
+def timer(model, name):
+    """Add the time spent in the block to the timer `name` of the model class `model`."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(model, name, time.perf_counter() - start)
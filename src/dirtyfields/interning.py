@@ -0,0 +1,78 @@
+"""
+Interning of the immutable values captured for the fields listed in ``INTERN_FIELDS``.
+
+Values read from the database are new objects for every row, so the states of instances loaded
+together hold as many copies of the same status or country code as there are instances. The values
+of these fields are looked up in a table of the model before being stored in the state, so that
+equal values share one object.
+
+When an instance is loaded with `DirtyFieldsMixin.from_db()`, the interned values are also written back
+into the instance `__dict__`, replacing the values read from the database, as the instance would
+otherwise still hold its own copies. Other instances keep the values they were assigned.
+
+The table holds at most ``INTERN_TABLE_SIZE`` values. Once it is full, values are evicted in the order
+they were added (FIFO), not by how recently they were looked up (LRU): a frequent value may be evicted,
+and is then added again the next time it is captured.
+"""
+import uuid
+import weakref
+from datetime import date
+
+# Types whose equal values can't be told apart, so that storing one instead of the other does not change
+# the saved value returned by `get_dirty_fields()`. Unlike `Decimal("1.0")` and `Decimal("1.00")`,
+# `0.0` and `-0.0`, or datetimes in different time zones.
+INTERNABLE_TYPES = frozenset([str, bytes, int, date, uuid.UUID])
+
+# Intern table of each model class.
+_tables = weakref.WeakKeyDictionary()
+
+
+class InternTable(object):
+    """Bounded table of interned values, evicting the values added first, whether they are used or not."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self._values = {}
+
+    def __len__(self):
+        return len(self._values)
+
+    def intern(self, value):
+        """Return the value of the table equal to `value`, adding `value` to the table if there is none."""
+        # The type is part of the key, so that e.g. `1` and `True` are kept apart.
+        key = (type(value), value)
+        values = self._values
+        interned = values.get(key)
+        if interned is not None:
+            return interned
+        if len(values) >= self.max_size:
+            try:
+                del values[next(iter(values))]
+            except (KeyError, RuntimeError, StopIteration):
+                # Evicted by another thread in the meantime.
+                pass
+        values[key] = value
+        return value
+
+    def clear(self):
+        self._values.clear()
+
+
+def get_intern_table(model):
+    """Return the intern table of a model class, shared by the tracking plans of the model."""
+    try:
+        return _tables[model]
+    except KeyError:
+        table = _tables[model] = InternTable(model.INTERN_TABLE_SIZE)
+        return table
+
+
+def make_interning_copier(copier, table):
+    """Return a copier interning the values copied by `copier` in `table`, if their type is in `INTERNABLE_TYPES`."""
+    def interning_copier(value):
+        value = copier(value)
+        if type(value) in INTERNABLE_TYPES:
+            return table.intern(value)
+        return value
+
+    return interning_copier
@@ -0,0 +1,213 @@
+"""
+Profile the overhead of `DirtyFieldsMixin` on the models of a project.
+
+For every model using the mixin, sample rows are read from the database, or synthesised in memory when its
+table is empty, and built into instances with and without dirty tracking. Building them, `get_dirty_fields()`
+and `reset_state()` are timed, and the fields are ranked by the time spent capturing and comparing them.
+Nothing is written to the database.
+"""
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, DatabaseError
+
+from dirtyfields.compare import compare_states
+from dirtyfields.dirtyfields import DirtyFieldsMixin, _loading, reset_state
+from dirtyfields.plan import get_tracking_plan
+
+_INTEGER_TYPES = (
+    'AutoField', 'BigAutoField', 'SmallAutoField', 'IntegerField', 'BigIntegerField', 'SmallIntegerField',
+    'PositiveIntegerField', 'PositiveBigIntegerField', 'PositiveSmallIntegerField',
+)
+
+# Functions returning the value of the `i`-th synthesised row for a field, by internal type of the field.
+_SYNTHESISERS = dict.fromkeys(_INTEGER_TYPES, lambda field, i: i + 1)
+_SYNTHESISERS.update({
+    'BooleanField': lambda field, i: i % 2 == 0,
+    'NullBooleanField': lambda field, i: i % 2 == 0,
+    'CharField': lambda field, i: ('value %d' % i)[:field.max_length],
+    'SlugField': lambda field, i: ('value-%d' % i)[:field.max_length],
+    'TextField': lambda field, i: 'Text of row %d. ' % i * 8,
+    'EmailField': lambda field, i: 'user%d@example.com' % i,
+    'URLField': lambda field, i: 'https://example.com/%d' % i,
+    'GenericIPAddressField': lambda field, i: '10.0.%d.%d' % (i // 256 % 256, i % 256),
+    'FloatField': lambda field, i: i + 0.5,
+    'DecimalField': lambda field, i: Decimal(i).scaleb(-field.decimal_places) + Decimal(1),
+    'DateField': lambda field, i: date(2020, 1, 1) + timedelta(days=i),
+    'DateTimeField': lambda field, i: _make_datetime(i),
+    'DurationField': lambda field, i: timedelta(seconds=i),
+    'UUIDField': lambda field, i: uuid.UUID(int=i + 1),
+    'JSONField': lambda field, i: {'id': i, 'tags': ['a', 'b'], 'nested': {'count': i}},
+    'BinaryField': lambda field, i: bytes(range(64)) + str(i).encode(),
+    'FileField': lambda field, i: 'files/%d.txt' % i,
+    'ImageField': lambda field, i: 'images/%d.png' % i,
+})
+
+
+def _make_datetime(i):
+    return datetime(2020, 1, 1, tzinfo=timezone.utc if settings.USE_TZ else None) + timedelta(hours=i)
+
+
+def synthesise_value(field, i):
+    """Return a value of `field` for the `i`-th synthesised row, like the ones read from the database."""
+    if field.is_relation:
+        # Foreign keys hold the value of their target field.
+        return synthesise_value(field.target_field, i)
+    synthesiser = _SYNTHESISERS.get(field.get_internal_type())
+    if synthesiser is not None:
+        return synthesiser(field, i)
+    if field.has_default():
+        return field.get_default()
+    return None
+
+
+def best_time(function, count, repeat):
+    """
+    Return the best time of `repeat` calls of `function()`, in microseconds per instance. `function()` is called
+    once more first, so that e.g. the functions generated on first use are not timed.
+    """
+    function()
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings) / count * 1e6
+
+
+class Command(BaseCommand):
+    help = (
+        "Profile the overhead of DirtyFieldsMixin on the models using it, against instances built "
+        "without dirty tracking, and rank the models and fields by cost."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'labels', nargs='*', metavar='app_label[.ModelName]',
+            help='Only profile these apps or models, all the models using DirtyFieldsMixin by default.',
+        )
+        parser.add_argument('--rows', type=int, default=100, help='Number of sample rows per model.')
+        parser.add_argument('--repeat', type=int, default=3, help='Number of runs, the best one is reported.')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS, help='Database the rows are read from.')
+        parser.add_argument('--top-fields', type=int, default=20, help='Number of fields ranked.')
+
+    def handle(self, **options):
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError('--rows and --repeat must be at least 1.')
+
+        results = []
+        field_costs = []
+        for model in self.get_models(options['labels']):
+            try:
+                result, costs = self.profile_model(model, options['database'], options['rows'], options['repeat'])
+            except DatabaseError as e:
+                self.stderr.write('Skipped {}: {}'.format(model._meta.label, e))
+                continue
+            results.append(result)
+            field_costs.extend(costs)
+
+        self.stdout.write(
+            'Microseconds per instance, best of {} runs. "overhead" is the cost of building an instance with '
+            'dirty tracking, compared to building it without.\n'.format(options['repeat']))
+        width = max([len('model')] + [len(result['label']) for result in results])
+        self.stdout.write('{:<{width}} {:>5} {:<5} {:>9} {:>9} {:>9} {:>9} {:>9} {:>9}'.format(
+            'model', 'rows', 'from', 'untracked', 'tracked', 'overhead', 'dirty', 'reset', 'total', width=width))
+        for result in sorted(results, key=lambda result: result['total'], reverse=True):
+            self.stdout.write(
+                '{label:<{width}} {rows:>5} {source:<5} {untracked:9.2f} {tracked:9.2f} {overhead:9.2f} '
+                '{get_dirty_fields:9.2f} {reset_state:9.2f} {total:9.2f}'.format(width=width, **result))
+
+        field_costs.sort(key=lambda cost: cost[2], reverse=True)
+        field_costs = field_costs[:options['top_fields']]
+        width = max([len('field')] + [len(name) for name, field_type, cost in field_costs])
+        self.stdout.write('\nFields by cost of capturing and comparing their value, in microseconds per instance.\n')
+        self.stdout.write('{:<{width}} {:<24} {:>9}'.format('field', 'type', 'cost', width=width))
+        for name, field_type, cost in field_costs:
+            self.stdout.write('{:<{width}} {:<24} {:9.2f}'.format(name, field_type, cost, width=width))
+
+    def get_models(self, labels):
+        """Return the models using `DirtyFieldsMixin`, of the given apps or models if any."""
+        if not labels:
+            models = apps.get_models()
+        else:
+            models = []
+            for label in labels:
+                try:
+                    if '.' in label:
+                        models.append(apps.get_model(label))
+                    else:
+                        models.extend(apps.get_app_config(label).get_models())
+                except LookupError as e:
+                    raise CommandError(str(e))
+                if '.' in label and not issubclass(models[-1], DirtyFieldsMixin):
+                    raise CommandError('{} does not use DirtyFieldsMixin.'.format(label))
+        return [model for model in models if issubclass(model, DirtyFieldsMixin) and not model._meta.swapped]
+
+    def profile_model(self, model, using, row_count, repeat):
+        """Return the timings of `model`, and the `(name, field type, cost)` of its tracked fields."""
+        attnames = [field.attname for field in model._meta.concrete_fields]
+        rows = list(model._base_manager.using(using).order_by().values_list(*attnames)[:row_count])
+        source = 'db'
+        if not rows:
+            source = 'synth'
+            rows = [
+                tuple(synthesise_value(field, i) for field in model._meta.concrete_fields)
+                for i in range(row_count)
+            ]
+        count = len(rows)
+
+        def load(track=True):
+            # Like `DirtyFieldsQuerySet.without_dirty_tracking()`, for any manager.
+            previous_options = getattr(_loading, 'options', None)
+            _loading.options = (model, {'track': track})
+            try:
+                return [model.from_db(using, attnames, row) for row in rows]
+            finally:
+                _loading.options = previous_options
+
+        untracked = best_time(lambda: load(track=False), count, repeat)
+        tracked = best_time(load, count, repeat)
+        instances = load()
+        get_dirty_fields = best_time(
+            lambda: [instance.get_dirty_fields(check_relationship=True) for instance in instances], count, repeat)
+        reset = best_time(
+            lambda: [reset_state(sender=model, instance=instance) for instance in instances], count, repeat)
+
+        result = {
+            'label': model._meta.label,
+            'rows': count,
+            'source': source,
+            'untracked': untracked,
+            'tracked': tracked,
+            'overhead': tracked - untracked,
+            'get_dirty_fields': get_dirty_fields,
+            'reset_state': reset,
+            'total': tracked - untracked + get_dirty_fields + reset,
+        }
+        return result, self.profile_fields(model, instances, repeat)
+
+    def profile_fields(self, model, instances, repeat):
+        plan = get_tracking_plan(model)
+        original_states = [instance._original_state for instance in instances]
+        costs = []
+        for entry in plan.get_fields(check_relationship=True):
+            fields = (entry,)
+
+            def capture_and_compare():
+                for instance, original_state in zip(instances, original_states):
+                    compare_states(
+                        instance._capture_fields(fields, deferred_fields=()), original_state,
+                        model.compare_function, model.normalise_function,
+                        plan.compare_functions, plan.normalise_functions)
+
+            field = entry[0]
+            costs.append((
+                '{}.{}'.format(model._meta.label, field.name), type(field).__name__,
+                best_time(capture_and_compare, len(instances), repeat),
+            ))
+        return costs
@@ -0,0 +1,189 @@
+from django.db import connections, models
+from django.db.models.query import ModelIterable, prefetch_related_objects
+
+from . import instrumentation
+from .bulk import bulk_save_dirty, reset_state_after_bulk_create, reset_state_after_bulk_update
+from .columnar import ColumnarSnapshot
+from .dirtyfields import _loading
+from .plan import get_tracking_plan
+
+
+class DirtyFieldsModelIterable(ModelIterable):
+    """
+    Yield model instances, letting `DirtyFieldsMixin.from_db()` know the options of the queryset
+    while each of them is built.
+
+    When the queryset prefetches related objects, the m2m state of the instances is captured once they
+    are prefetched, which the iterable then does itself, before the queryset would.
+    """
+
+    def __iter__(self):
+        options = self.queryset._dirtyfields_options
+        m2m_check = self.queryset.model.ENABLE_M2M_CHECK
+        batch_m2m = options.get('batch_m2m') and m2m_check
+        prefetch_m2m = bool(m2m_check and self.queryset._prefetch_related_lookups)
+        if not (batch_m2m or prefetch_m2m or options.get('columnar')):
+            yield from self._iter_instances()
+            return
+
+        columnar_plan = None
+        if options.get('columnar'):
+            columnar_plan = get_tracking_plan(self.queryset.model)
+            if options.get('fields'):
+                columnar_plan = columnar_plan.narrow(options['fields'])
+
+        # `iterator()` fetches rows in chunks, otherwise the whole result set is loaded anyway.
+        batch_size = self.chunk_size if self.chunked_fetch else None
+        batch = []
+        finished_batches = 0
+        for instance in self._iter_instances(defer_m2m=prefetch_m2m):
+            batch.append(instance)
+            if batch_size is not None and len(batch) >= batch_size:
+                self._finish_batch(batch, batch_m2m, prefetch_m2m, columnar_plan)
+                finished_batches += 1
+                yield from batch
+                batch = []
+        if batch or not finished_batches:
+            self._finish_batch(batch, batch_m2m, prefetch_m2m, columnar_plan)
+        yield from batch
+
+    def _finish_batch(self, batch, batch_m2m, prefetch_m2m, columnar_plan):
+        if prefetch_m2m:
+            # The queryset skips the objects already prefetched.
+            prefetch_related_objects(batch, *self.queryset._prefetch_related_lookups)
+            if not batch_m2m:
+                for instance in batch:
+                    if '_dirtyfields_untracked' not in instance.__dict__:
+                        instance._original_m2m_state = instance._as_dict_m2m()
+        if batch_m2m:
+            _capture_m2m_states(batch, self.queryset.db)
+        if columnar_plan is not None:
+            # One snapshot per chunk, so that the instances still used don't keep the whole result set alive.
+            snapshot = self.queryset.columnar_snapshot = ColumnarSnapshot(self.queryset.model, columnar_plan)
+            snapshot.add(batch)
+
+    def _iter_instances(self, defer_m2m=False):
+        load_options = self.queryset._dirtyfields_options
+        if defer_m2m:
+            # The m2m state is captured by `_finish_batch()` once the related objects are prefetched.
+            load_options = dict(load_options, defer_m2m=True)
+        load_options = (self.queryset.model, load_options)
+        iterator = super().__iter__()
+        while True:
+            previous_options = getattr(_loading, 'options', None)
+            _loading.options = load_options
+            try:
+                instance = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _loading.options = previous_options
+            yield instance
+
+
+class DirtyFieldsQuerySet(models.QuerySet):
+    _dirtyfields_options = {}
+
+    # The `ColumnarSnapshot` of the instances loaded by this queryset, or of the last chunk loaded by
+    # `iterator()`, see `columnar_state()`.
+    columnar_snapshot = None
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._dirtyfields_options = self._dirtyfields_options
+        return clone
+
+    def _with_dirtyfields_options(self, **options):
+        clone = self._chain()
+        clone._dirtyfields_options = dict(self._dirtyfields_options, **options)
+        if clone._iterable_class is ModelIterable:
+            clone._iterable_class = DirtyFieldsModelIterable
+        return clone
+
+    def prefetch_related(self, *lookups):
+        """Like `QuerySet.prefetch_related()`, and capture the m2m state from the prefetched objects."""
+        clone = super().prefetch_related(*lookups)
+        if clone._iterable_class is ModelIterable:
+            clone._iterable_class = DirtyFieldsModelIterable
+        return clone
+
+    def without_dirty_tracking(self):
+        """
+        Load instances without capturing their state, for read-only use.
+
+        Their dirty fields can't be requested, and saving them does not capture their state.
+        """
+        return self._with_dirtyfields_options(track=False)
+
+    def track_fields(self, *fields):
+        """Only track the given fields on the loaded instances, see `DirtyFieldsMixin.track_fields()`."""
+        if fields:
+            # Fail early on unknown fields.
+            get_tracking_plan(self.model).narrow(fields)
+        return self._with_dirtyfields_options(fields=frozenset(fields))
+
+    def batch_m2m_state(self):
+        """
+        Capture the m2m state of the loaded instances with one query per m2m relation for the whole
+        result set, or per chunk with `iterator()`, instead of one query per relation and instance.
+        """
+        return self._with_dirtyfields_options(batch_m2m=True)
+
+    def columnar_state(self):
+        """
+        Store the original state of the loaded instances in one list per tracked field, see `dirtyfields.columnar`.
+
+        Once the queryset is evaluated, its `columnar_snapshot` computes the dirty rows and columns of the whole
+        result set at once, and saves them with one `bulk_update()` per dirty column. With `iterator()`, each
+        chunk is stored in its own snapshot, returned by `dirtyfields.columnar.get_snapshot()` for its instances.
+        """
+        return self._with_dirtyfields_options(columnar=True)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        """Like `QuerySet.bulk_create()`, and reset the state of the created instances."""
+        objs = super().bulk_create(objs, *args, **kwargs)
+        reset_state_after_bulk_create(objs)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        """Like `QuerySet.bulk_update()`, and reset the state of the updated fields of the instances."""
+        objs = tuple(objs)
+        rows = super().bulk_update(objs, fields, *args, **kwargs)
+        reset_state_after_bulk_update(objs, fields)
+        return rows
+
+    def bulk_save_dirty(self, instances, batch_size=None):
+        """Save the dirty fields of many instances on the database of this queryset, see `dirtyfields.bulk`."""
+        return bulk_save_dirty(instances, batch_size=batch_size, using=self._db)
+
+
+def _capture_m2m_states(instances, using):
+    """Capture the m2m state of instances of the same model and loaded with the same options."""
+    instances = [instance for instance in instances if '_dirtyfields_untracked' not in instance.__dict__]
+    if not instances:
+        return
+
+    for instance in instances:
+        instance._original_m2m_state = {}
+    pks = [instance.pk for instance in instances]
+    # Like `in_bulk()`, stay below the limit of query parameters of the database.
+    batch_size = connections[using].ops.bulk_batch_size(['pk'], pks) or len(pks)
+
+    for f in instances[0]._get_tracking_plan().tracked_m2m_fields:
+        states = {pk: set() for pk in pks}
+        related_query_name = f.related_query_name()
+        for start in range(0, len(pks), batch_size):
+            # Like the related manager, use the default manager of the related model.
+            rows = f.related_model._default_manager.using(using).filter(**{
+                '%s__pk__in' % related_query_name: pks[start:start + batch_size],
+            }).values_list('%s__pk' % related_query_name, 'pk')
+            for pk, related_pk in rows:
+                states[pk].add(related_pk)
+            if instrumentation.enabled:
+                instrumentation.record(instances[0].__class__, 'm2m_queries')
+        for instance in instances:
+            instance._original_m2m_state[f.attname] = states[instance.pk]
+
+
+class DirtyFieldsManager(models.Manager.from_queryset(DirtyFieldsQuerySet)):
+    pass
@@ -0,0 +1,104 @@
+"""
+Accounting of the memory held by tracked instances, measured with `tracemalloc`.
+
+`measure_memory()` builds instances, measures the memory they retain, then frees their m2m state,
+the value of each field in their original state and finally what remains of their state, measuring
+the memory released at each step. Values shared with the instance, e.g. immutable values that are
+not copied, are not released and therefore cost nothing.
+"""
+import gc
+import sys
+import tracemalloc
+from collections import namedtuple
+from collections.abc import MutableMapping
+
+from .dirtyfields import DirtyFieldsMixin
+from .plan import get_tracking_plan
+
+# Keys of the instance `__dict__` holding the state of an instance, other than the m2m state.
+STATE_KEYS = (
+    '_original_state', '_dirtyfields_state', '_dirtyfields_lazy', '_dirtyfields_written', '_dirtyfields_mutable',
+)
+
+# Bytes retained per instance: `total` for the whole instance, `model` for the instance without its state,
+# `state` for the original state, of which `fields` by field name and `field_types` by field class name are
+# the copies of the values, and `m2m_state` for the m2m state.
+MemoryReport = namedtuple('MemoryReport', [
+    'model_class', 'count', 'total', 'model', 'state', 'm2m_state', 'fields', 'field_types',
+])
+
+
+def measure_memory(build, count=1000):
+    """
+    Return the `MemoryReport` of `count` instances returned by `build()`, e.g. a function creating an
+    instance, or the `__next__` method of `Model.objects.iterator()`.
+
+    `build()` is called once more first, so that e.g. the tracking plan of the model is not measured.
+    The state of the measured instances is then deleted, and they are discarded.
+    """
+    model_class = type(build())
+    if not issubclass(model_class, DirtyFieldsMixin):
+        raise ValueError('{} does not use DirtyFieldsMixin.'.format(model_class.__name__))
+
+    was_tracing = tracemalloc.is_tracing()
+    if not was_tracing:
+        tracemalloc.start()
+    try:
+        gc.collect()
+        before = tracemalloc.get_traced_memory()[0]
+        instances = [build() for _ in range(count)]
+        gc.collect()
+        total = tracemalloc.get_traced_memory()[0] - before - sys.getsizeof(instances)
+
+        m2m_state = _released(instances, _delete_m2m_state)
+        fields = {}
+        field_types = {}
+        for field, name, attname, copier in get_tracking_plan(model_class).get_fields(check_relationship=True):
+            released = fields[name] = _released(instances, lambda instance: _delete_field_state(instance, name))
+            field_types[type(field).__name__] = field_types.get(type(field).__name__, 0) + released
+        state = sum(fields.values()) + _released(instances, _delete_state)
+    finally:
+        if not was_tracing:
+            tracemalloc.stop()
+
+    return MemoryReport(
+        model_class=model_class,
+        count=count,
+        total=total / count,
+        model=(total - state - m2m_state) / count,
+        state=state / count,
+        m2m_state=m2m_state / count,
+        fields={name: released / count for name, released in fields.items()},
+        field_types={name: released / count for name, released in field_types.items()},
+    )
+
+
+def _released(instances, delete):
+    """Return the memory released by calling `delete()` on every instance, in bytes."""
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    for instance in instances:
+        delete(instance)
+    gc.collect()
+    # Not below zero because of the few bytes allocated by the measure itself.
+    return max(0, before - tracemalloc.get_traced_memory()[0])
+
+
+def _delete_m2m_state(instance):
+    instance.__dict__.pop('_original_m2m_state', None)
+
+
+def _delete_field_state(instance, name):
+    instance_dict = instance.__dict__
+    for key in ('_original_state', '_dirtyfields_lazy'):
+        state = instance_dict.get(key)
+        if isinstance(state, MutableMapping):
+            state.pop(name, None)
+    if '_dirtyfields_state' in instance_dict:
+        # A compact state, stored again without the value, in a tuple of the same size.
+        instance._original_state = {key: value for key, value in instance._original_state.items() if key != name}
+
+
+def _delete_state(instance):
+    for key in STATE_KEYS:
+        instance.__dict__.pop(key, None)
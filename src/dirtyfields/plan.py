@@ -0,0 +1,229 @@
+"""
+Per-model tracking plans.
+
+Which fields ``DirtyFieldsMixin`` tracks only depends on the model class, so the
+decisions are made once per class and reused by every instance.
+"""
+import weakref
+
+from django.db.models.fields.files import FileDescriptor, FileField, ImageFileDescriptor
+from django.db.models.fields.related_descriptors import ForeignKeyDeferredAttribute
+from django.db.models.query_utils import DeferredAttribute
+
+from .copy_on_write import make_copy_on_write_copier
+from .copying import get_field_copier
+from .digest import make_digest_copier
+from .interning import get_intern_table, make_interning_copier
+
+# Descriptors storing the value given to the model `__init__()` as is, so that the value of such a field on an
+# instance built by `Model.from_db()` is the value read from the database.
+DB_VALUE_DESCRIPTORS = frozenset([
+    DeferredAttribute, ForeignKeyDeferredAttribute, FileDescriptor, ImageFileDescriptor,
+])
+
+# Models for which a plan has been built, so that plans can be dropped when the app registry is reloaded.
+_planned_models = weakref.WeakSet()
+
+
+def get_m2m_with_model(given_model):
+    # Only forward relations are needed, and unlike `_meta.get_fields()` this does not require
+    # the app registry to be ready, so it can be used while the model class is being prepared.
+    return [
+        (f, f.model if f.model != given_model else None)
+        for f in given_model._meta.many_to_many
+        if not f.auto_created
+    ]
+
+
+class TrackingPlan(object):
+    """
+    Precomputed description of the fields tracked on a model class.
+
+    ``fields_to_check`` is ``None`` when all fields are tracked, otherwise a frozenset holding
+    both the name and the attname of every tracked field. It defaults to the ``FIELDS_TO_CHECK``
+    of the model.
+    """
+
+    def __init__(self, model, fields_to_check=None):
+        self.model = model
+
+        if fields_to_check is None:
+            fields_to_check = model.FIELDS_TO_CHECK
+        if fields_to_check:
+            fields_to_check = frozenset(fields_to_check)
+            self.fields_to_check = frozenset(
+                name
+                for field in model._meta.concrete_fields
+                if field.name in fields_to_check or field.attname in fields_to_check
+                for name in (field.name, field.attname)
+            ) | fields_to_check
+        else:
+            self.fields_to_check = None
+
+        # (field, name, attname, is_relation, is_primary_key) for every tracked concrete field.
+        self.fields = tuple(
+            (field, field.name, field.attname, bool(field.remote_field), field.primary_key)
+            for field in model._meta.concrete_fields
+            if self.is_tracked(field.name)
+        )
+        self.attnames = tuple(entry[2] for entry in self.fields)
+        self.tracked_attnames = frozenset(self.attnames)
+        self.attname_by_name = {entry[1]: entry[2] for entry in self.fields}
+        # Names of the tracked fields, and their index in this tuple, e.g. in compact states.
+        self.names = tuple(entry[1] for entry in self.fields)
+        self.name_indexes = {name: index for index, name in enumerate(self.names)}
+        self.name_by_attname = {entry[2]: entry[1] for entry in self.fields}
+        # Files are captured by name, which can be changed without assigning the field.
+        self.always_checked_attnames = frozenset(
+            attname for field, name, attname, is_relation, is_primary_key in self.fields
+            if isinstance(field, FileField)
+        )
+
+        # Fields listed in `DIGEST_FIELDS` store the digest of their value instead of a copy, fields
+        # listed in `COPY_ON_WRITE_FIELDS` share their value with the state until it is changed, and
+        # the values of fields listed in `INTERN_FIELDS` are interned.
+        digest_fields = frozenset(model.DIGEST_FIELDS or ())
+        copy_on_write_fields = frozenset(model.COPY_ON_WRITE_FIELDS or ())
+        intern_fields = frozenset(model.INTERN_FIELDS or ())
+        copiers = {}
+        copy_on_write_attnames = set()
+        undigested_fields = []
+        for field, name, attname, is_relation, is_primary_key in self.fields:
+            copiers[attname] = get_field_copier(field)
+            if name in digest_fields or attname in digest_fields:
+                undigested_fields.append((field, name, attname, copiers[attname]))
+                copiers[attname] = make_digest_copier(field, copiers[attname], model.DIGEST_MIN_SIZE)
+            elif name in copy_on_write_fields or attname in copy_on_write_fields:
+                copiers[attname] = make_copy_on_write_copier(copiers[attname])
+                copy_on_write_attnames.add(attname)
+            if name in intern_fields or attname in intern_fields:
+                copiers[attname] = make_interning_copier(copiers[attname], get_intern_table(model))
+        self.copy_on_write_attnames = frozenset(copy_on_write_attnames)
+        # `get_fields()` entries of the digest fields with a copier keeping their value, by name.
+        self.undigested_fields = {entry[1]: entry for entry in undigested_fields}
+
+        # Field tuples for each combination of `check_relationship` and `include_primary_key`.
+        self._field_sets = {
+            (check_relationship, include_primary_key): tuple(
+                (field, name, attname, copiers[attname])
+                for field, name, attname, is_relation, is_primary_key in self.fields
+                if (check_relationship or not is_relation) and (include_primary_key or not is_primary_key)
+            )
+            for check_relationship in (True, False)
+            for include_primary_key in (True, False)
+        }
+
+        # `get_fields()` entries by attname, for each value of `check_relationship`.
+        self._field_maps = {
+            check_relationship: {entry[2]: entry for entry in self.get_fields(check_relationship)}
+            for check_relationship in (True, False)
+        }
+
+        # Fields that can be captured from the values given to `Model.from_db()`, as
+        # (name, attname, index in `_meta.concrete_fields`, copier), and the other ones.
+        concrete_indexes = {field.attname: index for index, field in enumerate(model._meta.concrete_fields)}
+        self.concrete_fields_count = len(concrete_indexes)
+        self.db_fields = tuple(
+            (name, attname, concrete_indexes[attname], copier)
+            for field, name, attname, copier in self.get_fields(check_relationship=True)
+            if type(_get_descriptor(model, attname)) in DB_VALUE_DESCRIPTORS
+            and attname not in self.copy_on_write_attnames
+        )
+        # `(name, attname)` of the `db_fields` whose values are interned, in the state and on the instance.
+        self.db_intern_fields = tuple(
+            (name, attname) for name, attname, index, copier in self.db_fields
+            if name in intern_fields or attname in intern_fields
+        )
+        # Copy-on-write fields are captured from the proxies set on the instance.
+        self.db_converted_fields = tuple(
+            entry for entry in self.get_fields(check_relationship=True)
+            if type(_get_descriptor(model, entry[2])) not in DB_VALUE_DESCRIPTORS
+            or entry[2] in self.copy_on_write_attnames
+        )
+
+        self.m2m_fields = tuple(get_m2m_with_model(model))
+        self.tracked_m2m_fields = tuple(
+            field for field, _ in self.m2m_fields if self.is_tracked(field.attname)
+        )
+
+        # `(function, kwargs)` tuples of the fields compared or normalised with their own function, by name.
+        self.compare_functions = self._get_field_functions(model.field_compare_functions)
+        self.normalise_functions = self._get_field_functions(model.field_normalise_functions)
+
+        # Plans tracking a subset of the fields, by the frozenset of names given to `narrow()`.
+        self._narrowed_plans = {}
+
+        # Functions generated for this plan, see `dirtyfields.codegen`.
+        self.generated_functions = {}
+
+    def _get_field_functions(self, functions):
+        """Resolve a mapping of field names or field classes to functions, for every tracked field."""
+        field_functions = {}
+        if not functions:
+            return field_functions
+
+        fields = [(field, name, attname) for field, name, attname, is_relation, is_primary_key in self.fields]
+        fields.extend((field, field.attname, field.attname) for field in self.tracked_m2m_fields)
+        for field, name, attname in fields:
+            if name in functions:
+                field_functions[name] = functions[name]
+            elif attname in functions:
+                field_functions[name] = functions[attname]
+            else:
+                for klass in type(field).__mro__:
+                    if klass in functions:
+                        field_functions[name] = functions[klass]
+                        break
+        return field_functions
+
+    def is_tracked(self, name):
+        return self.fields_to_check is None or name in self.fields_to_check
+
+    def get_fields(self, check_relationship, include_primary_key=True):
+        """Return ``(field, name, attname, copier)`` tuples of the fields to capture."""
+        return self._field_sets[(bool(check_relationship), bool(include_primary_key))]
+
+    def narrow(self, names):
+        """Return the plan tracking only the given fields, which must be tracked by this plan."""
+        names = frozenset(names)
+        try:
+            return self._narrowed_plans[names]
+        except KeyError:
+            pass
+
+        tracked_names = set(self.attname_by_name) | set(self.name_by_attname)
+        tracked_names.update(field.attname for field in self.tracked_m2m_fields)
+        for name in names:
+            if name not in tracked_names:
+                raise ValueError("'{}' is not a field tracked on {}".format(name, self.model.__name__))
+
+        plan = self._narrowed_plans[names] = TrackingPlan(self.model, names)
+        return plan
+
+    def select_fields(self, attnames, check_relationship):
+        """Return the `get_fields()` entries of the given attnames."""
+        field_map = self._field_maps[bool(check_relationship)]
+        return [field_map[attname] for attname in attnames if attname in field_map]
+
+
+def _get_descriptor(model, attname):
+    for klass in model.__mro__:
+        if attname in klass.__dict__:
+            return klass.__dict__[attname]
+    return None
+
+
+def get_tracking_plan(model):
+    plan = model._dirtyfields_plan
+    # The plan is stored as a class attribute, so a subclass sees its parent's plan until it gets its own.
+    if plan is None or plan.model is not model:
+        plan = model._dirtyfields_plan = TrackingPlan(model)
+        _planned_models.add(model)
+    return plan
+
+
+def clear_tracking_plans():
+    """Drop every cached plan, they will be rebuilt on next use."""
+    for model in list(_planned_models):
+        model._dirtyfields_plan = None
+    _planned_models.clear()
@@ -25,6 +25,6 @@ else:
         }
     }
 
-INSTALLED_APPS = ('tests', )
+INSTALLED_APPS = ('dirtyfields', 'tests', )
 
 MEDIA_ROOT = tempfile.mkdtemp(prefix="django-dirtyfields-test-media-root-")
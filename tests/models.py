@@ -3,7 +3,7 @@ from django.db.models.signals import pre_save
 from django.utils import timezone as django_timezone
 from jsonfield import JSONField as JSONFieldThirdParty
 
-from dirtyfields import DirtyFieldsMixin
+from dirtyfields import DirtyFieldsManager, DirtyFieldsMixin
 from dirtyfields.compare import timezone_support_compare
 
 
@@ -128,6 +128,11 @@ class ModelWithJSONBFieldTest(DirtyFieldsMixin, models.Model):
     jsonb_field = models.JSONField()
 
 
+class ModelWithJSONPayloadTest(DirtyFieldsMixin, models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+    payload = models.JSONField(default=dict)
+
+
 class ModelWithJSONFieldThirdPartyTest(DirtyFieldsMixin, models.Model):
     json_field_third_party = JSONFieldThirdParty()
 
@@ -157,6 +162,15 @@ class ModelWithM2MAndSpecifiedFieldsTest(DirtyFieldsMixin, models.Model):
     FIELDS_TO_CHECK = ['m2m1']
 
 
+class Many2ManyWithFieldsModelTest(DirtyFieldsMixin, models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+    m2m1 = models.ManyToManyField(ModelTest, related_name='+')
+    m2m2 = models.ManyToManyField(ModelTest, related_name='+')
+    ENABLE_M2M_CHECK = True
+
+    objects = DirtyFieldsManager()
+
+
 class BinaryModelTest(DirtyFieldsMixin, models.Model):
     bytea = models.BinaryField()
 
@@ -167,3 +181,168 @@ class FileFieldModel(DirtyFieldsMixin, models.Model):
 
 class ImageFieldModel(DirtyFieldsMixin, models.Model):
     image1 = models.ImageField(upload_to="image1/")
+
+
+class WriteTrackingModelTest(DirtyFieldsMixin, models.Model):
+    ENABLE_WRITE_TRACKING = True
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+    fkey = models.ForeignKey(ModelTest, null=True, on_delete=models.CASCADE)
+    json_field = models.JSONField(default=dict)
+    file1 = models.FileField(upload_to="file1/", blank=True)
+
+
+class LazyStateModelTest(DirtyFieldsMixin, models.Model):
+    ENABLE_LAZY_STATE = True
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+    fkey = models.ForeignKey(ModelTest, null=True, on_delete=models.CASCADE)
+    json_field = models.JSONField(default=dict)
+    file1 = models.FileField(upload_to="file1/", blank=True)
+
+
+class GetattrModelTest(models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+
+    class Meta:
+        abstract = True
+
+    def __getattr__(self, name):
+        if name.startswith('upper_'):
+            return getattr(self, name[len('upper_'):]).upper()
+        raise AttributeError(name)
+
+
+class LazyStateGetattrModelTest(DirtyFieldsMixin, GetattrModelTest):
+    ENABLE_LAZY_STATE = True
+
+
+class LazyStateWriteTrackingModelTest(DirtyFieldsMixin, models.Model):
+    ENABLE_LAZY_STATE = True
+    ENABLE_WRITE_TRACKING = True
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+
+
+class ModelWithDirtyFieldsManagerTest(DirtyFieldsMixin, models.Model):
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+    fkey = models.ForeignKey(ModelTest, null=True, on_delete=models.CASCADE)
+    objects = DirtyFieldsManager()
+
+
+class CodegenModelTest(DirtyFieldsMixin, models.Model):
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+    integer = models.IntegerField(null=True)
+    decimal = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    datetime = models.DateTimeField(null=True)
+    fkey = models.ForeignKey(ModelTest, null=True, on_delete=models.CASCADE)
+    json_field = models.JSONField(default=dict)
+    file1 = models.FileField(blank=True)
+    ENABLE_CODEGEN = True
+
+
+def case_insensitive_compare(new_value, old_value):
+    return new_value.lower() == old_value.lower()
+
+
+def upper_normalise(value, suffix=''):
+    return value.upper() + suffix
+
+
+class FieldFunctionsModelTest(DirtyFieldsMixin, models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+    other_characters = models.CharField(blank=True, max_length=80)
+    datetime_field = models.DateTimeField(default=django_timezone.now)
+    field_compare_functions = {
+        'characters': (case_insensitive_compare, {}),
+        models.DateTimeField: (timezone_support_compare, {}),
+    }
+    field_normalise_functions = {
+        'characters': (upper_normalise, {'suffix': '!'}),
+    }
+
+
+class CodegenFieldFunctionsModelTest(FieldFunctionsModelTest):
+    ENABLE_CODEGEN = True
+
+    class Meta:
+        proxy = True
+
+
+class DigestModelTest(DirtyFieldsMixin, models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+    text = models.TextField(blank=True)
+    payload = models.JSONField(default=dict)
+    binary = models.BinaryField(default=b'')
+    DIGEST_FIELDS = ['text', 'payload', 'binary']
+
+
+class DigestWithMinSizeModelTest(DigestModelTest):
+    DIGEST_MIN_SIZE = 100
+
+    class Meta:
+        proxy = True
+
+
+class CopyOnWriteModelTest(DirtyFieldsMixin, models.Model):
+    characters = models.CharField(blank=True, max_length=80)
+    json_field = models.JSONField(default=dict)
+    json_field_third_party = JSONFieldThirdParty(default=list)
+    COPY_ON_WRITE_FIELDS = ['json_field', 'json_field_third_party']
+
+
+class BaseStateStorageModelTest(DirtyFieldsMixin, models.Model):
+    boolean = models.BooleanField(default=True)
+    characters = models.CharField(blank=True, max_length=80)
+    integer = models.IntegerField(default=0)
+    decimal = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    fkey = models.ForeignKey(ModelTest, null=True, on_delete=models.CASCADE)
+    json_field = models.JSONField(default=dict)
+    text1 = models.TextField(blank=True)
+    text2 = models.TextField(blank=True)
+    text3 = models.TextField(blank=True)
+    text4 = models.TextField(blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class CompactStateModelTest(BaseStateStorageModelTest):
+    ENABLE_COMPACT_STATE = True
+
+
+class DictStateModelTest(BaseStateStorageModelTest):
+    pass
+
+
+class ColumnarModelTest(BaseStateStorageModelTest):
+    number = models.FloatField(null=True)
+
+    objects = DirtyFieldsManager()
+
+
+class BaseInterningModelTest(DirtyFieldsMixin, models.Model):
+    status = models.CharField(max_length=20, default='active')
+    country = models.CharField(max_length=2, default='FR')
+    amount = models.IntegerField(default=0)
+    description = models.TextField(blank=True)
+
+    class Meta:
+        abstract = True
+
+
+class InterningModelTest(BaseInterningModelTest):
+    INTERN_FIELDS = ['status', 'country', 'amount']
+
+
+class SmallInternTableModelTest(InterningModelTest):
+    INTERN_TABLE_SIZE = 2
+
+    class Meta:
+        proxy = True
+
+
+class NotInterningModelTest(BaseInterningModelTest):
+    pass
@@ -0,0 +1,134 @@
+import pytest
+
+from dirtyfields import bulk_save_dirty
+from dirtyfields.bulk import BulkSaveGroup
+from .models import ModelTest, ModelWithDirtyFieldsManagerTest
+from .utils import assert_number_queries
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_groups_instances_by_dirty_fields():
+    instances = [ModelTest.objects.create(characters=str(i)) for i in range(5)]
+    instances[0].characters = 'a'
+    instances[1].characters = 'b'
+    instances[2].boolean = False
+    instances[2].characters = 'c'
+    instances[3].boolean = False
+
+    with assert_number_queries(3):
+        groups = bulk_save_dirty(instances)
+
+    assert groups == [
+        BulkSaveGroup(ModelTest, 'update', ('characters',), 2),
+        BulkSaveGroup(ModelTest, 'update', ('boolean', 'characters'), 1),
+        BulkSaveGroup(ModelTest, 'update', ('boolean',), 1),
+        BulkSaveGroup(ModelTest, 'skip', (), 1),
+    ]
+    assert not any(instance.is_dirty() for instance in instances)
+    assert list(ModelTest.objects.order_by('pk').values_list('boolean', 'characters')) == [
+        (True, 'a'), (True, 'b'), (False, 'c'), (False, '3'), (True, '4'),
+    ]
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_primary_key():
+    instances = [ModelTest.objects.create(characters=str(i)) for i in range(2)]
+    instances[0].characters = 'a'
+    instances[1].pk = 100
+
+    with assert_number_queries(0):
+        with pytest.raises(ValueError, match="The primary key of ModelTest instance 100 is dirty"):
+            bulk_save_dirty(instances)
+    assert instances[0].is_dirty()
+    assert list(ModelTest.objects.order_by('pk').values_list('characters', flat=True)) == ['0', '1']
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_creates_unsaved_instances():
+    saved = ModelTest.objects.create()
+    saved.characters = 'saved'
+    instances = [ModelTest(characters='new1'), saved, ModelTest(characters='new2')]
+
+    groups = bulk_save_dirty(instances)
+
+    assert groups == [
+        BulkSaveGroup(ModelTest, 'create', (), 2),
+        BulkSaveGroup(ModelTest, 'update', ('characters',), 1),
+    ]
+    assert ModelTest.objects.count() == 3
+    assert not any(instance.is_dirty() for instance in instances)
+    instances[0].characters = 'changed'
+    assert instances[0].get_dirty_fields() == {'characters': 'new1'}
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_batch_size():
+    instances = [ModelTest.objects.create() for i in range(5)]
+    for instance in instances:
+        instance.characters = 'foo'
+
+    with assert_number_queries(3):
+        bulk_save_dirty(instances, batch_size=2)
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_foreign_key():
+    fk1 = ModelTest.objects.create()
+    fk2 = ModelTest.objects.create()
+    instance = ModelWithDirtyFieldsManagerTest.objects.create(fkey=fk1)
+    instance.fkey = fk2
+
+    assert ModelWithDirtyFieldsManagerTest.objects.bulk_save_dirty([instance]) == [
+        BulkSaveGroup(ModelWithDirtyFieldsManagerTest, 'update', ('fkey',), 1),
+    ]
+    assert not instance.is_dirty(check_relationship=True)
+    assert ModelWithDirtyFieldsManagerTest.objects.get().fkey == fk2
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_nothing_to_save():
+    with assert_number_queries(0):
+        assert bulk_save_dirty([]) == []
+
+
+@pytest.mark.django_db
+def test_queryset_bulk_create_resets_state():
+    instances = [ModelWithDirtyFieldsManagerTest(characters=str(i)) for i in range(3)]
+    assert all(instance.is_dirty() for instance in instances)
+
+    with assert_number_queries(1):
+        created = ModelWithDirtyFieldsManagerTest.objects.bulk_create(instances)
+
+    assert created == instances
+    assert not any(instance._state.adding for instance in instances)
+    assert not any(instance.is_dirty() for instance in instances)
+    instances[0].characters = 'changed'
+    assert instances[0].get_dirty_fields() == {'characters': '0'}
+
+
+@pytest.mark.django_db
+def test_queryset_bulk_update_resets_updated_fields():
+    instances = [ModelWithDirtyFieldsManagerTest.objects.create(characters=str(i)) for i in range(3)]
+    for instance in instances:
+        instance.characters = 'new'
+        instance.boolean = False
+
+    # Instances may be given as an iterator.
+    with assert_number_queries(1):
+        ModelWithDirtyFieldsManagerTest.objects.bulk_update(iter(instances), ['characters'])
+
+    for instance in instances:
+        assert instance.get_dirty_fields() == {'boolean': True}
+    assert set(ModelWithDirtyFieldsManagerTest.objects.values_list('characters', 'boolean')) == {('new', True)}
+
+
+@pytest.mark.django_db
+def test_bulk_save_dirty_with_dirty_fields_queryset():
+    instances = [ModelWithDirtyFieldsManagerTest.objects.create(characters=str(i)) for i in range(2)]
+    instances[0].characters = 'a'
+    instances.append(ModelWithDirtyFieldsManagerTest(characters='new'))
+
+    with assert_number_queries(2):
+        ModelWithDirtyFieldsManagerTest.objects.bulk_save_dirty(instances)
+
+    assert not any(instance.is_dirty() for instance in instances)
@@ -0,0 +1,107 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db.models import F
+
+from dirtyfields.codegen import build_diff_function, get_diff_function, get_snapshot_function
+from dirtyfields.compare import compare_states, normalise_value, raw_compare
+from .models import CodegenModelTest, ModelTest
+
+
+def generic_state(instance, check_relationship=True, include_primary_key=True):
+    return instance._capture_fields(instance._get_tracking_plan().get_fields(check_relationship, include_primary_key))
+
+
+@pytest.mark.django_db
+def test_snapshot_matches_generic_capture():
+    fkey = ModelTest.objects.create()
+    tm = CodegenModelTest.objects.create(
+        characters='foo', integer=1, decimal=Decimal('1.50'), datetime=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        fkey=fkey, json_field={'a': [1]},
+    )
+    tm.file1.save('test.txt', ContentFile(b'content'), save=False)
+
+    for check_relationship in (True, False):
+        for include_primary_key in (True, False):
+            snapshot = get_snapshot_function(tm._get_tracking_plan(), check_relationship, include_primary_key)
+            assert snapshot(tm) == generic_state(tm, check_relationship, include_primary_key)
+
+    state = tm._as_dict(check_relationship=True)
+    assert state['file1'] == tm.file1.name
+    # Mutable values are copied.
+    assert state['json_field'] == {'a': [1]}
+    assert state['json_field'] is not tm.json_field
+
+
+@pytest.mark.django_db
+def test_snapshot_converts_other_types():
+    tm = CodegenModelTest.objects.create()
+    tm.integer = '2'
+    tm.decimal = 1.5
+    tm.boolean = 'invalid'
+
+    state = tm._as_dict(check_relationship=True)
+    assert state == generic_state(tm)
+    assert state['integer'] == 2
+    assert state['boolean'] == 'invalid'
+
+
+@pytest.mark.django_db
+def test_snapshot_skips_expressions_and_deferred_fields():
+    CodegenModelTest.objects.create(integer=1)
+    tm = CodegenModelTest.objects.defer('characters').get()
+    tm.integer = F('integer') + 1
+
+    state = tm._as_dict(check_relationship=True)
+    assert state == generic_state(tm)
+    assert 'characters' not in state
+    assert 'integer' not in state
+
+
+@pytest.mark.django_db
+def test_dirty_fields_with_codegen():
+    tm = CodegenModelTest.objects.create(characters='foo', integer=1)
+    assert tm.get_dirty_fields() == {}
+
+    tm.characters = 'bar'
+    tm.integer = 2
+    tm.json_field['a'] = 1
+    assert tm.get_dirty_fields() == {'characters': 'foo', 'integer': 1, 'json_field': {}}
+    assert tm.get_dirty_fields(verbose=True)['characters'] == {'saved': 'foo', 'current': 'bar'}
+
+    tm.save()
+    assert not tm.is_dirty()
+
+
+def test_diff_matches_compare_states():
+    plan = CodegenModelTest._get_tracking_plan(CodegenModelTest())
+    new_state = {'characters': 'a', 'integer': 2, 'boolean': True, 'decimal': None}
+    original_state = {'characters': 'b', 'integer': 2, 'boolean': False}
+
+    def compare(new_value, old_value, ignore=()):
+        return new_value in ignore or new_value == old_value
+
+    def normalise(value, suffix=''):
+        return '{}{}'.format(value, suffix)
+
+    for compare_function, normalise_function in [
+        ((raw_compare, {}), (normalise_value, {})),
+        ((compare, {}), (normalise, {})),
+        ((compare, {'ignore': ('a',)}), (normalise, {'suffix': '!'})),
+    ]:
+        diff = build_diff_function(plan, compare_function, normalise_function)
+        assert diff(new_state, original_state) == compare_states(
+            new_state, original_state, compare_function, normalise_function)
+
+
+def test_functions_are_cached_on_the_plan():
+    plan = CodegenModelTest._get_tracking_plan(CodegenModelTest())
+    assert get_snapshot_function(plan, True) is get_snapshot_function(plan, True)
+
+    functions = (CodegenModelTest.compare_function, CodegenModelTest.normalise_function)
+    diff = get_diff_function(plan, *functions)
+    assert get_diff_function(plan, *functions) is diff
+    # Rebuilt when the compare function changes.
+    assert get_diff_function(plan, (raw_compare, {'unused': None}), functions[1]) is not diff
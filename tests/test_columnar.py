@@ -0,0 +1,209 @@
+import pickle
+
+import pytest
+
+from dirtyfields.bulk import BulkSaveGroup
+from dirtyfields.columnar import ColumnarSnapshot, RowState, get_snapshot
+from dirtyfields.compact import NOT_CAPTURED
+from .models import ColumnarModelTest
+from .utils import assert_number_queries
+
+
+@pytest.fixture
+def loaded():
+    ColumnarModelTest.objects.bulk_create([ColumnarModelTest(characters=str(i), integer=i) for i in range(5)])
+    queryset = ColumnarModelTest.objects.columnar_state().order_by('pk')
+    instances = list(queryset)
+    return queryset.columnar_snapshot, instances
+
+
+@pytest.mark.django_db
+def test_columnar_state_stores_the_original_state_in_columns(loaded):
+    snapshot, instances = loaded
+
+    assert isinstance(snapshot, ColumnarSnapshot)
+    assert snapshot.instances == instances
+    assert snapshot.columns['characters'] == ['0', '1', '2', '3', '4']
+    assert snapshot.columns['integer'] == [0, 1, 2, 3, 4]
+    for row, instance in enumerate(instances):
+        assert type(instance.__dict__['_original_state']) is RowState
+        assert instance._original_state['integer'] == row
+        assert get_snapshot(instance) is snapshot
+
+    instances[1].characters = 'changed'
+    assert instances[1].get_dirty_fields() == {'characters': '1'}
+    assert not instances[0].is_dirty()
+
+
+@pytest.mark.django_db
+def test_get_dirty_returns_the_dirty_rows_and_columns(loaded):
+    snapshot, instances = loaded
+    instances[0].characters = 'a'
+    instances[2].characters = 'c'
+    instances[2].integer = 20
+    instances[3].number = 1.5
+    instances[4].integer = 4
+
+    dirty = snapshot.get_dirty()
+
+    assert dirty.rows == [
+        (instances[0], ('characters',)),
+        (instances[2], ('characters', 'integer')),
+        (instances[3], ('number',)),
+    ]
+    assert dirty.columns == {
+        'characters': [instances[0], instances[2]],
+        'integer': [instances[2]],
+        'number': [instances[3]],
+    }
+    for instance, fields in dirty.rows:
+        assert set(instance.get_dirty_fields()) == set(fields)
+
+
+@pytest.mark.django_db
+def test_get_dirty_checks_relationships_on_request(loaded):
+    snapshot, instances = loaded
+    instances[1].fkey_id = 42
+
+    assert snapshot.get_dirty().rows == []
+    assert snapshot.get_dirty(check_relationship=True).rows == [(instances[1], ('fkey',))]
+
+
+@pytest.mark.django_db
+def test_bulk_update_dirty_saves_one_column_per_query(loaded):
+    snapshot, instances = loaded
+    instances[0].characters = 'a'
+    instances[2].characters = 'c'
+    instances[2].integer = 20
+
+    # Plus the savepoint of the transaction.
+    with assert_number_queries(4):
+        groups = snapshot.bulk_update_dirty()
+
+    assert groups == [
+        BulkSaveGroup(ColumnarModelTest, 'update', ('characters',), 2),
+        BulkSaveGroup(ColumnarModelTest, 'update', ('integer',), 1),
+    ]
+    assert snapshot.get_dirty().rows == []
+    assert snapshot.columns['characters'] == ['a', '1', 'c', '3', '4']
+    assert list(ColumnarModelTest.objects.order_by('pk').values_list('characters', 'integer')) == [
+        ('a', 0), ('1', 1), ('c', 20), ('3', 3), ('4', 4),
+    ]
+
+
+@pytest.mark.django_db
+def test_saved_instance_is_detached_from_the_snapshot(loaded):
+    snapshot, instances = loaded
+    instances[1].characters = 'saved'
+    instances[1].save()
+    instances[1].integer = 10
+
+    assert type(instances[1].__dict__['_original_state']) is dict
+    assert get_snapshot(instances[1]) is None
+    assert not snapshot.is_attached(1)
+    assert snapshot.columns['characters'] == ['0', NOT_CAPTURED, '2', '3', '4']
+    assert snapshot.get_dirty().rows == [(instances[1], ('integer',))]
+
+
+@pytest.mark.django_db
+def test_partial_reset_updates_the_columns(loaded):
+    snapshot, instances = loaded
+    instances[1].characters = 'saved'
+    instances[1].integer = 10
+    instances[1].save(update_fields=['characters'])
+
+    assert snapshot.is_attached(1)
+    assert snapshot.columns['characters'][1] == 'saved'
+    assert instances[1].get_dirty_fields() == {'integer': 1}
+
+
+@pytest.mark.django_db
+def test_deferred_fields_are_not_captured():
+    ColumnarModelTest.objects.create(characters='foo')
+    queryset = ColumnarModelTest.objects.columnar_state().defer('characters')
+    instance, = queryset
+
+    assert queryset.columnar_snapshot.columns['characters'] == [NOT_CAPTURED]
+    assert 'characters' not in instance._original_state
+    assert queryset.columnar_snapshot.get_dirty().rows == []
+
+
+@pytest.mark.django_db
+def test_iterator_stores_each_chunk_in_a_snapshot():
+    ColumnarModelTest.objects.bulk_create([ColumnarModelTest(integer=i) for i in range(5)])
+    queryset = ColumnarModelTest.objects.columnar_state().order_by('pk')
+
+    instances = list(queryset.iterator(chunk_size=2))
+
+    snapshots = [get_snapshot(instance) for instance in instances]
+    assert [snapshot.columns['integer'] for snapshot in snapshots[::2]] == [[0, 1], [2, 3], [4]]
+    assert snapshots[0] is snapshots[1] and snapshots[1] is not snapshots[2]
+    assert queryset.columnar_snapshot is snapshots[4]
+
+
+@pytest.mark.django_db
+def test_track_fields_uses_the_narrowed_plan():
+    ColumnarModelTest.objects.create(characters='foo', integer=1)
+    queryset = ColumnarModelTest.objects.columnar_state().track_fields('integer')
+    instance, = queryset
+
+    assert list(queryset.columnar_snapshot.columns) == ['integer']
+    instance.characters = 'bar'
+    instance.integer = 2
+    assert queryset.columnar_snapshot.get_dirty().rows == [(instance, ('integer',))]
+
+
+@pytest.mark.django_db
+def test_untracked_instances_are_not_stored():
+    ColumnarModelTest.objects.create()
+    queryset = ColumnarModelTest.objects.columnar_state().without_dirty_tracking()
+    list(queryset)
+
+    assert len(queryset.columnar_snapshot) == 0
+
+
+@pytest.mark.django_db
+def test_pickled_instance_holds_a_dict_state(loaded):
+    snapshot, instances = loaded
+    instances[1].characters = 'changed'
+
+    unpickled = pickle.loads(pickle.dumps(instances[1]))
+
+    assert type(unpickled.__dict__['_original_state']) is dict
+    assert unpickled.get_dirty_fields() == {'characters': '1'}
+
+
+@pytest.mark.django_db
+def test_numeric_columns_are_compared_with_numpy(loaded, monkeypatch):
+    pytest.importorskip('numpy')
+    from dirtyfields import columnar
+
+    calls = []
+    diff_numeric = columnar._diff_numeric
+    monkeypatch.setattr(columnar, '_diff_numeric', lambda *args: calls.append(args) or diff_numeric(*args))
+    snapshot, instances = loaded
+    instances[3].integer = 30
+    instances[1].number = float('nan')
+
+    assert snapshot.get_dirty().columns == {'integer': [instances[3]], 'number': [instances[1]]}
+    assert calls
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_nan_values_are_compared_like_get_dirty_fields(loaded, monkeypatch, use_numpy):
+    from dirtyfields import columnar
+
+    if use_numpy:
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setattr(columnar, 'numpy', None)
+    snapshot, instances = loaded
+    nan = float('nan')
+    for row, instance in enumerate(instances):
+        instance.number = snapshot.columns['number'][row] = nan if row < 2 else float(row)
+    # Another NaN object, which `raw_compare()` does not consider equal.
+    instances[1].number = float('nan')
+
+    assert snapshot.get_dirty().columns == {'number': [instances[1]]}
+    assert [instance.is_dirty() for instance in instances] == [False, True, False, False, False]
@@ -0,0 +1,100 @@
+import pickle
+import tracemalloc
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+from django.db.models import F
+
+from dirtyfields import DirtyFieldsMixin
+from dirtyfields.compact import NOT_CAPTURED, CompactState
+from .models import CompactStateModelTest, DictStateModelTest, ModelTest
+
+
+@pytest.mark.django_db
+def test_compact_state_is_a_read_only_mapping():
+    fkey = ModelTest.objects.create()
+    tm = CompactStateModelTest.objects.create(characters='foo', fkey=fkey)
+
+    assert isinstance(tm.__dict__['_dirtyfields_state'], tuple)
+    assert '_original_state' not in tm.__dict__
+    state = tm._original_state
+    assert isinstance(state, CompactState)
+    assert state == {
+        'id': tm.pk, 'boolean': True, 'characters': 'foo', 'integer': 0, 'decimal': 0, 'fkey': fkey.pk,
+        'json_field': {}, 'text1': '', 'text2': '', 'text3': '', 'text4': '',
+    }
+    assert state['characters'] == 'foo'
+    with pytest.raises(TypeError):
+        state['characters'] = 'bar'
+
+
+@pytest.mark.django_db
+def test_dirty_fields_with_compact_state():
+    tm = CompactStateModelTest.objects.create(characters='foo')
+    tm = CompactStateModelTest.objects.get()
+    assert not tm.is_dirty()
+
+    tm.characters = 'bar'
+    tm.json_field['a'] = 1
+    assert tm.get_dirty_fields() == {'characters': 'foo', 'json_field': {}}
+
+    tm.save(update_fields=['characters'])
+    assert tm.get_dirty_fields() == {'json_field': {}}
+    tm.save()
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_compact_state_not_captured_fields():
+    CompactStateModelTest.objects.create(characters='foo')
+    tm = CompactStateModelTest.objects.defer('characters').get()
+    assert NOT_CAPTURED in tm.__dict__['_dirtyfields_state']
+    assert 'characters' not in tm._original_state
+
+    tm.integer = F('integer') + 1
+    tm.save(update_fields=['integer'])
+    assert 'integer' not in tm._original_state
+    assert len(tm._original_state) == 9
+
+
+@pytest.mark.django_db
+def test_pickled_compact_state():
+    CompactStateModelTest.objects.create()
+    tm = pickle.loads(pickle.dumps(CompactStateModelTest.objects.defer('characters').get()))
+    assert 'characters' not in tm._original_state
+    assert not tm.is_dirty()
+
+
+def test_compact_state_cannot_be_lazy():
+    with pytest.raises(ImproperlyConfigured):
+        class LazyCompactModel(DirtyFieldsMixin, models.Model):
+            ENABLE_COMPACT_STATE = True
+            ENABLE_LAZY_STATE = True
+
+            class Meta:
+                app_label = 'tests'
+
+
+def _allocated_per_instance(model, count=2000):
+    instances = []
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for i in range(count):
+            instances.append(model(pk=i, characters='foo'))
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return (after - before) / count
+
+
+def test_compact_state_uses_less_memory():
+    # Build the tracking plans first.
+    CompactStateModelTest()
+    DictStateModelTest()
+
+    compact = _allocated_per_instance(CompactStateModelTest)
+    dict_state = _allocated_per_instance(DictStateModelTest)
+    # A tuple of 11 values instead of a dict of 11 items.
+    assert dict_state - compact > 150
@@ -0,0 +1,50 @@
+import pytest
+
+from dirtyfields.compare import compare_states, raw_compare, normalise_value, timezone_support_compare
+from .models import CodegenFieldFunctionsModelTest, FieldFunctionsModelTest, case_insensitive_compare
+
+
+def test_compare_states_with_field_functions():
+    new_state = {'a': 'X', 'b': 'X'}
+    original_state = {'a': 'x', 'b': 'x'}
+    states = compare_states(new_state, original_state, (raw_compare, {}), (normalise_value, {}),
+                            {'a': (case_insensitive_compare, {})}, {'b': (str.lower, {})})
+    assert states == {'b': {'saved': 'x', 'current': 'x'}}
+
+
+def test_compare_states_skips_identical_immutable_values():
+    calls = []
+
+    def compare(new_value, old_value):
+        calls.append(new_value)
+        return new_value == old_value
+
+    value = 'x' * 10
+    mutable = []
+    assert compare_states({'a': value, 'b': mutable}, {'a': value, 'b': mutable},
+                          (compare, {}), (normalise_value, {})) == {}
+    assert calls == [mutable]
+
+
+def test_field_functions_are_resolved_by_name_and_field_class():
+    plan = FieldFunctionsModelTest._get_tracking_plan(FieldFunctionsModelTest())
+    assert set(plan.compare_functions) == {'characters', 'datetime_field'}
+    assert plan.compare_functions['datetime_field'] == (timezone_support_compare, {})
+    assert set(plan.normalise_functions) == {'characters'}
+
+
+@pytest.mark.parametrize('model', [FieldFunctionsModelTest, CodegenFieldFunctionsModelTest])
+@pytest.mark.django_db
+def test_dirty_fields_with_field_functions(model):
+    tm = model.objects.create(characters='foo', other_characters='foo')
+
+    tm.characters = 'FOO'
+    tm.other_characters = 'FOO'
+    assert tm.get_dirty_fields() == {'other_characters': 'foo'}
+
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'FOO!', 'other_characters': 'foo'}
+    assert tm.get_dirty_fields(verbose=True) == {
+        'characters': {'saved': 'FOO!', 'current': 'BAR!'},
+        'other_characters': {'saved': 'foo', 'current': 'FOO'},
+    }
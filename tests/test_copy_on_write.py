@@ -0,0 +1,149 @@
+import copy
+import pickle
+
+import pytest
+
+from dirtyfields.copy_on_write import TrackedDict, TrackedList
+from dirtyfields.dirtyfields import reset_state
+from .models import CopyOnWriteModelTest
+
+
+@pytest.fixture
+def tm():
+    CopyOnWriteModelTest.objects.create(
+        json_field={'data': {'items': [1, 2]}, 'flag': True},
+        json_field_third_party=[{'a': 1}, [2]],
+    )
+    return CopyOnWriteModelTest.objects.get()
+
+
+@pytest.mark.django_db
+def test_values_are_shared_with_the_state(tm):
+    assert type(tm.json_field) is TrackedDict
+    assert type(tm.json_field_third_party) is TrackedList
+    assert tm._original_state['json_field'] is tm.json_field
+    assert tm._original_state['json_field_third_party'] is tm.json_field_third_party
+
+    # Reading nested values does not copy anything.
+    assert tm.json_field['data']['items'][0] == 1
+    assert list(tm.json_field_third_party[0].values()) == [1]
+    assert tm._original_state['json_field'] is tm.json_field
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_nested_change_is_dirty(tm):
+    tm.json_field['data']['items'].append(3)
+    assert tm.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2]}, 'flag': True}}
+    assert type(tm._original_state['json_field']) is dict
+
+    tm.json_field_third_party[0]['a'] = 2
+    assert tm.get_dirty_fields()['json_field_third_party'] == [{'a': 1}, [2]]
+
+    tm.save()
+    assert not tm.is_dirty()
+    assert tm._original_state['json_field'] is tm.json_field
+    tm.json_field['flag'] = False
+    assert tm.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2, 3]}, 'flag': True}}
+    assert CopyOnWriteModelTest.objects.get().json_field == {'data': {'items': [1, 2, 3]}, 'flag': True}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('change', [
+    lambda value: value.update(flag=False),
+    lambda value: value.pop('flag'),
+    lambda value: value.setdefault('other', 1),
+    lambda value: value.clear(),
+    lambda value: value['data'].__delitem__('items'),
+    lambda value: value['data']['items'].sort(reverse=True),
+    lambda value: value['data']['items'].extend([3]),
+    lambda value: dict(value)['data']['items'].append(3),
+    lambda value: {**value}['data']['items'].append(3),
+    lambda value: value.copy()['data']['items'].append(3),
+    lambda value: list(value.values())[0]['items'].append(3),
+    lambda value: value['data']['items'][:][0:0] or value['data']['items'].reverse(),
+])
+def test_changes_are_dirty(tm, change):
+    change(tm.json_field)
+    assert tm.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2]}, 'flag': True}}
+
+
+@pytest.mark.django_db
+def test_assigned_value_is_wrapped(tm):
+    value = {'new': [1]}
+    tm.json_field = value
+    assert type(tm.json_field) is TrackedDict
+    assert tm.json_field == value
+    assert tm.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2]}, 'flag': True}}
+
+    tm.save()
+    tm.json_field['new'].append(2)
+    assert tm.get_dirty_fields() == {'json_field': {'new': [1]}}
+
+
+def test_assigned_value_is_not_shared_with_external_references():
+    items = [1]
+    tm = CopyOnWriteModelTest(pk=1, json_field={'new': items})
+    tm._state.adding = False
+
+    items.append(2)
+    assert tm.json_field == {'new': [1]}
+    assert not tm.is_dirty()
+    tm.json_field['new'].append(3)
+    assert tm.get_dirty_fields() == {'json_field': {'new': [1]}}
+
+
+@pytest.mark.django_db
+def test_value_assigned_from_another_instance(tm):
+    # Wraps the nested dict in a proxy of `tm`.
+    tm.json_field['data']
+    other = CopyOnWriteModelTest(pk=2, json_field=tm.json_field)
+    other._state.adding = False
+
+    tm.json_field['data']['items'].append(3)
+    assert other.json_field == {'data': {'items': [1, 2]}, 'flag': True}
+    assert not other.is_dirty()
+    other.json_field['data']['items'].append(4)
+    assert other.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2]}, 'flag': True}}
+
+
+@pytest.mark.django_db
+def test_nested_value_is_not_shared_with_external_references(tm):
+    items = [1]
+    tm.json_field['data'] = {'items': items}
+    tm.json_field_third_party.append(items)
+    reset_state(sender=CopyOnWriteModelTest, instance=tm)
+
+    items.append(2)
+    assert tm.json_field['data'] == {'items': [1]}
+    assert tm.json_field_third_party[-1] == [1]
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_copies_are_plain_values(tm):
+    copied = copy.deepcopy(tm.json_field)
+    assert type(copied) is dict
+    assert type(copied['data']['items']) is list
+    assert copied == tm.json_field
+
+
+@pytest.mark.django_db
+def test_pickled_instance(tm):
+    unpickled = pickle.loads(pickle.dumps(tm))
+    assert unpickled.json_field == tm.json_field
+    assert not unpickled.is_dirty()
+
+    unpickled.json_field['data']['items'].append(3)
+    assert unpickled.get_dirty_fields() == {'json_field': {'data': {'items': [1, 2]}, 'flag': True}}
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_new_instance():
+    tm = CopyOnWriteModelTest()
+    assert type(tm.json_field) is TrackedDict
+    tm.json_field['a'] = 1
+    tm.save()
+    assert not tm.is_dirty()
+    assert CopyOnWriteModelTest.objects.get().json_field == {'a': 1}
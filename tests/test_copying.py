@@ -0,0 +1,113 @@
+from decimal import Decimal
+
+import pytest
+from django.db import models
+
+from dirtyfields.copying import (
+    copy_value,
+    identity_copy,
+    register_copier,
+    shallow_copy,
+    unregister_copier,
+)
+from .models import BinaryModelTest, ModelWithDecimalFieldTest, ModelWithJSONBFieldTest
+
+
+class Money(Decimal):
+    pass
+
+
+class Point(object):
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+@pytest.mark.parametrize('value', [None, True, 1, 1.5, 'text', b'bytes', Decimal('1.10'), Money('2')])
+def test_immutable_values_are_not_copied(value):
+    assert copy_value(value) is value
+
+
+def test_flat_containers_are_shallow_copied():
+    value = [1, 'a', None]
+    copied = copy_value(value)
+    assert copied == value
+    assert copied is not value
+
+    value = {'a': 1, 'b': 'c'}
+    copied = copy_value(value)
+    assert copied == value
+    assert copied is not value
+
+
+def test_nested_containers_are_deep_copied():
+    value = {'data': [1, 2, 3]}
+    copied = copy_value(value)
+    value['data'].append(4)
+    assert copied == {'data': [1, 2, 3]}
+
+
+def test_unknown_types_are_deep_copied():
+    point = Point(1, 2)
+    copied = copy_value(point)
+    assert copied is not point
+    assert (copied.x, copied.y) == (1, 2)
+
+
+def test_memoryview_is_copied_to_bytes():
+    assert copy_value(memoryview(b'abc')) == b'abc'
+
+
+def test_shallow_copy_of_other_types_is_deep():
+    value = ({'a': 1},)
+    copied = shallow_copy(value)
+    assert copied == value
+    assert copied[0] is not value[0]
+
+
+def test_register_copier_for_type():
+    register_copier(Point, identity_copy)
+    try:
+        point = Point(1, 2)
+        assert copy_value(point) is point
+    finally:
+        unregister_copier(Point)
+    assert copy_value(point) is not point
+
+
+@pytest.mark.django_db
+def test_register_copier_for_field_class():
+    calls = []
+
+    def copier(value):
+        calls.append(value)
+        return value
+
+    register_copier(models.DecimalField, copier)
+    try:
+        ModelWithDecimalFieldTest.objects.create(decimal_field=Decimal('1.00'))
+    finally:
+        unregister_copier(models.DecimalField)
+    assert Decimal('1.00') in calls
+
+
+@pytest.mark.django_db
+def test_snapshot_shares_immutable_values():
+    tm = ModelWithDecimalFieldTest.objects.create(decimal_field=Decimal('1.00'))
+    assert tm._original_state['decimal_field'] is tm.decimal_field
+
+
+@pytest.mark.django_db
+def test_snapshot_copies_mutable_values():
+    tm = ModelWithJSONBFieldTest.objects.create(jsonb_field={'data': [1, 2, 3]})
+    assert tm._original_state['jsonb_field'] == tm.jsonb_field
+    assert tm._original_state['jsonb_field']['data'] is not tm.jsonb_field['data']
+
+
+@pytest.mark.django_db
+def test_binary_field_snapshot():
+    tm = BinaryModelTest.objects.create(bytea=b'abc')
+    tm = BinaryModelTest.objects.get(pk=tm.pk)
+    assert tm._original_state['bytea'] == b'abc'
+    tm.bytea = b'def'
+    assert tm.get_dirty_fields() == {'bytea': b'abc'}
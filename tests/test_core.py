@@ -4,8 +4,10 @@ from os.path import dirname, join
 import pytest
 import django
 from django.core.files.base import ContentFile, File
-from django.db import DatabaseError, transaction
+from django.apps.registry import Apps
+from django.db import DatabaseError, models, transaction
 from django.db.models.fields.files import ImageFile
+from django.db.models.signals import post_save
 
 import dirtyfields
 from .models import (ModelTest, ModelWithForeignKeyTest,
@@ -180,6 +182,61 @@ def test_verbose_mode_on_adding():
     }
 
 
+def test_state_is_not_captured_while_adding():
+    tm = ModelTest(characters='foo')
+
+    assert '_original_state' not in tm.__dict__
+    assert tm.get_dirty_fields() == {'boolean': True, 'characters': 'foo'}
+
+
+def test_state_is_captured_on_init_with_primary_key():
+    tm = ModelTest(pk=5, characters='foo')
+    tm._state.adding = False
+    tm.characters = 'bar'
+
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+
+def test_state_is_captured_on_first_access_while_adding():
+    tm = ModelTest(characters='foo')
+    tm.characters = 'bar'
+
+    assert tm._original_state == {'id': None, 'boolean': True, 'characters': 'bar'}
+
+
+@pytest.mark.django_db
+def test_state_is_captured_when_saved():
+    tm = ModelTest(characters='foo')
+    tm.save()
+
+    assert tm._original_state == {'id': tm.pk, 'boolean': True, 'characters': 'foo'}
+    assert tm.get_dirty_fields() == {}
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+
+@pytest.mark.django_db
+def test_whole_state_is_captured_by_first_save_with_update_fields():
+    ModelTest.objects.create(pk=1)
+    tm = ModelTest(characters='foo')
+    tm.pk = 1
+    tm.save(update_fields=['characters'])
+
+    assert tm._original_state == {'id': 1, 'boolean': True, 'characters': 'foo'}
+    assert tm.get_dirty_fields() == {}
+
+
+@pytest.mark.django_db
+def test_state_is_captured_on_first_use_without_post_save():
+    # `QuerySet.bulk_create()` does not send `post_save`.
+    tm, = ModelTest.objects.bulk_create([ModelTest(characters='foo')])
+
+    assert not tm._state.adding
+    assert tm.get_dirty_fields() == {}
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+
 @pytest.mark.django_db
 def test_refresh_from_db():
     tm = ModelTest.objects.create()
@@ -437,3 +494,22 @@ def test_proxy_model_behavior():
     tm.refresh_from_db()
     assert tm.boolean is False
     assert tm.characters == "hello"
+
+
+def test_post_save_sweeper_is_not_connected_per_class():
+    receivers_count = len(post_save.receivers)
+    ModelTest()
+    ModelTest()
+    # Like the historical models rendered by migrations, which still inherit from `DirtyFieldsMixin`.
+    type('HistoricalModel', (dirtyfields.DirtyFieldsMixin, models.Model), {
+        '__module__': __name__,
+        'Meta': type('Meta', (), {'app_label': 'tests', 'apps': Apps(['tests'])}),
+    })
+    assert len(post_save.receivers) == receivers_count
+
+
+@pytest.mark.django_db
+def test_post_save_sweeper_ignores_other_models():
+    tm = OrdinaryModelTest.objects.create()
+    tm.save()
+    assert '_original_state' not in tm.__dict__
@@ -0,0 +1,74 @@
+import pytest
+
+from dirtyfields.digest import ValueDigest, make_digest_copier, serialise_value
+from .models import DigestModelTest, DigestWithMinSizeModelTest
+
+
+def test_serialise_value():
+    assert serialise_value('é') == 'é'.encode('utf-8')
+    assert serialise_value(memoryview(b'abc')) == b'abc'
+    assert serialise_value(None) is None
+    # The order of the keys does not matter.
+    assert serialise_value({'b': 1, 'a': [1, 2]}) == serialise_value({'a': [1, 2], 'b': 1})
+    assert serialise_value(object()) is None
+
+
+def test_digest_copier():
+    copier = make_digest_copier(DigestModelTest._meta.get_field('text'), str, min_size=4)
+    digest = copier('abcd')
+    assert isinstance(digest, ValueDigest)
+    assert digest.length == 4
+    assert digest == copier('abcd')
+    assert digest != copier('abce')
+    # Small values are copied.
+    assert copier('abc') == 'abc'
+    assert repr(digest).startswith('<ValueDigest ')
+
+
+@pytest.mark.django_db
+def test_digest_fields_are_not_copied():
+    payload = {'items': list(range(100))}
+    tm = DigestModelTest.objects.create(characters='foo', text='x' * 1000, payload=payload, binary=b'y' * 1000)
+
+    for state in (tm._original_state, DigestModelTest.objects.get()._original_state):
+        assert state['characters'] == 'foo'
+        assert isinstance(state['text'], ValueDigest)
+        assert isinstance(state['payload'], ValueDigest)
+        assert isinstance(state['binary'], ValueDigest)
+        assert state['text'].length == 1000
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize('enable_codegen', [False, True])
+def test_dirty_digest_fields(monkeypatch, enable_codegen):
+    monkeypatch.setattr(DigestModelTest, 'ENABLE_CODEGEN', enable_codegen)
+    tm = DigestModelTest.objects.create(text='text', payload={'a': [1]})
+    saved_text = tm._original_state['text']
+
+    tm.payload['a'].append(2)
+    tm.text = 'other'
+    dirty_fields = tm.get_dirty_fields()
+    assert set(dirty_fields) == {'text', 'payload'}
+    assert dirty_fields['text'] == saved_text
+    verbose = tm.get_dirty_fields(verbose=True)
+    assert verbose['text'] == {'saved': saved_text, 'current': 'other'}
+    assert verbose['payload']['current'] == {'a': [1, 2]}
+
+    tm.save()
+    assert not tm.is_dirty()
+
+    # Same value again.
+    tm.payload = {'a': [1, 2]}
+    tm.text = 'other'
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_digest_min_size():
+    tm = DigestWithMinSizeModelTest.objects.create(text='short', payload={'long': 'x' * 100})
+    assert tm._original_state['text'] == 'short'
+    assert isinstance(tm._original_state['payload'], ValueDigest)
+
+    tm.text = 'x' * 100
+    assert tm.get_dirty_fields() == {'text': 'short'}
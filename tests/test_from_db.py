@@ -0,0 +1,114 @@
+from decimal import Decimal
+
+import pytest
+from django.core.files.base import ContentFile
+from django.db import models
+from django.db.models.signals import post_init
+
+from .models import (
+    DatetimeModelTest,
+    FileFieldModel,
+    ModelTest,
+    ModelWithDecimalFieldTest,
+    ModelWithForeignKeyTest,
+    ModelWithJSONBFieldTest,
+)
+
+
+@pytest.fixture
+def count_to_python(monkeypatch):
+    calls = []
+    to_python = models.DecimalField.to_python
+
+    def counting_to_python(self, value):
+        calls.append(value)
+        return to_python(self, value)
+
+    monkeypatch.setattr(models.DecimalField, 'to_python', counting_to_python)
+    return calls
+
+
+@pytest.mark.django_db
+def test_from_db_does_not_convert_values(count_to_python):
+    ModelWithDecimalFieldTest.objects.create(decimal_field=Decimal('1.50'))
+    del count_to_python[:]
+
+    tm = ModelWithDecimalFieldTest.objects.get()
+    assert count_to_python == []
+    assert tm._original_state == {'id': tm.id, 'decimal_field': Decimal('1.50')}
+
+    tm.decimal_field = '1.5'
+    assert tm.get_dirty_fields() == {}
+    tm.decimal_field = Decimal('2')
+    assert tm.get_dirty_fields() == {'decimal_field': Decimal('1.50')}
+
+
+@pytest.mark.django_db
+def test_from_db_state_matches_init_state():
+    tm1 = ModelTest.objects.create(characters='foo')
+    fk = ModelWithForeignKeyTest.objects.create(fkey=tm1)
+    dt = DatetimeModelTest.objects.create()
+
+    for instance in (tm1, fk, dt):
+        loaded = instance.__class__.objects.get(pk=instance.pk)
+        assert loaded._original_state == instance.__class__(
+            **{f.attname: getattr(loaded, f.attname) for f in loaded._meta.concrete_fields}
+        )._as_dict(check_relationship=True)
+        assert loaded.get_dirty_fields(check_relationship=True) == {}
+
+
+@pytest.mark.django_db
+def test_from_db_deferred_fields():
+    ModelTest.objects.create(characters='foo')
+
+    tm = ModelTest.objects.only('boolean').get()
+    assert tm._original_state == {'id': tm.id, 'boolean': True}
+
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {}
+
+    tm = ModelTest.objects.defer('boolean').get()
+    assert tm._original_state == {'id': tm.id, 'characters': 'foo'}
+
+
+@pytest.mark.django_db
+def test_from_db_copies_mutable_values():
+    ModelWithJSONBFieldTest.objects.create(jsonb_field={'data': [1, 2, 3]})
+
+    tm = ModelWithJSONBFieldTest.objects.get()
+    tm.jsonb_field['data'].append(4)
+    assert tm.get_dirty_fields() == {'jsonb_field': {'data': [1, 2, 3]}}
+
+
+@pytest.mark.django_db
+def test_from_db_file_field():
+    tm = FileFieldModel()
+    tm.file1.save('test-from-db.txt', ContentFile(b'content'), save=True)
+
+    tm = FileFieldModel.objects.get(pk=tm.pk)
+    assert tm._original_state['file1'] == tm.file1.name
+    assert tm.get_dirty_fields() == {}
+
+
+@pytest.mark.django_db
+def test_init_after_from_db_captures_state():
+    ModelTest.objects.create()
+    ModelTest.objects.get()
+    tm = ModelTest(characters='foo')
+    assert tm._original_state == {'id': None, 'boolean': True, 'characters': 'foo'}
+
+
+@pytest.mark.django_db
+def test_from_db_with_post_init_receiver_changing_a_field():
+    def normalise_characters(sender, instance, **kwargs):
+        instance.characters = instance.characters.strip()
+
+    ModelTest.objects.create(characters=' abc ')
+    post_init.connect(normalise_characters, sender=ModelTest)
+    try:
+        tm = ModelTest.objects.get()
+    finally:
+        post_init.disconnect(normalise_characters, sender=ModelTest)
+
+    assert tm.characters == 'abc'
+    assert tm.get_dirty_fields() == {}
@@ -0,0 +1,182 @@
+import pytest
+from django.db.models import F
+
+import dirtyfields
+from dirtyfields import instrumentation
+from dirtyfields.copying import copy_value
+from .models import (CodegenModelTest, Many2ManyWithFieldsModelTest, ModelTest, ModelWithDirtyFieldsManagerTest,
+                     ModelWithJSONPayloadTest)
+
+
+@pytest.fixture
+def instrumented():
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+@pytest.mark.django_db
+def test_instrumentation_is_disabled_by_default():
+    instrumentation.reset()
+    tm = ModelTest.objects.create()
+    tm = ModelTest.objects.get(pk=tm.pk)
+    tm.characters = 'foo'
+    tm.get_dirty_fields()
+
+    assert dirtyfields.stats() == {}
+
+
+@pytest.mark.django_db
+def test_load_counts_snapshot_and_copied_fields(instrumented):
+    ModelTest.objects.create()
+    instrumentation.reset()
+
+    ModelTest.objects.get()
+
+    model_stats = dirtyfields.stats()['tests.ModelTest']
+    assert model_stats['snapshots'] == 1
+    # `id`, `boolean` and `characters`, read from the database without conversion.
+    assert model_stats['fields_copied'] == 3
+    assert model_stats['to_python_calls'] == 0
+    assert model_stats['compare_calls'] == 0
+    assert model_stats['reset_state_time'] == 0
+
+
+@pytest.mark.django_db
+def test_get_dirty_fields_counts_compares_and_times(instrumented):
+    tm = ModelTest.objects.create()
+    instrumentation.reset()
+
+    tm.characters = 'foo'
+    assert tm.get_dirty_fields() == {'characters': ''}
+
+    model_stats = dirtyfields.stats()['tests.ModelTest']
+    assert model_stats['snapshots'] == 0
+    assert model_stats['compare_calls'] == 3
+    assert model_stats['fields_copied'] == 3
+    assert model_stats['to_python_calls'] == 3
+    assert model_stats['as_dict_time'] > 0
+    assert model_stats['compare_states_time'] > 0
+
+
+@pytest.mark.django_db
+def test_save_counts_reset_state(instrumented):
+    tm = ModelTest.objects.create()
+
+    model_stats = dirtyfields.stats()['tests.ModelTest']
+    assert model_stats['snapshots'] == 1
+    assert model_stats['fields_copied'] == 3
+    assert model_stats['reset_state_time'] >= model_stats['as_dict_time'] > 0
+
+    tm.characters = 'foo'
+    tm.save_dirty_fields()
+
+    model_stats = dirtyfields.stats()['tests.ModelTest']
+    assert model_stats['snapshots'] == 2
+    # The current state compared by `save_dirty_fields()`, then the saved field.
+    assert model_stats['fields_copied'] == 3 + 3 + 1
+
+
+@pytest.mark.django_db
+def test_expressions_are_not_converted(instrumented):
+    tm = ModelTest.objects.create()
+    instrumentation.reset()
+
+    tm.characters = F('characters')
+    tm.get_dirty_fields()
+
+    model_stats = dirtyfields.stats()['tests.ModelTest']
+    assert model_stats['to_python_calls'] == 2
+    assert model_stats['fields_copied'] == 2
+
+
+@pytest.mark.django_db
+def test_measures_are_not_recorded_for_the_model_once_captured(instrumented):
+    ModelTest.objects.create()
+    ModelTest.objects.get()
+    instrumentation.reset()
+
+    copy_value({'tags': ['a']})
+
+    # Outside of a model.
+    assert list(dirtyfields.stats()) == [None]
+    assert dirtyfields.stats()[None]['deepcopy_fallbacks'] == 1
+
+
+@pytest.mark.django_db
+def test_deepcopy_fallbacks(instrumented):
+    ModelWithJSONPayloadTest.objects.create(payload={'tags': ['a', 'b']})
+    ModelWithJSONPayloadTest.objects.create(payload={'count': 1})
+    instrumentation.reset()
+
+    list(ModelWithJSONPayloadTest.objects.all())
+
+    # Only the dict holding a list is deep copied.
+    assert dirtyfields.stats()['tests.ModelWithJSONPayloadTest']['deepcopy_fallbacks'] == 1
+
+
+@pytest.mark.django_db
+def test_codegen_counts_conversions(instrumented):
+    tm = CodegenModelTest.objects.create()
+    instrumentation.reset()
+
+    tm.json_field = {'a': 1}
+    tm.get_dirty_fields(check_relationship=True)
+
+    model_stats = dirtyfields.stats()['tests.CodegenModelTest']
+    assert model_stats['fields_copied'] == 9
+    # The dict and the file are converted, the other values already have the type returned by `to_python()`.
+    assert model_stats['to_python_calls'] == 2
+    assert model_stats['compare_calls'] == 9
+
+
+@pytest.mark.django_db
+def test_m2m_queries(instrumented):
+    for _ in range(3):
+        Many2ManyWithFieldsModelTest.objects.create()
+    instrumentation.reset()
+
+    list(Many2ManyWithFieldsModelTest.objects.all())
+    assert dirtyfields.stats(reset=True)['tests.Many2ManyWithFieldsModelTest']['m2m_queries'] == 6
+
+    list(Many2ManyWithFieldsModelTest.objects.batch_m2m_state())
+    assert dirtyfields.stats()['tests.Many2ManyWithFieldsModelTest']['m2m_queries'] == 2
+
+
+@pytest.mark.django_db
+def test_untracked_instances_are_not_counted(instrumented):
+    tm = ModelWithDirtyFieldsManagerTest.objects.create()
+    instrumentation.reset()
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.without_dirty_tracking().get()
+    tm.save()
+
+    assert dirtyfields.stats() == {}
+
+
+@pytest.mark.django_db
+def test_stats_reset(instrumented):
+    ModelTest.objects.create()
+
+    assert dirtyfields.stats(reset=True)['tests.ModelTest']['snapshots'] == 1
+    assert dirtyfields.stats() == {}
+
+
+@pytest.mark.django_db
+def test_callback(instrumented):
+    measures = []
+
+    def callback(model, name, value):
+        measures.append((model, name, value))
+
+    instrumentation.add_callback(callback)
+    try:
+        ModelTest.objects.create()
+    finally:
+        instrumentation.remove_callback(callback)
+
+    assert (ModelTest, 'snapshots', 1) in measures
+    assert (ModelTest, 'fields_copied', 3) in measures
+    assert any(model is ModelTest and name == 'reset_state_time' for model, name, value in measures)
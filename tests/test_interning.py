@@ -0,0 +1,90 @@
+from decimal import Decimal
+
+import pytest
+
+from dirtyfields.copying import copy_value
+from dirtyfields.interning import InternTable, get_intern_table, make_interning_copier
+from .models import InterningModelTest, NotInterningModelTest, SmallInternTableModelTest
+
+
+@pytest.mark.django_db
+def test_equal_values_loaded_from_the_database_share_one_object():
+    InterningModelTest.objects.bulk_create([
+        InterningModelTest(status='pending', amount=1000, description='text') for _ in range(3)
+    ])
+
+    first, second, third = InterningModelTest.objects.all()
+
+    assert first.status is second.status is third.status
+    assert first._original_state['status'] is first.status
+    assert first.amount is second.amount
+    # Fields that are not listed are not interned.
+    assert first.description is not second.description
+
+
+@pytest.mark.django_db
+def test_values_are_not_interned_by_default():
+    NotInterningModelTest.objects.bulk_create([NotInterningModelTest(status='pending') for _ in range(2)])
+
+    first, second = NotInterningModelTest.objects.all()
+
+    assert first.status is not second.status
+
+
+@pytest.mark.django_db
+def test_interned_fields_are_still_tracked():
+    InterningModelTest.objects.create(status='pending')
+    tm = InterningModelTest.objects.get()
+
+    tm.status = 'done'
+    assert tm.get_dirty_fields() == {'status': 'pending'}
+    tm.save()
+    assert tm.get_dirty_fields() == {}
+
+    tm.status = ''.join(['pen', 'ding'])
+    assert tm.get_dirty_fields() == {'status': 'done'}
+
+
+@pytest.mark.django_db
+def test_intern_table_is_bounded():
+    SmallInternTableModelTest.objects.bulk_create([
+        SmallInternTableModelTest(status=str(i), country='GB', amount=1000 + i) for i in range(10)
+    ])
+
+    list(SmallInternTableModelTest.objects.all())
+
+    table = get_intern_table(SmallInternTableModelTest)
+    assert table is not get_intern_table(InterningModelTest)
+    assert len(table) == 2
+
+
+def test_intern_table_evicts_the_oldest_values():
+    table = InternTable(max_size=2)
+    a, b, c = (''.join([letter, '!']) for letter in 'abc')
+
+    assert table.intern(a) is a
+    assert table.intern(''.join(['a', '!'])) is a
+    table.intern(b)
+    table.intern(c)
+
+    assert len(table) == 2
+    assert table.intern(''.join(['c', '!'])) is c
+    assert table.intern(''.join(['a', '!'])) is not a
+
+
+def test_intern_table_keeps_types_apart():
+    table = InternTable(max_size=10)
+
+    table.intern(1)
+
+    assert table.intern(True) is True
+    assert len(table) == 2
+
+
+def test_interning_copier_only_interns_values_of_internable_types():
+    copier = make_interning_copier(copy_value, InternTable(max_size=10))
+    value = Decimal('1.0')
+
+    copier(value)
+
+    assert copier(Decimal('1.00')).as_tuple() == Decimal('1.00').as_tuple()
@@ -0,0 +1,196 @@
+import pytest
+from django.core.files.base import ContentFile
+from django.db.models import F
+
+from .models import LazyStateGetattrModelTest, LazyStateModelTest, LazyStateWriteTrackingModelTest, ModelTest
+
+
+@pytest.mark.django_db
+def test_untouched_instance_has_no_original_state():
+    LazyStateModelTest.objects.create(characters='foo')
+
+    tm = LazyStateModelTest.objects.get()
+    assert '_original_state' not in tm.__dict__
+    # Only files and mutable values are captured straight away.
+    assert tm._dirtyfields_lazy == {'json_field': {}, 'file1': ''}
+
+
+@pytest.mark.django_db
+def test_original_value_is_captured_on_first_assignment():
+    LazyStateModelTest.objects.create(characters='foo')
+
+    tm = LazyStateModelTest.objects.get()
+    tm.characters = 'bar'
+    tm.characters = 'baz'
+    assert tm._dirtyfields_lazy['characters'] == 'foo'
+    assert '_original_state' not in tm.__dict__
+
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+    assert tm.get_dirty_fields(verbose=True) == {'characters': {'saved': 'foo', 'current': 'baz'}}
+    assert '_dirtyfields_lazy' not in tm.__dict__
+    assert tm._original_state == {
+        'id': tm.id, 'boolean': True, 'characters': 'foo', 'fkey': None, 'json_field': {}, 'file1': '',
+    }
+
+    tm.characters = 'foo'
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_original_state_attribute_captures_state():
+    tm = LazyStateModelTest.objects.create(characters='foo')
+    tm.boolean = False
+    assert tm._original_state['boolean'] is True
+    assert tm._original_state['characters'] == 'foo'
+
+
+@pytest.mark.django_db
+def test_foreign_key_assignment():
+    tm1 = ModelTest.objects.create()
+    tm2 = ModelTest.objects.create()
+    tm = LazyStateModelTest.objects.create(fkey=tm1)
+
+    tm.fkey = tm2
+    assert tm.get_dirty_fields() == {}
+    assert tm.get_dirty_fields(check_relationship=True) == {'fkey': tm1.pk}
+
+
+@pytest.mark.django_db
+def test_in_place_mutation_is_detected():
+    LazyStateModelTest.objects.create(json_field={'data': [1, 2, 3]})
+
+    tm = LazyStateModelTest.objects.get()
+    tm.json_field['data'].append(4)
+    assert tm.get_dirty_fields() == {'json_field': {'data': [1, 2, 3]}}
+
+
+@pytest.mark.django_db
+def test_file_change_is_detected():
+    tm = LazyStateModelTest.objects.create()
+    tm.file1.save('test-lazy.txt', ContentFile(b'content'), save=False)
+    assert tm.get_dirty_fields() == {'file1': ''}
+
+
+@pytest.mark.django_db
+def test_save_resets_state():
+    tm = LazyStateModelTest.objects.create()
+    tm.characters = 'foo'
+    assert tm.is_dirty()
+
+    tm.save()
+    assert '_original_state' not in tm.__dict__
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_save_update_fields():
+    tm = LazyStateModelTest.objects.create()
+    tm.characters = 'foo'
+    tm.boolean = False
+    tm.json_field['data'] = 1
+
+    tm.save(update_fields=['characters', 'json_field'])
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+    tm.json_field['data'] = 2
+    assert tm.get_dirty_fields() == {'boolean': True, 'json_field': {'data': 1}}
+
+
+@pytest.mark.django_db
+def test_save_update_fields_after_state_is_captured():
+    tm = LazyStateModelTest.objects.create()
+    tm.characters = 'foo'
+    tm.boolean = False
+    assert tm.get_dirty_fields() == {'boolean': True, 'characters': ''}
+
+    tm.save(update_fields=['characters'])
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+
+@pytest.mark.django_db
+def test_save_expression():
+    tm = LazyStateModelTest.objects.create(characters='foo')
+    tm.characters = F('characters')
+    tm.save(update_fields=['characters'])
+    assert tm.get_dirty_fields() == {}
+
+
+@pytest.mark.django_db
+def test_refresh_from_db():
+    tm = LazyStateModelTest.objects.create(characters='foo')
+    tm.characters = 'bar'
+    tm.boolean = False
+
+    tm.refresh_from_db(fields=['characters'])
+    assert tm.characters == 'foo'
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+    tm.refresh_from_db()
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_deferred_fields():
+    LazyStateModelTest.objects.create(characters='foo')
+
+    tm = LazyStateModelTest.objects.only('boolean').get()
+    tm.characters = 'bar'
+    tm.boolean = False
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+    tm = LazyStateModelTest.objects.only('boolean').get()
+    assert tm.characters == 'foo'
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+
+def test_adding_instance():
+    tm = LazyStateModelTest(characters='foo')
+    assert tm.get_dirty_fields() == {
+        'boolean': True, 'characters': 'foo', 'json_field': {}, 'file1': '',
+    }
+
+
+@pytest.mark.django_db
+def test_with_write_tracking():
+    LazyStateWriteTrackingModelTest.objects.create()
+
+    tm = LazyStateWriteTrackingModelTest.objects.get()
+    tm.characters = 'foo'
+    assert tm._dirtyfields_written == {'characters'}
+    assert tm._dirtyfields_lazy == {'characters': ''}
+
+    assert tm.get_dirty_fields() == {'characters': ''}
+    assert tm._dirtyfields_written == {'characters'}
+
+    tm.save()
+    assert tm._dirtyfields_written == set()
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_track_fields():
+    LazyStateModelTest.objects.create(characters='foo')
+
+    tm = LazyStateModelTest.objects.get()
+    tm.boolean = False
+    tm.track_fields('characters', 'boolean')
+    assert tm._dirtyfields_lazy == {'boolean': True}
+
+    tm.characters = 'bar'
+    tm.json_field['data'] = 1
+    assert tm.get_dirty_fields() == {'boolean': True, 'characters': 'foo'}
+    assert tm._original_state == {'boolean': True, 'characters': 'foo'}
+
+
+@pytest.mark.django_db
+def test_getattr_of_the_model_is_kept():
+    tm = LazyStateGetattrModelTest.objects.create(characters='foo')
+    tm = LazyStateGetattrModelTest.objects.get()
+    assert tm.upper_characters == 'FOO'
+    with pytest.raises(AttributeError):
+        tm.unknown
+
+    tm.characters = 'bar'
+    assert tm._original_state['characters'] == 'foo'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
@@ -1,7 +1,10 @@
 import pytest
+from django.db.models import Prefetch
+from django.db.models.signals import m2m_changed
 
 from .models import ModelTest, Many2ManyModelTest, ModelWithCustomPKTest, M2MModelWithCustomPKOnM2MTest, \
-    ModelWithoutM2MCheckTest, Many2ManyWithoutMany2ManyModeEnabledModelTest
+    ModelWithoutM2MCheckTest, Many2ManyWithoutMany2ManyModeEnabledModelTest, Many2ManyWithFieldsModelTest
+from .utils import assert_number_queries
 
 
 @pytest.mark.django_db
@@ -51,3 +54,172 @@ def test_m2m_disabled_does_not_allow_to_check_m2m_fields():
 
     with pytest.raises(Exception):
         assert tm.get_dirty_fields(check_m2m={'dummy': True})
+
+
+def test_m2m_sweeper_is_not_connected_per_instance():
+    receivers_count = len(m2m_changed.receivers)
+    Many2ManyModelTest()
+    Many2ManyModelTest()
+    assert len(m2m_changed.receivers) == receivers_count
+
+
+@pytest.mark.django_db
+def test_m2m_state_is_reset_when_relation_changes():
+    tm = Many2ManyModelTest.objects.create()
+    tm2 = ModelTest.objects.create()
+    assert tm._original_m2m_state == {'m2m_field': set()}
+
+    tm.m2m_field.add(tm2)
+    assert tm._original_m2m_state == {'m2m_field': {tm2.id}}
+
+
+@pytest.mark.django_db
+def test_m2m_state_is_updated_without_querying():
+    tm = Many2ManyWithFieldsModelTest.objects.create()
+    related = [ModelTest.objects.create() for _ in range(3)]
+    tm.m2m2.add(related[0])
+
+    # Only the queries changing the relation are run, not the ones reading every relation again.
+    with assert_number_queries(2):
+        tm.m2m1.add(related[0], related[1])
+    assert tm._original_m2m_state == {'m2m1': {related[0].id, related[1].id}, 'm2m2': {related[0].id}}
+
+    with assert_number_queries(1):
+        tm.m2m1.remove(related[0], related[2])
+    assert tm._original_m2m_state == {'m2m1': {related[1].id}, 'm2m2': {related[0].id}}
+
+    tm.m2m1.set([related[0], related[2]])
+    assert tm._original_m2m_state == {'m2m1': {related[0].id, related[2].id}, 'm2m2': {related[0].id}}
+
+    with assert_number_queries(1):
+        tm.m2m1.clear()
+    assert tm._original_m2m_state == {'m2m1': set(), 'm2m2': {related[0].id}}
+    assert tm._original_m2m_state == tm._as_dict_m2m()
+
+
+@pytest.mark.django_db
+def test_m2m_change_does_not_reset_other_fields():
+    tm = Many2ManyWithFieldsModelTest.objects.create(characters='old')
+    tm.characters = 'new'
+
+    tm.m2m1.add(ModelTest.objects.create())
+    assert tm.get_dirty_fields() == {'characters': 'old'}
+
+
+@pytest.mark.django_db
+def test_m2m_state_on_reverse_side_is_not_changed():
+    tm = Many2ManyModelTest.objects.create()
+    related = ModelTest.objects.create()
+
+    related.many2manymodeltest_set.add(tm)
+    assert tm._original_m2m_state == {'m2m_field': set()}
+    assert Many2ManyModelTest.objects.get()._original_m2m_state == {'m2m_field': {related.id}}
+
+
+@pytest.mark.django_db
+def test_m2m_state_uses_pk_only_query():
+    tm = Many2ManyModelTest.objects.create()
+    related = ModelTest.objects.create()
+    tm.m2m_field.add(related)
+
+    with assert_number_queries(1):
+        assert tm._as_dict_m2m() == {'m2m_field': {related.id}}
+
+
+@pytest.mark.django_db
+def test_m2m_state_uses_prefetched_objects():
+    tm = Many2ManyModelTest.objects.create()
+    related = ModelTest.objects.create()
+    tm.m2m_field.add(related)
+
+    tm = Many2ManyModelTest.objects.prefetch_related('m2m_field').get()
+    with assert_number_queries(0):
+        assert tm._as_dict_m2m() == {'m2m_field': {related.id}}
+    # Only the UPDATE query.
+    with assert_number_queries(1):
+        tm.save()
+    assert tm._original_m2m_state == {'m2m_field': {related.id}}
+
+
+@pytest.mark.django_db
+def test_m2m_state_ignores_filtered_prefetch():
+    tm = Many2ManyModelTest.objects.create()
+    related = [ModelTest.objects.create(characters=str(i)) for i in range(2)]
+    tm.m2m_field.add(*related)
+
+    tm = Many2ManyModelTest.objects.prefetch_related(
+        Prefetch('m2m_field', queryset=ModelTest.objects.filter(characters='0'))).get()
+    with assert_number_queries(1):
+        assert tm._as_dict_m2m() == {'m2m_field': {related[0].pk, related[1].pk}}
+
+
+@pytest.mark.django_db
+def test_m2m_state_of_loaded_instances_uses_prefetched_objects():
+    _create_m2m_instances(10)
+    expected = {tm.pk: tm._as_dict_m2m() for tm in Many2ManyWithFieldsModelTest.objects.all()}
+
+    # One query for the instances, and one per prefetched m2m relation.
+    with assert_number_queries(3):
+        instances = list(Many2ManyWithFieldsModelTest.objects.prefetch_related('m2m1', 'm2m2'))
+    assert {tm.pk: tm._original_m2m_state for tm in instances} == expected
+
+    # Per chunk with `iterator()`.
+    with assert_number_queries(1 + 3 * 2):
+        instances = list(Many2ManyWithFieldsModelTest.objects.prefetch_related('m2m1', 'm2m2').iterator(4))
+    assert {tm.pk: tm._original_m2m_state for tm in instances} == expected
+
+
+@pytest.mark.django_db
+def test_m2m_state_of_loaded_instances_with_filtered_prefetch():
+    _create_m2m_instances(3)
+    expected = {tm.pk: tm._as_dict_m2m() for tm in Many2ManyWithFieldsModelTest.objects.all()}
+
+    # The filtered relation is queried for every instance.
+    with assert_number_queries(3 + 3):
+        instances = list(Many2ManyWithFieldsModelTest.objects.prefetch_related(
+            'm2m1', Prefetch('m2m2', queryset=ModelTest.objects.filter(pk=0))))
+    assert {tm.pk: tm._original_m2m_state for tm in instances} == expected
+
+
+def _create_m2m_instances(count):
+    related = [ModelTest.objects.create() for _ in range(3)]
+    for i in range(count):
+        tm = Many2ManyWithFieldsModelTest.objects.create(characters=str(i))
+        tm.m2m1.add(*related[:i % 3])
+        tm.m2m2.add(related[i % 3])
+    return related
+
+
+@pytest.mark.django_db
+def test_batch_m2m_state():
+    _create_m2m_instances(10)
+    expected = {tm.pk: tm._as_dict_m2m() for tm in Many2ManyWithFieldsModelTest.objects.all()}
+
+    # One query for the instances, and one per m2m relation.
+    with assert_number_queries(3):
+        instances = list(Many2ManyWithFieldsModelTest.objects.batch_m2m_state().order_by('pk'))
+
+    assert len(instances) == 10
+    for tm in instances:
+        assert tm._original_m2m_state == expected[tm.pk]
+        assert tm.get_dirty_fields(check_m2m=expected[tm.pk]) == {}
+
+
+@pytest.mark.django_db
+def test_batch_m2m_state_with_iterator():
+    _create_m2m_instances(5)
+    expected = {tm.pk: tm._as_dict_m2m() for tm in Many2ManyWithFieldsModelTest.objects.all()}
+
+    instances = list(Many2ManyWithFieldsModelTest.objects.batch_m2m_state().iterator(chunk_size=2))
+    assert {tm.pk: tm._original_m2m_state for tm in instances} == expected
+
+
+@pytest.mark.django_db
+def test_batch_m2m_state_with_other_options():
+    _create_m2m_instances(3)
+
+    instances = list(Many2ManyWithFieldsModelTest.objects.batch_m2m_state().track_fields('characters', 'm2m1'))
+    assert all(set(tm._original_m2m_state) == {'m2m1'} for tm in instances)
+
+    instances = list(Many2ManyWithFieldsModelTest.objects.batch_m2m_state().without_dirty_tracking())
+    assert all('_original_m2m_state' not in tm.__dict__ for tm in instances)
@@ -0,0 +1,139 @@
+import pytest
+
+from .models import ModelTest, ModelWithDirtyFieldsManagerTest, ModelWithSpecifiedFieldsTest
+
+
+@pytest.mark.django_db
+def test_without_dirty_tracking():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.without_dirty_tracking().get()
+    assert tm.characters == 'foo'
+    assert '_original_state' not in tm.__dict__
+
+    with pytest.raises(ValueError, match='loaded without dirty tracking'):
+        tm.get_dirty_fields()
+    with pytest.raises(ValueError, match='loaded without dirty tracking'):
+        tm.is_dirty()
+    with pytest.raises(ValueError, match='loaded without dirty tracking'):
+        tm.save_dirty_fields()
+
+
+@pytest.mark.django_db
+def test_without_dirty_tracking_is_kept_when_chaining():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='bar')
+
+    qs = ModelWithDirtyFieldsManagerTest.objects.without_dirty_tracking().filter(characters='foo').order_by('pk')
+    assert [tm.characters for tm in qs] == ['foo']
+    assert all('_dirtyfields_untracked' in tm.__dict__ for tm in qs)
+    assert all('_dirtyfields_untracked' in tm.__dict__ for tm in qs.iterator())
+
+
+@pytest.mark.django_db
+def test_without_dirty_tracking_can_still_save():
+    tm = ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+
+    untracked = ModelWithDirtyFieldsManagerTest.objects.without_dirty_tracking().get()
+    untracked.characters = 'bar'
+    untracked.save()
+    assert '_original_state' not in untracked.__dict__
+
+    tm.refresh_from_db()
+    assert tm.characters == 'bar'
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_without_dirty_tracking_values():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+    qs = ModelWithDirtyFieldsManagerTest.objects.values('characters')
+    assert list(qs.without_dirty_tracking()) == [{'characters': 'foo'}]
+    assert list(qs.without_dirty_tracking().values_list('characters', flat=True)) == ['foo']
+
+
+@pytest.mark.django_db
+def test_without_dirty_tracking_does_not_affect_other_instances():
+    fk = ModelTest.objects.create()
+    ModelWithDirtyFieldsManagerTest.objects.create(fkey=fk)
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.without_dirty_tracking().select_related('fkey').get()
+    assert '_dirtyfields_untracked' in tm.__dict__
+    assert not tm.fkey.is_dirty()
+
+    tracked = ModelWithDirtyFieldsManagerTest.objects.get()
+    assert not tracked.is_dirty()
+
+
+@pytest.mark.django_db
+def test_default_queryset_tracks():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+    tm = ModelWithDirtyFieldsManagerTest.objects.get()
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+
+@pytest.mark.django_db
+def test_queryset_track_fields():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.track_fields('characters').get()
+    assert tm._original_state == {'characters': 'foo'}
+
+    tm.boolean = False
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+    tm.save()
+    assert tm._original_state == {'characters': 'bar'}
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_queryset_track_fields_with_attname():
+    fk = ModelTest.objects.create()
+    ModelWithDirtyFieldsManagerTest.objects.create(fkey=fk)
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.track_fields('fkey_id').get()
+    assert tm._original_state == {'fkey': fk.pk}
+    tm.fkey = None
+    assert tm.get_dirty_fields(check_relationship=True) == {'fkey': fk.pk}
+
+
+def test_queryset_track_fields_unknown_field():
+    with pytest.raises(ValueError, match="'unknown' is not a field tracked"):
+        ModelWithDirtyFieldsManagerTest.objects.track_fields('unknown')
+
+
+@pytest.mark.django_db
+def test_queryset_track_fields_save_update_fields():
+    ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+
+    tm = ModelWithDirtyFieldsManagerTest.objects.track_fields('characters').get()
+    tm.boolean = False
+    tm.characters = 'bar'
+    tm.save(update_fields=['boolean', 'characters'])
+    assert tm._original_state == {'characters': 'bar'}
+
+
+@pytest.mark.django_db
+def test_instance_track_fields():
+    tm = ModelWithDirtyFieldsManagerTest.objects.create(characters='foo')
+    tm.boolean = False
+    tm.characters = 'bar'
+
+    tm.track_fields('characters')
+    assert tm._original_state == {'characters': 'foo'}
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+
+    # Fields tracked again are considered clean.
+    tm.track_fields()
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+    tm.boolean = True
+    assert tm.get_dirty_fields() == {'boolean': False, 'characters': 'foo'}
+
+
+def test_instance_track_fields_narrows_fields_to_check():
+    tm = ModelWithSpecifiedFieldsTest()
+    with pytest.raises(ValueError, match="'boolean2' is not a field tracked"):
+        tm.track_fields('boolean2')
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+import pytest
+
+from dirtyfields.memory import measure_memory
+from .models import (BinaryModelTest, CompactStateModelTest, CopyOnWriteModelTest, DatetimeModelTest,
+                     DictStateModelTest, Many2ManyWithFieldsModelTest, ModelTest, ModelWithDecimalFieldTest,
+                     ModelWithForeignKeyTest, ModelWithJSONBFieldTest, OrdinaryModelTest)
+from .utils import assert_memory_per_instance
+
+pytestmark = pytest.mark.django_db
+
+# The limits leave room for the differences between the supported Python versions, e.g. in the size of dicts.
+
+
+def _loader(model, count, **kwargs):
+    """Create `count + 1` rows and return a function loading one instance at a time."""
+    model.objects.bulk_create([model(**kwargs) for _ in range(count + 1)])
+    return model.objects.iterator().__next__
+
+
+def test_measure_memory_reports_state_and_model():
+    report = measure_memory(_loader(ModelTest, 500, characters='foo'), count=500)
+
+    assert report.model_class is ModelTest
+    assert report.count == 500
+    assert report.total == pytest.approx(report.model + report.state + report.m2m_state)
+    assert report.state > 0
+    assert report.model > report.state
+    assert report.m2m_state == 0
+    assert set(report.fields) == {'id', 'boolean', 'characters'}
+    assert set(report.field_types) == {'AutoField', 'BooleanField', 'CharField'}
+
+
+def test_measure_memory_requires_tracked_instances():
+    with pytest.raises(ValueError):
+        measure_memory(OrdinaryModelTest)
+
+
+def test_unsaved_instances_have_no_state():
+    assert_memory_per_instance(lambda: ModelTest(characters='foo'), state=0)
+
+
+@pytest.mark.parametrize('model, kwargs', [
+    (ModelTest, {'characters': 'foo'}),
+    (ModelWithDecimalFieldTest, {'decimal_field': Decimal('1.50')}),
+    (DatetimeModelTest, {'datetime_field': datetime(2020, 1, 1, tzinfo=timezone.utc)}),
+    (BinaryModelTest, {'bytea': b'\x00' * 64}),
+])
+def test_immutable_values_are_not_copied(model, kwargs):
+    report = measure_memory(_loader(model, 500, **kwargs), count=500)
+
+    assert all(size <= 1 for size in report.fields.values()), report.fields
+
+
+def test_foreign_key_is_not_copied():
+    fkey = ModelTest.objects.create()
+    report = measure_memory(_loader(ModelWithForeignKeyTest, 500, fkey=fkey), count=500)
+
+    assert report.fields['fkey'] <= 1
+
+
+def test_state_memory_thresholds():
+    # A dict of 3 values.
+    assert_memory_per_instance(_loader(ModelTest, 500, characters='foo'), count=500, state=300)
+    # A dict of 11 values, and the copy of a dict holding a list.
+    report = assert_memory_per_instance(
+        _loader(DictStateModelTest, 500, json_field={'a': [1, 2]}), count=500, state=900)
+    assert report.fields['json_field'] <= 350
+
+
+def test_json_copy_memory_threshold():
+    report = assert_memory_per_instance(
+        _loader(ModelWithJSONBFieldTest, 500, jsonb_field={'a': [1, 2], 'b': {'c': 'd'}}), count=500, state=800)
+    # A dict holding a list and a dict.
+    assert report.fields['jsonb_field'] <= 600
+    assert report.field_types['JSONField'] == report.fields['jsonb_field']
+
+
+def test_compact_state_memory_threshold():
+    compact = assert_memory_per_instance(
+        _loader(CompactStateModelTest, 500, json_field={'a': [1, 2]}), count=500, state=550)
+    dict_state = measure_memory(_loader(DictStateModelTest, 500, json_field={'a': [1, 2]}), count=500)
+
+    # A tuple of 11 values instead of a dict of 11 items.
+    assert dict_state.state - compact.state > 150
+
+
+def test_copy_on_write_value_is_shared():
+    report = measure_memory(_loader(CopyOnWriteModelTest, 500, json_field={'a': [1, 2]}), count=500)
+
+    assert report.fields['json_field'] <= 1
+
+
+def test_m2m_state_memory_threshold():
+    related = ModelTest.objects.bulk_create([ModelTest() for _ in range(3)])
+    instances = Many2ManyWithFieldsModelTest.objects.bulk_create([Many2ManyWithFieldsModelTest() for _ in range(101)])
+    for instance in instances:
+        instance.m2m1.set(related)
+
+    # A dict of 2 sets, one of them holding 3 primary keys.
+    report = assert_memory_per_instance(
+        Many2ManyWithFieldsModelTest.objects.iterator().__next__, count=100, m2m_state=1000)
+    assert report.m2m_state > 0
@@ -1,12 +1,17 @@
 import gc
 import resource
+import tracemalloc
 
 import pytest
 
+from .models import InterningModelTest, NotInterningModelTest
 from .models import ModelTest as DirtyMixinModel
 
 pytestmark = pytest.mark.django_db
 
+STATUSES = ['active', 'pending', 'suspended', 'closed']
+COUNTRIES = ['FR', 'GB', 'DE', 'ES', 'IT']
+
 
 def test_rss_usage():
     DirtyMixinModel()
@@ -17,3 +22,56 @@ def test_rss_usage():
     gc.collect()
     rss_2 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
     assert rss_2 == rss_1, 'There is a memory leak!'
+
+
+def _create_rows(model, count):
+    model.objects.bulk_create([
+        model(status=STATUSES[i % 4], country=COUNTRIES[i % 5], amount=1000 + i % 10) for i in range(count)
+    ])
+
+
+def _retained_by_load(model):
+    gc.collect()
+    tracemalloc.start()
+    try:
+        instances = list(model.objects.all())
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del instances
+    return retained
+
+
+def test_large_loads_do_not_leak():
+    _create_rows(InterningModelTest, 5000)
+    _create_rows(NotInterningModelTest, 5000)
+    # The intern table and the caches of the database connection are filled by the first load.
+    list(InterningModelTest.objects.all())
+    # Memory held by a load without interning, that a leak would keep for every load.
+    load_size = _retained_by_load(NotInterningModelTest)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        for _ in range(5):
+            list(InterningModelTest.objects.all())
+        gc.collect()
+        leaked = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    assert leaked < load_size / 10, 'There is a memory leak!'
+
+
+def test_interning_reduces_memory_of_large_loads():
+    _create_rows(InterningModelTest, 5000)
+    _create_rows(NotInterningModelTest, 5000)
+    # Fill the intern table, it is shared by the following loads.
+    list(InterningModelTest.objects.all())
+
+    interned = _retained_by_load(InterningModelTest)
+    not_interned = _retained_by_load(NotInterningModelTest)
+
+    # The status, country and amount of every instance are shared, about 140 bytes per instance.
+    assert not_interned - interned > 5000 * 100
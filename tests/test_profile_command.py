@@ -0,0 +1,89 @@
+from datetime import datetime
+from io import StringIO
+
+import pytest
+from django.core.management import CommandError, call_command
+
+from dirtyfields.management.commands.dirtyfields_profile import synthesise_value
+from .models import (CodegenModelTest, ModelTest, ModelWithCustomPKTest, ModelWithDecimalFieldTest,
+                     ModelWithJSONPayloadTest)
+
+pytestmark = pytest.mark.django_db
+
+
+def _profile(*labels, **options):
+    stdout = StringIO()
+    call_command('dirtyfields_profile', *labels, stdout=stdout, stderr=StringIO(), repeat=1, **options)
+    return stdout.getvalue().splitlines()
+
+
+def _sections(lines):
+    """Return the rows of the model and field tables, split in columns."""
+    blank = lines.index('')
+    return [line.split() for line in lines[2:blank]], [line.split() for line in lines[blank + 3:]]
+
+
+def _row(rows, label):
+    return next(row for row in rows if row[0] == label)
+
+
+def test_profile_rows_from_database():
+    for _ in range(3):
+        ModelTest.objects.create()
+
+    models, fields = _sections(_profile('tests.ModelTest', rows=2))
+
+    assert [row[:3] for row in models] == [['tests.ModelTest', '2', 'db']]
+    assert {row[0] for row in fields} == {
+        'tests.ModelTest.id', 'tests.ModelTest.boolean', 'tests.ModelTest.characters',
+    }
+
+
+def test_profile_synthesised_rows():
+    models, fields = _sections(_profile('tests.ModelWithJSONPayloadTest', rows=5))
+
+    assert _row(models, 'tests.ModelWithJSONPayloadTest')[1:3] == ['5', 'synth']
+    assert _row(fields, 'tests.ModelWithJSONPayloadTest.payload')[1] == 'JSONField'
+    # Nothing is written to the database.
+    assert not ModelWithJSONPayloadTest.objects.exists()
+
+
+def test_profile_app():
+    models, fields = _sections(_profile('tests', rows=2, top_fields=3))
+
+    profiled = {row[0] for row in models}
+    assert 'tests.CodegenModelTest' in profiled
+    assert 'tests.OrdinaryWithDirtyFieldsProxy' in profiled
+    assert 'tests.OrdinaryModelTest' not in profiled
+    # Sorted by cost.
+    totals = [float(row[-1]) for row in models]
+    assert totals == sorted(totals, reverse=True)
+    costs = [float(row[-1]) for row in fields]
+    assert len(costs) == 3
+    assert costs == sorted(costs, reverse=True)
+
+
+def test_profile_invalid_labels():
+    with pytest.raises(CommandError, match='No installed app'):
+        _profile('unknown')
+    with pytest.raises(CommandError, match="doesn't have a"):
+        _profile('tests.UnknownModel')
+    with pytest.raises(CommandError, match='does not use DirtyFieldsMixin'):
+        _profile('tests.OrdinaryModelTest')
+    with pytest.raises(CommandError, match='at least 1'):
+        _profile('tests.ModelTest', rows=0)
+
+
+def test_synthesise_value():
+    fields = CodegenModelTest._meta
+    assert synthesise_value(fields.get_field('id'), 0) == 1
+    assert synthesise_value(fields.get_field('fkey'), 4) == 5
+    assert synthesise_value(fields.get_field('characters'), 2) == 'value 2'
+    value = synthesise_value(fields.get_field('datetime'), 3)
+    assert isinstance(value, datetime) and value.tzinfo is not None
+    assert synthesise_value(fields.get_field('json_field'), 1)['id'] == 1
+
+    decimal_field = ModelWithDecimalFieldTest._meta.get_field('decimal_field')
+    assert synthesise_value(decimal_field, 0).as_tuple().exponent == -decimal_field.decimal_places
+    # A primary key holding strings.
+    assert synthesise_value(ModelWithCustomPKTest._meta.get_field('custom_primary_key'), 0) == 'value 0'
@@ -1,16 +1,20 @@
 import pytest
 
 import django
+from django.db import models
 from django.db.models import F, Value
 from django.db.models.functions import Concat
 
+from dirtyfields.copying import register_copier, unregister_copier
 from .models import (
     ExpressionModelTest,
+    Many2ManyWithFieldsModelTest,
     MixedFieldsModelTest,
     ModelTest,
     ModelWithForeignKeyTest,
+    ModelWithJSONPayloadTest,
 )
-from .utils import assert_number_of_queries_on_regex
+from .utils import assert_number_of_queries_on_regex, assert_number_queries
 
 
 @pytest.mark.django_db
@@ -304,3 +308,54 @@ def test_get_dirty_fields_when_saving_with_f_objects_update_fields_specified_for
     # .get_dirtyfields() works as normal now.
     tm.characters = 'xyz'
     assert tm.get_dirty_fields() == {"characters": "abcdef"}
+
+
+@pytest.fixture
+def copied_payloads():
+    calls = []
+
+    def copier(value):
+        calls.append(value)
+        return dict(value)
+
+    register_copier(models.JSONField, copier)
+    yield calls
+    unregister_copier(models.JSONField)
+
+
+@pytest.mark.django_db
+def test_save_update_fields_only_captures_saved_fields(copied_payloads):
+    tm = ModelWithJSONPayloadTest.objects.create(payload={'big': 'payload'})
+    copied_payloads.clear()
+
+    tm.characters = 'new'
+    tm.payload['big'] = 'changed'
+    tm.save(update_fields=['characters'])
+
+    assert copied_payloads == []
+    assert tm.get_dirty_fields() == {'payload': {'big': 'payload'}}
+
+
+@pytest.mark.django_db
+def test_refresh_from_db_fields_only_captures_refreshed_fields(copied_payloads):
+    tm = ModelWithJSONPayloadTest.objects.create(payload={'big': 'payload'})
+    ModelWithJSONPayloadTest.objects.update(characters='new')
+    copied_payloads.clear()
+
+    tm.payload['big'] = 'changed'
+    tm.refresh_from_db(fields=['characters'])
+
+    assert copied_payloads == []
+    assert tm.characters == 'new'
+    assert tm.get_dirty_fields() == {'payload': {'big': 'payload'}}
+
+
+@pytest.mark.django_db
+def test_save_update_fields_does_not_query_m2m_relations():
+    tm = Many2ManyWithFieldsModelTest.objects.create()
+    tm.characters = 'new'
+
+    # Only the UPDATE query.
+    with assert_number_queries(1):
+        tm.save(update_fields=['characters'])
+    assert tm.get_dirty_fields() == {}
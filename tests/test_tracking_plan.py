@@ -0,0 +1,60 @@
+import pytest
+from django.test import override_settings
+
+from dirtyfields.plan import get_tracking_plan
+from .models import (
+    ModelTest,
+    ModelWithForeignKeyTest,
+    ModelWithM2MAndSpecifiedFieldsTest,
+    ModelWithSpecifiedFieldsAndForeignKeyTest2,
+    SubclassModelTest,
+)
+
+
+def test_plan_is_built_when_class_is_prepared():
+    assert ModelTest.__dict__['_dirtyfields_plan'].model is ModelTest
+
+
+def test_plan_is_cached_per_class():
+    plan = get_tracking_plan(ModelTest)
+    assert get_tracking_plan(ModelTest) is plan
+    assert get_tracking_plan(SubclassModelTest) is not plan
+    assert get_tracking_plan(SubclassModelTest).model is SubclassModelTest
+
+
+def test_plan_fields():
+    plan = get_tracking_plan(ModelWithForeignKeyTest)
+    assert plan.attnames == ('id', 'fkey_id')
+    assert [name for _, name, _, _ in plan.get_fields(check_relationship=True)] == ['id', 'fkey']
+    assert [name for _, name, _, _ in plan.get_fields(check_relationship=False)] == ['id']
+    assert [name for _, name, _, _ in plan.get_fields(check_relationship=True, include_primary_key=False)] == ['fkey']
+
+
+def test_plan_fields_to_check_accepts_name_and_attname():
+    plan = get_tracking_plan(ModelWithSpecifiedFieldsAndForeignKeyTest2)
+    assert plan.is_tracked('fk_field')
+    assert plan.is_tracked('fk_field_id')
+    assert not plan.is_tracked('boolean1')
+    assert plan.attnames == ('fk_field_id',)
+
+
+def test_plan_m2m_fields():
+    plan = get_tracking_plan(ModelWithM2MAndSpecifiedFieldsTest)
+    assert [field.name for field, _ in plan.m2m_fields] == ['m2m1', 'm2m2']
+    assert [field.name for field in plan.tracked_m2m_fields] == ['m2m1']
+
+
+def test_plan_is_cleared_when_app_registry_reloads():
+    plan = get_tracking_plan(ModelTest)
+    with override_settings(INSTALLED_APPS=['tests']):
+        assert get_tracking_plan(ModelTest) is not plan
+
+
+@pytest.mark.django_db
+def test_save_update_fields_with_fields_to_check_attname():
+    tm = ModelWithSpecifiedFieldsAndForeignKeyTest2.objects.create()
+    tm.fk_field = ModelTest.objects.create()
+    assert tm.get_dirty_fields(check_relationship=True) == {'fk_field': None}
+
+    tm.save(update_fields=['fk_field'])
+    assert tm.get_dirty_fields(check_relationship=True) == {}
@@ -0,0 +1,126 @@
+import pytest
+from django.db.models import F
+
+from .models import ModelTest, WriteTrackingModelTest
+
+
+@pytest.fixture
+def captured_fields(monkeypatch):
+    """Names of the fields whose current state is captured by `get_dirty_fields()`."""
+    captured = []
+    capture_fields = WriteTrackingModelTest._capture_fields
+
+    def recording_capture_fields(self, fields, deferred_fields=None):
+        captured.append(sorted(name for _, name, _, _ in fields))
+        return capture_fields(self, fields, deferred_fields)
+
+    monkeypatch.setattr(WriteTrackingModelTest, '_capture_fields', recording_capture_fields)
+    return captured
+
+
+@pytest.mark.django_db
+def test_untouched_instance_only_checks_mutable_fields(captured_fields):
+    tm = WriteTrackingModelTest.objects.create()
+    assert tm._dirtyfields_written == set()
+
+    del captured_fields[:]
+    assert not tm.is_dirty()
+    assert captured_fields == [['file1', 'json_field']]
+
+
+@pytest.mark.django_db
+def test_assigned_fields_are_checked(captured_fields):
+    tm = WriteTrackingModelTest.objects.create(characters='foo')
+    tm.characters = 'bar'
+    tm.boolean = True
+    assert tm._dirtyfields_written == {'characters', 'boolean'}
+
+    del captured_fields[:]
+    assert tm.get_dirty_fields() == {'characters': 'foo'}
+    assert captured_fields == [['boolean', 'characters', 'file1', 'json_field']]
+
+
+@pytest.mark.django_db
+def test_in_place_mutation_is_detected():
+    tm = WriteTrackingModelTest.objects.create(json_field={'data': [1, 2, 3]})
+    tm = WriteTrackingModelTest.objects.get(pk=tm.pk)
+    tm.json_field['data'].append(4)
+    assert tm._dirtyfields_written == set()
+    assert tm.get_dirty_fields() == {'json_field': {'data': [1, 2, 3]}}
+
+
+@pytest.mark.django_db
+def test_foreign_key_assignment_is_tracked():
+    tm1 = ModelTest.objects.create()
+    tm2 = ModelTest.objects.create()
+    tm = WriteTrackingModelTest.objects.create(fkey=tm1)
+
+    tm.fkey = tm2
+    assert tm._dirtyfields_written == {'fkey_id'}
+    assert tm.get_dirty_fields() == {}
+    assert tm.get_dirty_fields(check_relationship=True) == {'fkey': tm1.pk}
+
+
+@pytest.mark.django_db
+def test_file_name_change_is_detected():
+    tm = WriteTrackingModelTest.objects.create()
+    tm.file1.name = 'file1/foo.txt'
+    assert tm.get_dirty_fields() == {'file1': ''}
+
+
+@pytest.mark.django_db
+def test_written_fields_are_reset_on_save():
+    tm = WriteTrackingModelTest.objects.create()
+    tm.characters = 'foo'
+    tm.boolean = False
+
+    tm.save(update_fields=['characters'])
+    assert tm._dirtyfields_written == {'boolean'}
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+    tm.save()
+    assert tm._dirtyfields_written == set()
+    assert tm.get_dirty_fields() == {}
+
+
+@pytest.mark.django_db
+def test_written_fields_are_reset_on_refresh_from_db():
+    tm = WriteTrackingModelTest.objects.create()
+    tm.characters = 'foo'
+    tm.boolean = False
+
+    tm.refresh_from_db(fields=['characters'])
+    assert tm._dirtyfields_written == {'boolean'}
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+    tm.refresh_from_db()
+    assert tm._dirtyfields_written == set()
+    assert not tm.is_dirty()
+
+
+@pytest.mark.django_db
+def test_deferred_field_assignment():
+    WriteTrackingModelTest.objects.create(characters='foo')
+    tm = WriteTrackingModelTest.objects.only('boolean').get()
+    tm.characters = 'bar'
+    assert tm.get_dirty_fields() == {}
+
+    tm.boolean = False
+    assert tm.get_dirty_fields() == {'boolean': True}
+
+
+@pytest.mark.django_db
+def test_expression_assignment():
+    tm = WriteTrackingModelTest.objects.create(characters='foo')
+    tm.characters = F('characters')
+    assert tm.get_dirty_fields() == {}
+    tm.save()
+    tm.refresh_from_db()
+    assert tm.get_dirty_fields() == {}
+
+
+def test_adding_instance():
+    tm = WriteTrackingModelTest(characters='foo')
+    assert tm.get_dirty_fields() == {
+        'boolean': True, 'characters': 'foo', 'json_field': {}, 'file1': '',
+    }
@@ -3,6 +3,8 @@ import re
 from django.conf import settings
 from django.db import connection
 
+from dirtyfields.memory import measure_memory
+
 
 class assert_number_queries(object):
 
@@ -53,3 +55,16 @@ class assert_select_number_queries_on_model(assert_number_of_queries_on_regex):
         regex = r'^.*SELECT.*FROM "tests_%s".*$' % model_name
 
         super(assert_select_number_queries_on_model, self).__init__(regex, number)
+
+
+def assert_memory_per_instance(build, count=1000, **max_bytes):
+    """
+    Measure the memory of `count` instances returned by `build()` with `dirtyfields.memory.measure_memory()`, assert
+    that the given `MemoryReport` attributes, in bytes per instance, don't exceed their limit and return the report.
+    """
+    report = measure_memory(build, count)
+    for name, limit in max_bytes.items():
+        value = getattr(report, name)
+        assert value <= limit, '{}.{} uses {:.0f} bytes per instance, more than {}.'.format(
+            report.model_class.__name__, name, value, limit)
+    return report